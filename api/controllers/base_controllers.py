@@ -1,30 +1,78 @@
 from __future__ import annotations
 
-from typing import Self, Type
+from inspect import Parameter, Signature, signature
+from typing import Self, Type, Callable, Any, get_type_hints
 
-from sqlalchemy.orm import Session
+from fastapi import Depends, Request
+from fastapi.responses import JSONResponse
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm.interfaces import ORMOption
 
-from api.database.configuration import Base
+from api.database.configuration import Base, get_async_db_session
 from api.database.models import User
-from api.exceptions import ObjectNotFoundError
+from api.exceptions import ObjectNotFoundError, RequestValidationError, BatchValidationError
 from api.validation.base_validators import Validator
 
 
 class DBSessionController:
-    def __init__(self, db_session: Session):
+    def __init__(self, db_session: AsyncSession):
         self.db_session = db_session
 
+    @classmethod
+    async def from_request(cls, db_session: AsyncSession = Depends(get_async_db_session)) -> Self:
+        return cls(db_session)
+
+    @classmethod
+    def endpoint(cls, action: str) -> Callable[..., Any]:
+        """
+        Builds the route endpoint for one of the controller actions. Every request resolves its own controller through
+        the `from_request` dependency, so the DB session, the authenticated user and any service state never outlive the
+        request they were created for. The endpoint advertises the signature of the action (minus `self`) so FastAPI
+        still parses the path, query and body parameters exactly as if the bound method itself was registered.
+        """
+        method = getattr(cls, action)
+        type_hints = get_type_hints(method, include_extras=True)
+
+        parameters = [
+            parameter.replace(
+                kind=Parameter.KEYWORD_ONLY,
+                annotation=type_hints.get(parameter.name, parameter.annotation)
+            )
+            for parameter in list(signature(method).parameters.values())[1:]
+        ]
+        parameters.append(
+            Parameter('controller', Parameter.KEYWORD_ONLY, default=Depends(cls.from_request), annotation=cls)
+        )
+
+        async def endpoint(controller: DBSessionController, **kwargs) -> Any:
+            return await getattr(controller, action)(**kwargs)
+
+        endpoint.__name__ = action
+        endpoint.__signature__ = Signature(parameters, return_annotation=type_hints.get('return', Signature.empty))
+
+        return endpoint
+
 
 class AuthenticatedController(DBSessionController):
     _user: User | None = None
 
+    @classmethod
+    async def from_request(cls, db_session: AsyncSession = Depends(get_async_db_session)) -> Self:
+        controller = await super().from_request(db_session)
+
+        return await controller.authenticate()
+
     @property
     def user(self) -> User:
+        return self._user
+
+    async def authenticate(self) -> Self:
         if self._user is None:
             # TODO: resolves the authenticated user from the request
-            self._user = self.db_session.query(User).filter(User.id == 1).first()
+            self._user = await self.db_session.scalar(select(User).where(User.id == 1))
 
-        return self._user
+        return self
 
 
 class AuthorizedController(AuthenticatedController):
@@ -36,21 +84,41 @@ class AuthorizedController(AuthenticatedController):
 
 
 class ValidatedController:
-    def validate(self, validator: Validator) -> Self:
+    @classmethod
+    def exception_handlers(cls) -> dict[Type[Exception], Callable[..., Any]]:
+        # Registered on the app, so the validation errors raised by any controller come back as a 422 with their context
+        return {RequestValidationError: cls.validation_error_response}
+
+    @staticmethod
+    async def validation_error_response(request: Request, exception: RequestValidationError) -> JSONResponse:
+        content: dict[str, Any] = {'detail': exception.message}
+
+        if isinstance(exception, BatchValidationError):
+            # The failed lines of a bulk payload, by their index in it
+            content['errors'] = exception.errors
+
+        return JSONResponse(status_code=422, content=content)
+
+    async def validate(self, validator: Validator) -> Self:
         # Check if the incoming payload is valid
         #   if it is NOT, raise a RequestValidationError
-        #       the RequestValidationError should be caught and return a 422 Validation Error by the API with additional
-        #       context
-        validator.validate()
+        #       the RequestValidationError is caught by the handler in `exception_handlers` and returns a 422 Validation
+        #       Error with additional context
+        await validator.validate()
 
         return self
 
 
 class ResourcefulController(DBSessionController):
     model_class: Type[Base]
-
-    def get_object(self, identifier: int) -> Base:
-        object_instance = self.db_session.query(self.model_class).filter(self.model_class.id == identifier).first()
+    object_loader_options: tuple[ORMOption, ...] = ()
+
+    async def get_object(self, identifier: int) -> Base:
+        object_instance = await self.db_session.scalar(
+            select(self.model_class)
+                .where(self.model_class.id == identifier)
+                .options(*self.object_loader_options)
+        )
 
         if object_instance is None:
             raise ObjectNotFoundError()
@@ -1,67 +1,160 @@
 from __future__ import annotations
 
-from fastapi import APIRouter
-from sqlalchemy.orm import Session
+from typing import Annotated, AsyncIterator
+
+from fastapi import APIRouter, Query
+from fastapi.responses import StreamingResponse
+from sqlalchemy import select, Select
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import joinedload, contains_eager, raiseload
 
 from api.controllers.base_controllers import AuthorizedController, ValidatedController, ResourcefulController
+from api.database.configuration import AsyncDBSession
+from api.database.identity_map import IdentityMap
+from api.database.model_cache import product_cache
 from api.database.models import Item, ShoppingCart, Product
-from api.schemas import ItemSchema, ItemCreateSchema, ItemPartialUpdateSchema
+from api.schemas import ItemSchema, ItemCreateSchema, ItemPageSchema
 from api.services.shopping_cart_service import ShoppingCartService
-from api.validation.items_validators import PartialUpdateItemValidator, CreateItemValidator
+from api.streaming import StreamFormat, encode_stream
+from api.validation.items_validators import PartialUpdateItemValidator, CreateItemValidator, \
+    BulkCreateItemValidator
+
+DEFAULT_PAGE_SIZE = 50
+MAX_PAGE_SIZE = 500
+STREAM_PARTITION_SIZE = 500
+
+# The payloads are parsed into their schemas constrained by the schema rules of their validators, so pydantic enforces
+# those while parsing and the validators are left with the database backed rules
+ItemCreatePayload = CreateItemValidator.model()
+ItemBulkCreatePayload = BulkCreateItemValidator.model()
+ItemPartialUpdatePayload = PartialUpdateItemValidator.model()
 
 
 class ItemsController(AuthorizedController, ValidatedController, ResourcefulController):
     model_class = Item
 
-    def __init__(self, db_session: Session):
+    # Every item leaves through ItemSchema, which nests the product, so the product is always joined in and any other
+    # lazy load is refused rather than silently issued row by row
+    object_loader_options = (joinedload(Item.product), raiseload('*'))
+
+    def __init__(self, db_session: AsyncSession):
         super().__init__(db_session)
 
         self.shopping_cart_service = ShoppingCartService(self.db_session)
 
-        self.router = APIRouter(tags=['Items'])
-        self.router.add_api_route("/items", self.index, methods=["GET"])
-        self.router.add_api_route("/items", self.create, methods=["POST"])
+    @classmethod
+    def router(cls) -> APIRouter:
+        router = APIRouter(tags=['Items'])
+        router.add_api_route("/items", cls.endpoint('index'), methods=["GET"])
+        router.add_api_route("/items", cls.endpoint('create'), methods=["POST"])
+        router.add_api_route("/items/bulk", cls.endpoint('bulk_create'), methods=["POST"])
 
         # Bonus
-        self.router.add_api_route("/items/{item_id}", self.partial_update, methods=["PATCH"])
-        self.router.add_api_route("/items/{item_id}", self.delete, methods=["DELETE"])
+        router.add_api_route("/items/{item_id}", cls.endpoint('partial_update'), methods=["PATCH"])
+        router.add_api_route("/items/{item_id}", cls.endpoint('delete'), methods=["DELETE"])
 
-    def index(self) -> list[ItemSchema]:
+        return router
+
+    async def index(
+        self,
+        limit: Annotated[int, Query(ge=1, le=MAX_PAGE_SIZE)] = DEFAULT_PAGE_SIZE,
+        after: int | None = None,
+        stream: StreamFormat | None = None
+    ) -> ItemPageSchema:
         self.authorized_to('index_items')
 
-        items = (
-            self.db_session
-                .query(Item)
+        statement = self.index_statement(after)
+
+        if stream is not None:
+            return StreamingResponse(self.stream_index(statement, stream), media_type=stream.media_type)
+
+        # Fetching one extra row tells us whether there is a next page without issuing a count query
+        items = (await self.db_session.scalars(statement.limit(limit + 1))).all()
+
+        return ItemPageSchema.model_validate(
+            {
+                'items': items[:limit],
+                'next_after': items[limit - 1].id if len(items) > limit else None
+            },
+            from_attributes=True
+        )
+
+    def index_statement(self, after: int | None = None) -> Select:
+        statement = (
+            select(Item)
                 .join(ShoppingCart)
-                .filter(ShoppingCart.user_id == self.user.id)
-                .filter(Item.quantity != 0)
+                .where(ShoppingCart.user_id == self.user.id)
+                .where(Item.quantity != 0)
+                .options(contains_eager(Item.shopping_cart), *self.object_loader_options)
+                .order_by(Item.id)
         )
 
-        return items
+        if after is not None:
+            statement = statement.where(Item.id > after)
+
+        return statement
 
-    def create(self, schema: ItemCreateSchema) -> ItemSchema:
-        self.authorized_to('create_item').validate(CreateItemValidator(schema))
+    async def stream_index(self, statement: Select, stream_format: StreamFormat) -> AsyncIterator[bytes]:
+        # The request's session is closed as soon as the response is returned, before the body is streamed, so the
+        # stream reads through a session of its own
+        async with AsyncDBSession() as db_session:
+            result = await db_session.stream_scalars(
+                statement.execution_options(yield_per=STREAM_PARTITION_SIZE)
+            )
 
-        product_id = schema.product_id
+            async for chunk in encode_stream(result.partitions(), ItemSchema, stream_format):
+                yield chunk
 
-        # Resolve product_id if not provided
-        if product_id is None:
-            product = self.db_session.query(Product).filter(Product.name == schema.product_name).first()
-            product_id = product.id
+    async def create(self, schema: ItemCreatePayload) -> ItemSchema:
+        await self.authorized_to('create_item').validate(CreateItemValidator(schema, self.db_session))
 
-        item = self.shopping_cart_service.for_user(self.user).add_item(product_id, schema.quantity)
+        item = await self.shopping_cart_service.for_user(self.user).add_item(
+            await self.resolve_product_id(schema),
+            self.resolve_quantity(schema)
+        )
 
         return item
 
+    async def bulk_create(self, schema: ItemBulkCreatePayload) -> list[ItemSchema]:
+        await self.authorized_to('create_item').validate(BulkCreateItemValidator(schema, self.db_session))
+
+        items = await self.shopping_cart_service.for_user(self.user).add_items(
+            [(await self.resolve_product_id(line), self.resolve_quantity(line)) for line in schema.items]
+        )
+
+        return items
+
+    async def resolve_product_id(self, schema: ItemCreateSchema) -> int:
+        if schema.product_id is not None:
+            return schema.product_id
+
+        product = IdentityMap.of(self.db_session).get(Product, 'name', schema.product_name)
+
+        if product is None:
+            product = await product_cache.fetch(self.db_session, 'name', schema.product_name)
+
+        return product.id
+
+    @staticmethod
+    def resolve_quantity(schema: ItemCreateSchema) -> int:
+        # A null quantity adds the default one, as an omitted one does, as adding it to an item would null its quantity
+        if schema.quantity is None:
+            return ItemCreateSchema.model_fields['quantity'].default
+
+        return schema.quantity
+
     #### Bonus ####
-    def partial_update(self, item_id: int, schema: ItemPartialUpdateSchema) -> ItemSchema | None:
-        self.authorized_to('update_item').validate(PartialUpdateItemValidator(schema))
+    async def partial_update(self, item_id: int, schema: ItemPartialUpdatePayload) -> ItemSchema | None:
+        await self.authorized_to('update_item').validate(PartialUpdateItemValidator(schema, self.db_session))
 
-        item = self.shopping_cart_service.for_user(self.user).update_quantity(self.get_object(item_id), schema.quantity)
+        item = await self.shopping_cart_service.for_user(self.user).update_quantity(
+            await self.get_object(item_id),
+            schema.quantity
+        )
 
         return item
 
-    def delete(self, item_id: int) -> None:
+    async def delete(self, item_id: int) -> None:
         self.authorized_to('delete_item')
 
-        self.shopping_cart_service.for_user(self.user).remove_item(self.get_object(item_id))
+        await self.shopping_cart_service.for_user(self.user).remove_item(await self.get_object(item_id))
@@ -1,12 +1,68 @@
-from sqlalchemy import create_engine
+import os
+from typing import AsyncIterator
+
+from sqlalchemy import create_engine, AsyncAdaptedQueuePool
+from sqlalchemy.ext.asyncio import create_async_engine, async_sessionmaker, AsyncSession
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import sessionmaker
 
-SQLALCHEMY_DATABASE_URL = "sqlite:///roche_cc.db"
+from api.database.pragmas import pragmas_from_environment, apply_pragmas_on_connect
+from api.database.statement_budget import listen_for_statements
+
+DB_FILE = os.environ.get('DB_FILE', 'roche_cc.db')
+
+SQLALCHEMY_DATABASE_URL = f"sqlite:///{DB_FILE}"
+SQLALCHEMY_ASYNC_DATABASE_URL = f"sqlite+aiosqlite:///{DB_FILE}"
+
+# SQLite takes a single writer at a time, so a larger pool only buys more concurrent readers
+DB_POOL_SIZE = int(os.environ.get('DB_POOL_SIZE', 10))
+DB_POOL_MAX_OVERFLOW = int(os.environ.get('DB_POOL_MAX_OVERFLOW', 10))
+DB_POOL_TIMEOUT = float(os.environ.get('DB_POOL_TIMEOUT', 30))
+
+# Pragmas applied to every new connection, see api/database/pragmas.py for the profiles
+DB_PROFILE = os.environ.get('DB_PROFILE', 'tuned')
+DB_PRAGMAS = pragmas_from_environment(DB_PROFILE)
+
+# Fails any request issuing more SQL statements than this, meant for test and development environments only
+DB_STATEMENT_BUDGET = int(os.environ['DB_STATEMENT_BUDGET']) if 'DB_STATEMENT_BUDGET' in os.environ else None
+
+# Async validation rules a request may run at once, each of them on a connection of its own
+DB_VALIDATION_CONCURRENCY = int(os.environ.get('DB_VALIDATION_CONCURRENCY', 4))
+
+# Bounds of the in-process cache of the product catalog, either set to 0 disables it
+PRODUCT_CACHE_SIZE = int(os.environ.get('PRODUCT_CACHE_SIZE', 1024))
+PRODUCT_CACHE_TTL = float(os.environ.get('PRODUCT_CACHE_TTL', 60))
 
 engine = create_engine(
-    SQLALCHEMY_DATABASE_URL, connect_args={"check_same_thread": False}
+    SQLALCHEMY_DATABASE_URL,
+    connect_args={"check_same_thread": False},
+    pool_size=DB_POOL_SIZE,
+    max_overflow=DB_POOL_MAX_OVERFLOW,
+    pool_timeout=DB_POOL_TIMEOUT,
+    # Hand out the connection returned last, so a worker thread running one job after another keeps reusing the same
+    # warm connection, with its statement cache, and the surplus ones can time out
+    pool_use_lifo=True,
 )
 DBSession = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 
+async_engine = create_async_engine(
+    SQLALCHEMY_ASYNC_DATABASE_URL,
+    poolclass=AsyncAdaptedQueuePool,
+    pool_size=DB_POOL_SIZE,
+    max_overflow=DB_POOL_MAX_OVERFLOW,
+    pool_timeout=DB_POOL_TIMEOUT,
+)
+AsyncDBSession = async_sessionmaker(autoflush=False, expire_on_commit=False, bind=async_engine)
+
+apply_pragmas_on_connect(engine, DB_PRAGMAS)
+apply_pragmas_on_connect(async_engine.sync_engine, DB_PRAGMAS)
+
+listen_for_statements(engine)
+listen_for_statements(async_engine.sync_engine)
+
 Base = declarative_base()
+
+
+async def get_async_db_session() -> AsyncIterator[AsyncSession]:
+    async with AsyncDBSession() as db_session:
+        yield db_session
@@ -0,0 +1,42 @@
+from __future__ import annotations
+
+from typing import Any, Type, Iterable
+
+from sqlalchemy import inspect
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import Session
+
+from api.database.configuration import Base
+
+
+class IdentityMap:
+    """
+    Request-scoped lookup of the rows already resolved by any column, not only by primary key like the session's own
+    identity map. Whatever resolves a row during the request (e.g. the validation of the payload) records it here, so
+    that the controllers and services further down the request can reuse it instead of querying for it again.
+    """
+
+    def __init__(self):
+        self._rows: dict[tuple[Type[Base], str, Any], Base | None] = {}
+
+    @classmethod
+    def of(cls, db_session: Session | AsyncSession) -> IdentityMap:
+        return db_session.info.setdefault('identity_map', cls())
+
+    def add(self, row: Base, columns: Iterable[str] = ()) -> None:
+        model = type(row)
+
+        for column in [*self.primary_key_columns(model), *columns]:
+            self._rows[(model, column, getattr(row, column))] = row
+
+    def add_missing(self, model: Type[Base], column: str, value: Any) -> None:
+        self._rows.setdefault((model, column, value), None)
+
+    def has(self, model: Type[Base], column: str, value: Any) -> bool:
+        return (model, column, value) in self._rows
+
+    def get(self, model: Type[Base], column: str, value: Any) -> Base | None:
+        return self._rows.get((model, column, value))
+
+    def primary_key_columns(self, model: Type[Base]) -> list[str]:
+        return [column.key for column in inspect(model).primary_key]
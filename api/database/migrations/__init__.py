@@ -0,0 +1,20 @@
+from api.database.migrations.migrator import Migration, Migrator
+from api.database.migrations.m0001_initial_schema import InitialSchemaMigration
+from api.database.migrations.m0002_hot_query_indexes import HotQueryIndexesMigration
+from api.database.migrations.m0003_jobs import JobsMigration
+from api.database.migrations.m0004_job_locks import JobLocksMigration
+from api.database.migrations.m0005_job_dedup_keys import JobDedupKeysMigration
+from api.database.migrations.m0006_dead_jobs import DeadJobsMigration
+from api.database.migrations.m0007_job_metrics import JobMetricsMigration
+from api.database.migrations.m0008_job_outbox import JobOutboxMigration
+
+MIGRATIONS: list[Migration] = [
+    InitialSchemaMigration(),
+    HotQueryIndexesMigration(),
+    JobsMigration(),
+    JobLocksMigration(),
+    JobDedupKeysMigration(),
+    DeadJobsMigration(),
+    JobMetricsMigration(),
+    JobOutboxMigration(),
+]
@@ -0,0 +1,6 @@
+from api.database.configuration import engine
+from api.database.migrations import MIGRATIONS, Migrator
+
+if __name__ == '__main__':
+    for migration in Migrator.migrate_engine(engine, MIGRATIONS):
+        print(f'Applied migration {migration.version}: {migration.name}')
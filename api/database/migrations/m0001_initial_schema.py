@@ -0,0 +1,75 @@
+from sqlalchemy import Connection, inspect, text
+
+from api.database.migrations.migrator import Migration
+from api.database.models import User, Product
+from api.database.seeder import seed_table
+
+
+class InitialSchemaMigration(Migration):
+    """
+    The schema as `Base.metadata.create_all` used to create it. Databases created that way already have these tables,
+    so only the missing ones are created, and seeded.
+    """
+
+    version = 1
+    name = 'initial_schema'
+
+    statements = {
+        'products': [
+            'CREATE TABLE products ('
+            'id INTEGER NOT NULL, '
+            'name VARCHAR, '
+            'is_active BOOLEAN, '
+            'price DECIMAL, '
+            'PRIMARY KEY (id)'
+            ')',
+            'CREATE UNIQUE INDEX ix_products_name ON products (name)',
+        ],
+        'users': [
+            'CREATE TABLE users ('
+            'id INTEGER NOT NULL, '
+            'email VARCHAR, '
+            'hashed_password VARCHAR, '
+            'is_active BOOLEAN, '
+            'PRIMARY KEY (id)'
+            ')',
+            'CREATE UNIQUE INDEX ix_users_email ON users (email)',
+        ],
+        'shopping_carts': [
+            'CREATE TABLE shopping_carts ('
+            'id INTEGER NOT NULL, '
+            'user_id INTEGER, '
+            'expires_at DATETIME, '
+            'PRIMARY KEY (id), '
+            'FOREIGN KEY(user_id) REFERENCES users (id)'
+            ')',
+        ],
+        'items': [
+            'CREATE TABLE items ('
+            'id INTEGER NOT NULL, '
+            'shopping_cart_id INTEGER, '
+            'product_id INTEGER, '
+            'quantity INTEGER, '
+            'reservation_identifier VARCHAR, '
+            'PRIMARY KEY (id), '
+            'FOREIGN KEY(shopping_cart_id) REFERENCES shopping_carts (id), '
+            'FOREIGN KEY(product_id) REFERENCES products (id)'
+            ')',
+        ],
+    }
+
+    seeded_tables = [User.__table__, Product.__table__]
+
+    def upgrade(self, connection: Connection) -> None:
+        existing_tables = set(inspect(connection).get_table_names())
+
+        for table_name, statements in self.statements.items():
+            if table_name in existing_tables:
+                continue
+
+            for statement in statements:
+                connection.execute(text(statement))
+
+            for table in self.seeded_tables:
+                if table.name == table_name:
+                    seed_table(table, connection)
@@ -0,0 +1,35 @@
+from sqlalchemy import Connection, text
+
+from api.database.migrations.migrator import Migration
+
+
+class HotQueryIndexesMigration(Migration):
+    """
+    Indexes the filters of the hot queries: the item lookup of a product in a cart, the cart lookup of a user, the
+    expired carts lookup and the listing of the non removed items of a cart.
+    """
+
+    version = 2
+    name = 'hot_query_indexes'
+
+    def upgrade(self, connection: Connection) -> None:
+        # A cart holds a single item per product, so fold any duplicates into the oldest item before enforcing it
+        connection.execute(text(
+            'UPDATE items SET quantity = ('
+            'SELECT SUM(duplicates.quantity) FROM items AS duplicates '
+            'WHERE duplicates.shopping_cart_id = items.shopping_cart_id AND duplicates.product_id = items.product_id'
+            ') '
+            'WHERE id IN (SELECT MIN(id) FROM items GROUP BY shopping_cart_id, product_id HAVING COUNT(*) > 1)'
+        ))
+        connection.execute(text(
+            'DELETE FROM items WHERE id NOT IN (SELECT MIN(id) FROM items GROUP BY shopping_cart_id, product_id)'
+        ))
+
+        connection.execute(text(
+            'CREATE UNIQUE INDEX ix_items_shopping_cart_id_product_id ON items (shopping_cart_id, product_id)'
+        ))
+        connection.execute(text(
+            'CREATE INDEX ix_items_shopping_cart_id_id_not_removed ON items (shopping_cart_id, id) WHERE quantity != 0'
+        ))
+        connection.execute(text('CREATE INDEX ix_shopping_carts_user_id ON shopping_carts (user_id)'))
+        connection.execute(text('CREATE INDEX ix_shopping_carts_expires_at ON shopping_carts (expires_at)'))
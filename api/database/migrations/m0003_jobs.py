@@ -0,0 +1,29 @@
+from sqlalchemy import Connection, text
+
+from api.database.migrations.migrator import Migration
+
+
+class JobsMigration(Migration):
+    """
+    The durable job queue. Times are unix timestamps, so that leasing compares plain numbers.
+    """
+
+    version = 3
+    name = 'jobs'
+
+    def upgrade(self, connection: Connection) -> None:
+        connection.execute(text(
+            'CREATE TABLE jobs ('
+            'id INTEGER NOT NULL, '
+            'queue VARCHAR NOT NULL, '
+            'job_class VARCHAR NOT NULL, '
+            'payload TEXT NOT NULL, '
+            'attempts INTEGER NOT NULL, '
+            'available_at FLOAT NOT NULL, '
+            'leased_until FLOAT, '
+            'lease_owner VARCHAR, '
+            'created_at FLOAT NOT NULL, '
+            'PRIMARY KEY (id)'
+            ')'
+        ))
+        connection.execute(text('CREATE INDEX ix_jobs_queue_available_at ON jobs (queue, available_at)'))
@@ -0,0 +1,23 @@
+from sqlalchemy import Connection, text
+
+from api.database.migrations.migrator import Migration
+
+
+class JobLocksMigration(Migration):
+    """
+    The keyed locks jobs take on the rows they work on. A lock whose `expires_at` has passed is free to be taken over,
+    so a worker that dies while holding one does not keep it forever.
+    """
+
+    version = 4
+    name = 'job_locks'
+
+    def upgrade(self, connection: Connection) -> None:
+        connection.execute(text(
+            'CREATE TABLE job_locks ('
+            'key VARCHAR NOT NULL, '
+            'owner VARCHAR NOT NULL, '
+            'expires_at FLOAT NOT NULL, '
+            'PRIMARY KEY (key)'
+            ')'
+        ))
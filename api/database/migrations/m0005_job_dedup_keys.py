@@ -0,0 +1,20 @@
+from sqlalchemy import Connection, text
+
+from api.database.migrations.migrator import Migration
+
+
+class JobDedupKeysMigration(Migration):
+    """
+    Lets a job name the work it stands for, so that only one pending job per name is ever queued. Leased jobs are left
+    out of the index, since the worker running one may already have read the state a newer job is queued for.
+    """
+
+    version = 5
+    name = 'job_dedup_keys'
+
+    def upgrade(self, connection: Connection) -> None:
+        connection.execute(text('ALTER TABLE jobs ADD COLUMN dedup_key VARCHAR'))
+        connection.execute(text(
+            'CREATE UNIQUE INDEX ix_jobs_pending_dedup_key ON jobs (dedup_key) '
+            'WHERE dedup_key IS NOT NULL AND lease_owner IS NULL'
+        ))
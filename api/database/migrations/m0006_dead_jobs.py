@@ -0,0 +1,30 @@
+from sqlalchemy import Connection, text
+
+from api.database.migrations.migrator import Migration
+
+
+class DeadJobsMigration(Migration):
+    """
+    The dead letters of the job queue: jobs that failed on every attempt their retry policy allows, kept along with
+    their last error until they are replayed.
+    """
+
+    version = 6
+    name = 'dead_jobs'
+
+    def upgrade(self, connection: Connection) -> None:
+        connection.execute(text(
+            'CREATE TABLE dead_jobs ('
+            'id INTEGER NOT NULL, '
+            'queue VARCHAR NOT NULL, '
+            'job_class VARCHAR NOT NULL, '
+            'payload TEXT NOT NULL, '
+            'attempts INTEGER NOT NULL, '
+            'created_at FLOAT NOT NULL, '
+            'dedup_key VARCHAR, '
+            'error TEXT, '
+            'failed_at FLOAT NOT NULL, '
+            'PRIMARY KEY (id)'
+            ')'
+        ))
+        connection.execute(text('CREATE INDEX ix_dead_jobs_queue ON dead_jobs (queue)'))
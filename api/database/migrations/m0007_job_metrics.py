@@ -0,0 +1,24 @@
+from sqlalchemy import Connection, text
+
+from api.database.migrations.migrator import Migration
+
+
+class JobMetricsMigration(Migration):
+    """
+    The running totals of the job metrics, which every worker process adds to, so that whichever process serves
+    /metrics reports the jobs of all of them.
+    """
+
+    version = 7
+    name = 'job_metrics'
+
+    def upgrade(self, connection: Connection) -> None:
+        connection.execute(text(
+            'CREATE TABLE job_metrics ('
+            'name VARCHAR NOT NULL, '
+            'job_class VARCHAR NOT NULL, '
+            'le VARCHAR NOT NULL, '
+            'value FLOAT NOT NULL, '
+            'PRIMARY KEY (name, job_class, le)'
+            ')'
+        ))
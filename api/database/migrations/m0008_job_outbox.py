@@ -0,0 +1,26 @@
+from sqlalchemy import Connection, text
+
+from api.database.migrations.migrator import Migration
+
+
+class JobOutboxMigration(Migration):
+    """
+    The jobs written in the transaction of the changes they are for, waiting to be moved onto the job queue.
+    """
+
+    version = 8
+    name = 'job_outbox'
+
+    def upgrade(self, connection: Connection) -> None:
+        connection.execute(text(
+            'CREATE TABLE job_outbox ('
+            'id INTEGER NOT NULL, '
+            'queue VARCHAR NOT NULL, '
+            'job_class VARCHAR NOT NULL, '
+            'payload TEXT NOT NULL, '
+            'available_at FLOAT NOT NULL, '
+            'created_at FLOAT NOT NULL, '
+            'dedup_key VARCHAR, '
+            'PRIMARY KEY (id)'
+            ')'
+        ))
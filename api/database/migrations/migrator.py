@@ -0,0 +1,76 @@
+from __future__ import annotations
+
+from sqlalchemy import Connection, Engine, text
+
+
+class Migration:
+    version: int
+    name: str
+
+    def upgrade(self, connection: Connection) -> None:
+        raise NotImplementedError()
+
+
+class Migrator:
+    """
+    Applies the versioned migrations a database has not seen yet, in order, and records each one in the
+    `schema_migrations` table. The caller owns the transaction, see `migrate_engine` for one a failing migration leaves
+    no trace of the run in.
+    """
+
+    def __init__(self, connection: Connection, migrations: list[Migration]):
+        self.connection: Connection = connection
+        self.migrations: list[Migration] = sorted(migrations, key=lambda migration: migration.version)
+
+    @classmethod
+    def migrate_engine(cls, engine: Engine, migrations: list[Migration]) -> list[Migration]:
+        """
+        Applies the pending migrations of the database in a single transaction. pysqlite only opens a transaction ahead
+        of DML statements, so the DDL of a failing run would stay committed under `engine.begin()`; the connection is
+        left in autocommit instead and the transaction spanning the DDL is opened and ended explicitly.
+        """
+        with engine.connect() as connection:
+            connection.execution_options(isolation_level='AUTOCOMMIT')
+
+            # IMMEDIATE takes the write lock upfront, so processes starting together apply the migrations one by one
+            connection.exec_driver_sql('BEGIN IMMEDIATE')
+
+            try:
+                applied = cls(connection, migrations).migrate()
+            except BaseException:
+                connection.exec_driver_sql('ROLLBACK')
+
+                raise
+
+            connection.exec_driver_sql('COMMIT')
+
+        return applied
+
+    def applied_versions(self) -> set[int]:
+        self.connection.execute(text(
+            'CREATE TABLE IF NOT EXISTS schema_migrations ('
+            'version INTEGER NOT NULL PRIMARY KEY, '
+            'name VARCHAR NOT NULL, '
+            'applied_at DATETIME NOT NULL DEFAULT CURRENT_TIMESTAMP'
+            ')'
+        ))
+
+        return set(self.connection.scalars(text('SELECT version FROM schema_migrations')))
+
+    def pending(self) -> list[Migration]:
+        applied_versions = self.applied_versions()
+
+        return [migration for migration in self.migrations if migration.version not in applied_versions]
+
+    def migrate(self) -> list[Migration]:
+        pending = self.pending()
+
+        for migration in pending:
+            migration.upgrade(self.connection)
+
+            self.connection.execute(
+                text('INSERT INTO schema_migrations (version, name) VALUES (:version, :name)'),
+                {'version': migration.version, 'name': migration.name}
+            )
+
+        return pending
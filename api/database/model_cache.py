@@ -0,0 +1,190 @@
+from __future__ import annotations
+
+import time
+from collections import OrderedDict
+from threading import RLock
+from typing import Any, Type, Callable, Iterable
+
+from sqlalchemy import event, inspect, select, or_
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import Session, ORMExecuteState, make_transient_to_detached
+
+from api.database.configuration import Base, PRODUCT_CACHE_SIZE, PRODUCT_CACHE_TTL
+from api.database.models import Product
+from api.metrics import metrics
+
+
+class ModelCache:
+    """
+    In-process read-through cache of the rows of a rarely written model, looked up by any of the given columns.
+
+    Only plain column values are kept, with a TTL and bounded in least recently used order, and a cached row is merged
+    into the asking session without loading it, so no instance is ever shared between sessions. Writes through the ORM
+    in this process invalidate the affected rows right away; writes from anywhere else are picked up once the TTL runs
+    out.
+    """
+
+    instances: dict[Type[Base], ModelCache] = {}
+
+    def __init__(
+        self,
+        name: str,
+        model: Type[Base],
+        columns: Iterable[str],
+        max_size: int,
+        ttl: float,
+        clock: Callable[[], float] = time.monotonic
+    ):
+        self.name: str = name
+        self.model: Type[Base] = model
+        self.max_size: int = max_size
+        self.ttl: float = ttl
+        self.clock: Callable[[], float] = clock
+
+        self.primary_key: str = inspect(model).primary_key[0].key
+        self.columns: set[str] = {self.primary_key, *columns}
+
+        self._entries: OrderedDict[Any, tuple[float, dict[str, Any]]] = OrderedDict()
+        self._index: dict[tuple[str, Any], Any] = {}
+        self._lock = RLock()
+
+        self.hits = metrics.counter(f'{name}_cache_hits_total', f'Lookups answered by the {name} cache.')
+        self.misses = metrics.counter(f'{name}_cache_misses_total', f'Lookups the {name} cache had to query for.')
+        self.evictions = metrics.counter(f'{name}_cache_evictions_total', f'Rows evicted from the {name} cache.')
+        self.invalidations = metrics.counter(
+            f'{name}_cache_invalidations_total',
+            f'Rows invalidated in the {name} cache by writes.'
+        )
+
+    @classmethod
+    def for_model(cls, model: Type[Base]) -> ModelCache | None:
+        return cls.instances.get(model)
+
+    @property
+    def enabled(self) -> bool:
+        return self.max_size > 0 and self.ttl > 0
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def get(self, column: str, value: Any) -> dict[str, Any] | None:
+        with self._lock:
+            identity = self._index.get((column, value))
+            entry = self._entries.get(identity) if identity is not None else None
+
+            if entry is not None and entry[0] <= self.clock():
+                self.discard(identity)
+                entry = None
+
+            if entry is None:
+                self.misses.inc()
+
+                return None
+
+            self._entries.move_to_end(identity)
+            self.hits.inc()
+
+            return entry[1]
+
+    def add(self, row: Base) -> None:
+        if not self.enabled:
+            return
+
+        values = {attribute.key: getattr(row, attribute.key) for attribute in inspect(self.model).column_attrs}
+        identity = values[self.primary_key]
+
+        with self._lock:
+            self.discard(identity)
+
+            self._entries[identity] = (self.clock() + self.ttl, values)
+
+            for column in self.columns:
+                self._index[(column, values[column])] = identity
+
+            while len(self._entries) > self.max_size:
+                self.discard(next(iter(self._entries)))
+                self.evictions.inc()
+
+    def discard(self, identity: Any) -> None:
+        with self._lock:
+            entry = self._entries.pop(identity, None)
+
+            if entry is None:
+                return
+
+            for column in self.columns:
+                self._index.pop((column, entry[1][column]), None)
+
+    def invalidate(self, identity: Any) -> None:
+        with self._lock:
+            if identity in self._entries:
+                self.invalidations.inc()
+
+            self.discard(identity)
+
+    def clear(self) -> None:
+        with self._lock:
+            self.invalidations.inc(len(self._entries))
+            self._entries.clear()
+            self._index.clear()
+
+    async def merge(self, db_session: AsyncSession, values: dict[str, Any]) -> Base:
+        row = self.model(**values)
+        make_transient_to_detached(row)
+
+        return await db_session.merge(row, load=False)
+
+    async def fetch(self, db_session: AsyncSession, column: str, value: Any) -> Base | None:
+        rows = await self.fetch_many(db_session, {column: {value}})
+
+        return next((row for row in rows if getattr(row, column) == value), None)
+
+    async def fetch_many(self, db_session: AsyncSession, columns: dict[str, set[Any]]) -> list[Base]:
+        """
+        Answers the lookups it can from the cache and the rest with a single query, whose rows are cached in turn.
+        """
+        rows = []
+        lookups: dict[str, set[Any]] = {}
+
+        for column, values in columns.items():
+            for value in values:
+                cached = self.get(column, value) if column in self.columns else None
+
+                if cached is not None:
+                    rows.append(await self.merge(db_session, cached))
+                else:
+                    lookups.setdefault(column, set()).add(value)
+
+        if lookups:
+            fetched = await db_session.scalars(
+                select(self.model).where(
+                    or_(*[getattr(self.model, column).in_(values) for column, values in lookups.items()])
+                )
+            )
+
+            for row in fetched:
+                self.add(row)
+                rows.append(row)
+
+        return rows
+
+    def install(self) -> None:
+        self.instances[self.model] = self
+
+        for identifier in ('after_update', 'after_delete'):
+            event.listen(self.model, identifier, self.invalidate_row)
+
+        event.listen(Session, 'do_orm_execute', self.invalidate_bulk_writes)
+
+    def invalidate_row(self, mapper, connection, row: Base) -> None:
+        self.invalidate(getattr(row, self.primary_key))
+
+    def invalidate_bulk_writes(self, orm_execute_state: ORMExecuteState) -> None:
+        # Bulk UPDATE and DELETE statements do not say which rows they touched, so the whole cache goes
+        if orm_execute_state.is_update or orm_execute_state.is_delete:
+            if any(mapper.class_ is self.model for mapper in orm_execute_state.all_mappers):
+                self.clear()
+
+
+product_cache = ModelCache('product', Product, ['name'], PRODUCT_CACHE_SIZE, PRODUCT_CACHE_TTL)
+product_cache.install()
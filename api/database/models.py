@@ -1,4 +1,4 @@
-from sqlalchemy import Boolean, Column, ForeignKey, Integer, String, DECIMAL, DateTime
+from sqlalchemy import Boolean, Column, ForeignKey, Integer, String, DECIMAL, DateTime, Index, text, Float, Text
 from sqlalchemy.orm import relationship
 
 from api.database.configuration import Base
@@ -28,8 +28,8 @@ class ShoppingCart(Base):
     __tablename__ = 'shopping_carts'
 
     id = Column(Integer, primary_key=True)
-    user_id = Column(Integer, ForeignKey('users.id'))
-    expires_at = Column(DateTime)
+    user_id = Column(Integer, ForeignKey('users.id'), index=True)
+    expires_at = Column(DateTime, index=True)
 
     user = relationship('User', back_populates='shopping_cart')
     items = relationship('Item', back_populates='shopping_cart')
@@ -37,6 +37,10 @@ class ShoppingCart(Base):
 
 class Item(Base):
     __tablename__ = 'items'
+    __table_args__ = (
+        Index('ix_items_shopping_cart_id_product_id', 'shopping_cart_id', 'product_id', unique=True),
+        Index('ix_items_shopping_cart_id_id_not_removed', 'shopping_cart_id', 'id', sqlite_where=text('quantity != 0')),
+    )
 
     id = Column(Integer, primary_key=True)
     shopping_cart_id = Column(Integer, ForeignKey('shopping_carts.id'))
@@ -46,3 +50,73 @@ class Item(Base):
 
     shopping_cart = relationship('ShoppingCart', back_populates='items')
     product = relationship('Product')
+
+
+class QueuedJob(Base):
+    __tablename__ = 'jobs'
+    __table_args__ = (
+        Index('ix_jobs_queue_available_at', 'queue', 'available_at'),
+        Index(
+            'ix_jobs_pending_dedup_key',
+            'dedup_key',
+            unique=True,
+            sqlite_where=text('dedup_key IS NOT NULL AND lease_owner IS NULL')
+        ),
+    )
+
+    id = Column(Integer, primary_key=True)
+    queue = Column(String, nullable=False)
+    job_class = Column(String, nullable=False)
+    payload = Column(Text, nullable=False)
+    attempts = Column(Integer, nullable=False, default=0)
+    available_at = Column(Float, nullable=False)
+    leased_until = Column(Float)
+    lease_owner = Column(String)
+    created_at = Column(Float, nullable=False)
+    dedup_key = Column(String)
+
+
+class OutboxJob(Base):
+    __tablename__ = 'job_outbox'
+
+    id = Column(Integer, primary_key=True)
+    queue = Column(String, nullable=False)
+    job_class = Column(String, nullable=False)
+    payload = Column(Text, nullable=False)
+    available_at = Column(Float, nullable=False)
+    created_at = Column(Float, nullable=False)
+    dedup_key = Column(String)
+
+
+class DeadJob(Base):
+    __tablename__ = 'dead_jobs'
+    __table_args__ = (
+        Index('ix_dead_jobs_queue', 'queue'),
+    )
+
+    id = Column(Integer, primary_key=True)
+    queue = Column(String, nullable=False)
+    job_class = Column(String, nullable=False)
+    payload = Column(Text, nullable=False)
+    attempts = Column(Integer, nullable=False)
+    created_at = Column(Float, nullable=False)
+    dedup_key = Column(String)
+    error = Column(Text)
+    failed_at = Column(Float, nullable=False)
+
+
+class JobLock(Base):
+    __tablename__ = 'job_locks'
+
+    key = Column(String, primary_key=True)
+    owner = Column(String, nullable=False)
+    expires_at = Column(Float, nullable=False)
+
+
+class JobMetric(Base):
+    __tablename__ = 'job_metrics'
+
+    name = Column(String, primary_key=True)
+    job_class = Column(String, primary_key=True)
+    le = Column(String, primary_key=True)
+    value = Column(Float, nullable=False)
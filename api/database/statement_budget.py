@@ -0,0 +1,72 @@
+from __future__ import annotations
+
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Iterator, Any
+
+from sqlalchemy import event, Engine
+from starlette.types import ASGIApp, Scope, Receive, Send
+
+from api.exceptions import StatementBudgetExceededError
+
+_current_budget: ContextVar[StatementBudget | None] = ContextVar('statement_budget', default=None)
+
+
+class StatementBudget:
+    def __init__(self, max_statements: int):
+        self.max_statements: int = max_statements
+        self.statements: list[str] = []
+
+    def spend(self, statement: str) -> None:
+        self.statements.append(statement)
+
+        if len(self.statements) > self.max_statements:
+            self.fail()
+
+    def fail(self) -> None:
+        issued = '\n'.join(self.statements)
+        message = f'Issued {len(self.statements)} SQL statements, the budget is {self.max_statements}:\n{issued}'
+
+        raise StatementBudgetExceededError(message)
+
+
+@contextmanager
+def statement_budget(max_statements: int) -> Iterator[StatementBudget]:
+    budget = StatementBudget(max_statements)
+    token = _current_budget.set(budget)
+
+    try:
+        yield budget
+    finally:
+        _current_budget.reset(token)
+
+
+def count_statement(connection, cursor, statement: str, parameters: Any, context, executemany: bool) -> None:
+    budget = _current_budget.get()
+
+    if budget is not None:
+        budget.spend(statement)
+
+
+def listen_for_statements(engine: Engine) -> None:
+    event.listen(engine, 'before_cursor_execute', count_statement)
+
+
+class StatementBudgetMiddleware:
+    """
+    Test-time guard against N+1 loading: every HTTP request runs inside its own statement budget and fails as soon as it
+    issues more SQL statements than allowed, listing the statements it issued.
+    """
+
+    def __init__(self, app: ASGIApp, max_statements: int):
+        self.app = app
+        self.max_statements = max_statements
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope['type'] != 'http':
+            await self.app(scope, receive, send)
+
+            return
+
+        with statement_budget(self.max_statements):
+            await self.app(scope, receive, send)
@@ -16,11 +16,32 @@ class RequestValidationError(ValueError):
     def __init__(self, message: str | None = None, *args):
         self.message = message
 
-        super().__init__(*args)
+        super().__init__(message, *args)
+
+
+class BatchValidationError(RequestValidationError):
+    def __init__(self, message: str | None = None, errors: dict[int, str] | None = None, *args):
+        self.errors = errors or {}
+
+        super().__init__(message, *args)
 
 
-class NullableValidationError(ValueError):
+class StatementBudgetExceededError(AssertionError):
     def __init__(self, message: str | None = None, *args):
         self.message = message
 
-        super().__init__(*args)
+        super().__init__(message, *args)
+
+
+class JobLockedError(Exception):
+    def __init__(self, message: str | None = None, *args):
+        self.message = message
+
+        super().__init__(message, *args)
+
+
+class CircuitOpenError(Exception):
+    def __init__(self, message: str | None = None, *args):
+        self.message = message
+
+        super().__init__(message, *args)
@@ -0,0 +1,88 @@
+"""
+Runs job workers until they are sent SIGTERM or SIGINT, upon which each of them drains its running jobs and hands the
+ones it prefetched back to the queue before exiting. Every worker also moves the jobs of the outbox onto the queue.
+
+    python -m api.jobs --processes 2 --threads 8 --prefetch 16 --queue reservations --queue default
+"""
+from __future__ import annotations
+
+import argparse
+import logging
+import multiprocessing
+import signal
+import threading
+
+from api.database.configuration import engine
+from api.jobs.configuration import JOB_WORKER_PROCESSES, JOB_WORKER_CONCURRENCY, JOB_WORKER_PREFETCH, JOB_QUEUES
+from api.jobs.outbox import OutboxDispatcher, outbox
+from api.jobs.worker import Worker
+
+
+def run_worker(queues: list[str], threads: int, prefetch: int) -> None:
+    # A forked worker must open connections of its own rather than share those of its parent
+    engine.dispose(close=False)
+
+    worker = Worker(queues, concurrency=threads, prefetch=prefetch)
+    dispatcher = OutboxDispatcher(outbox)
+
+    def stop(*_) -> None:
+        dispatcher.stop()
+        worker.stop()
+
+    for signal_number in (signal.SIGTERM, signal.SIGINT):
+        signal.signal(signal_number, stop)
+
+    dispatcher_thread = threading.Thread(target=dispatcher.run, name='outbox-dispatcher')
+    dispatcher_thread.start()
+
+    try:
+        worker.run()
+    finally:
+        dispatcher.stop()
+        dispatcher_thread.join()
+
+
+def main(argv: list[str] | None = None) -> None:
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--processes', type=int, default=JOB_WORKER_PROCESSES)
+    parser.add_argument('--threads', type=int, default=JOB_WORKER_CONCURRENCY)
+    parser.add_argument('--prefetch', type=int, default=JOB_WORKER_PREFETCH)
+    parser.add_argument(
+        '--queue',
+        dest='queues',
+        action='append',
+        help=f'repeatable, defaults to {", ".join(JOB_QUEUES)}'
+    )
+    arguments = parser.parse_args(argv)
+
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s %(processName)s %(levelname)s %(message)s')
+
+    worker_arguments = (arguments.queues or JOB_QUEUES, arguments.threads, arguments.prefetch)
+
+    if arguments.processes <= 1:
+        run_worker(*worker_arguments)
+
+        return
+
+    processes = [
+        multiprocessing.Process(target=run_worker, args=worker_arguments, name=f'worker-{index}')
+        for index in range(arguments.processes)
+    ]
+
+    for process in processes:
+        process.start()
+
+    def stop(*_) -> None:
+        for process in processes:
+            if process.is_alive():
+                process.terminate()
+
+    for signal_number in (signal.SIGTERM, signal.SIGINT):
+        signal.signal(signal_number, stop)
+
+    for process in processes:
+        process.join()
+
+
+if __name__ == '__main__':
+    main()
@@ -1,8 +1,92 @@
+from __future__ import annotations
+
+import uuid
+from importlib import import_module
+from typing import Any, Type
+
+from sqlalchemy.orm import Session, scoped_session
+
+from api.database.configuration import DBSession
+from api.exceptions import JobLockedError
+from api.jobs.configuration import JOB_LEASE_SECONDS
+from api.jobs.locks import lock_manager
+from api.jobs.queue import job_queue
+from api.jobs.retries import RetryPolicy
+
+# The sessions of the jobs, one per worker thread; closing one after a job hands its connection back to the pool
+job_sessions = scoped_session(DBSession)
+
+
 class Job:
+    queue_name: str = 'default'
+    dedup_window: float = 0
+    retry_policy: RetryPolicy = RetryPolicy()
+    lock_owner: str | None = None
+
+    _db_session: Session | None = None
+
     def queue(self) -> None:
         """Put's the current task onto the configured queue for processing asynchronously"""
-        pass
+        job_queue.push([self])
+
+    def payload(self) -> dict[str, Any]:
+        """The arguments the task is rebuilt from by the worker processing it"""
+        return {}
+
+    def dedup_key(self) -> str | None:
+        """Names the work of the task, so that while one task of that name is pending others are not queued"""
+        return None
+
+    @classmethod
+    def from_payload(cls, payload: dict[str, Any]) -> Job:
+        return cls(**payload)
+
+    @classmethod
+    def class_path(cls) -> str:
+        return f'{cls.__module__}.{cls.__qualname__}'
+
+    @staticmethod
+    def resolve_class(class_path: str) -> Type[Job]:
+        module_name, class_name = class_path.rsplit('.', 1)
+
+        return getattr(import_module(module_name), class_name)
+
+    @property
+    def db_session(self) -> Session:
+        """The session of the worker thread, only taken when the task first needs it"""
+        if self._db_session is None:
+            self._db_session = job_sessions()
+
+        return self._db_session
+
+    @db_session.setter
+    def db_session(self, db_session: Session) -> None:
+        self._db_session = db_session
+
+    def lock_keys(self) -> list[str]:
+        """Keys of what the task works on; tasks sharing any of them are never processed at the same time"""
+        return []
 
     def before_start(self) -> None:
         """Hook method called before calling the handle method for processing"""
-        pass
+        if self.lock_owner is None:
+            self.lock_owner = uuid.uuid4().hex
+
+        if not lock_manager.acquire(self.lock_keys(), self.lock_owner, JOB_LEASE_SECONDS):
+            raise JobLockedError(f'{self.class_path()} {self.payload()} is locked by another job')
+
+    def after_finish(self) -> None:
+        """Hook method called once the handle method returned or raised, provided before_start succeeded"""
+        # Whatever the task left uncommitted is rolled back before its locks are given up
+        try:
+            self.close_db_session()
+        finally:
+            lock_manager.release(self.lock_keys(), self.lock_owner)
+
+    def close_db_session(self) -> None:
+        if self._db_session is not None:
+            self._db_session.close()
+            self._db_session = None
+
+    def handle(self) -> None:
+        raise NotImplementedError()
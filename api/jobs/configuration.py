@@ -0,0 +1,58 @@
+import os
+
+# How long a worker holds a leased job before it becomes visible to other workers again
+JOB_LEASE_SECONDS = float(os.environ.get('JOB_LEASE_SECONDS', 30))
+
+# How often a job is attempted before it is moved to the dead jobs, and how long a failed job waits before it is picked
+# up again: the delay doubles with every attempt up to the maximum, and a random part of it is shaved off so that jobs
+# failing together do not all come back together
+JOB_MAX_ATTEMPTS = int(os.environ.get('JOB_MAX_ATTEMPTS', 5))
+JOB_RETRY_DELAY = float(os.environ.get('JOB_RETRY_DELAY', 5))
+JOB_RETRY_MAX_DELAY = float(os.environ.get('JOB_RETRY_MAX_DELAY', 300))
+JOB_RETRY_JITTER = float(os.environ.get('JOB_RETRY_JITTER', 0.5))
+
+# The queues a worker takes jobs from unless told otherwise, in order of priority
+JOB_QUEUES = ['reservations', 'default']
+
+# How many worker processes the runner starts, how many jobs each of them runs at once, and how many more it leases
+# ahead so that a thread freeing up finds its next job already waiting
+JOB_WORKER_PROCESSES = int(os.environ.get('JOB_WORKER_PROCESSES', 1))
+JOB_WORKER_CONCURRENCY = int(os.environ.get('JOB_WORKER_CONCURRENCY', 8))
+JOB_WORKER_PREFETCH = int(os.environ.get('JOB_WORKER_PREFETCH', 16))
+
+# How long an idle worker waits before polling the queue again
+JOB_WORKER_POLL_INTERVAL = float(os.environ.get('JOB_WORKER_POLL_INTERVAL', 0.5))
+
+# How many jobs the outbox dispatcher of a worker moves onto the queue per transaction, and how long it waits before
+# looking into an empty outbox again
+JOB_OUTBOX_BATCH_SIZE = int(os.environ.get('JOB_OUTBOX_BATCH_SIZE', 500))
+JOB_OUTBOX_POLL_INTERVAL = float(os.environ.get('JOB_OUTBOX_POLL_INTERVAL', 0.1))
+
+# How often a worker adds the metrics of the jobs it ran to the totals in the database
+JOB_METRICS_FLUSH_INTERVAL = float(os.environ.get('JOB_METRICS_FLUSH_INTERVAL', 5))
+
+# How many shards the in-process locks of a worker are spread over, and how long a job that found one of its locks
+# taken waits before it is picked up again
+JOB_LOCK_SHARDS = int(os.environ.get('JOB_LOCK_SHARDS', 64))
+JOB_LOCKED_RETRY_DELAY = float(os.environ.get('JOB_LOCKED_RETRY_DELAY', 0.25))
+
+# How long a job that is deduplicated waits on the queue, gathering the later enqueues of the same work into itself
+JOB_DEDUP_WINDOW = float(os.environ.get('JOB_DEDUP_WINDOW', 1))
+
+# How many reservations or releases a worker gathers into one request to the reservation service, and for how many
+# milliseconds the first of them waits for the others; a batch size of 1 sends every call on its own
+RESERVATION_BATCH_SIZE = int(os.environ.get('RESERVATION_BATCH_SIZE', 8))
+RESERVATION_BATCH_WAIT_MS = float(os.environ.get('RESERVATION_BATCH_WAIT_MS', 10))
+
+# Retries of the reservation jobs, which mostly fail while the reservation service is struggling
+RESERVATION_MAX_ATTEMPTS = int(os.environ.get('RESERVATION_MAX_ATTEMPTS', 10))
+RESERVATION_RETRY_DELAY = float(os.environ.get('RESERVATION_RETRY_DELAY', 1))
+
+# How many requests to the reservation service in a row may fail before calls to it fail right away, and for how many
+# seconds they do before a single call is let through to try it again
+RESERVATION_CIRCUIT_FAILURES = int(os.environ.get('RESERVATION_CIRCUIT_FAILURES', 5))
+RESERVATION_CIRCUIT_RESET_SECONDS = float(os.environ.get('RESERVATION_CIRCUIT_RESET_SECONDS', 30))
+
+# How many expired shopping carts the sweeper deletes per transaction, and how many seconds it waits between sweeps
+CART_SWEEP_BATCH_SIZE = int(os.environ.get('CART_SWEEP_BATCH_SIZE', 500))
+CART_SWEEP_INTERVAL = float(os.environ.get('CART_SWEEP_INTERVAL', 60))
@@ -0,0 +1,127 @@
+from __future__ import annotations
+
+import threading
+import time
+import zlib
+
+from sqlalchemy import Engine, delete
+from sqlalchemy.dialects.sqlite import insert
+
+from api.database.configuration import engine
+from api.database.models import JobLock
+from api.jobs.configuration import JOB_LOCK_SHARDS
+
+
+class LockShard:
+    def __init__(self):
+        self.mutex = threading.Lock()
+        self.holders: dict[str, tuple[str, float]] = {}
+
+
+class LockManager:
+    """
+    Non-blocking locks on arbitrary keys, such as `item:1` or `product:2`, held by an owner until released or until
+    their lease runs out.
+
+    Within a process the keys are spread over shards, each guarded by a mutex of its own, so threads locking unrelated
+    keys hardly ever contend and a key already held in this process is refused without a query. The `job_locks` table
+    then arbitrates between processes: all the keys are claimed in a single upsert that only takes over free or
+    expired locks, and rolled back unless it claimed every one of them.
+    """
+
+    def __init__(self, engine: Engine, shards: int = JOB_LOCK_SHARDS):
+        self.engine: Engine = engine
+        self.shards: list[LockShard] = [LockShard() for _ in range(shards)]
+
+    def shard_index(self, key: str) -> int:
+        return zlib.crc32(key.encode()) % len(self.shards)
+
+    def shard(self, key: str) -> LockShard:
+        return self.shards[self.shard_index(key)]
+
+    def acquire(self, keys: list[str], owner: str, lease_seconds: float) -> bool:
+        keys = sorted(set(keys))
+
+        if not keys:
+            return True
+
+        expires_at = time.time() + lease_seconds
+
+        if not self.acquire_local(keys, owner, expires_at):
+            return False
+
+        try:
+            acquired = self.acquire_shared(keys, owner, expires_at)
+        except BaseException:
+            self.release_local(keys, owner)
+
+            raise
+
+        if not acquired:
+            self.release_local(keys, owner)
+
+        return acquired
+
+    def release(self, keys: list[str], owner: str) -> None:
+        keys = sorted(set(keys))
+
+        if not keys:
+            return
+
+        with self.engine.begin() as connection:
+            connection.execute(delete(JobLock).where(JobLock.key.in_(keys)).where(JobLock.owner == owner))
+
+        self.release_local(keys, owner)
+
+    def acquire_local(self, keys: list[str], owner: str, expires_at: float) -> bool:
+        # The shards are always taken in the same order, so two owners locking overlapping keys cannot deadlock
+        shards = [self.shards[index] for index in sorted({self.shard_index(key) for key in keys})]
+
+        for shard in shards:
+            shard.mutex.acquire()
+
+        try:
+            now = time.time()
+
+            for key in keys:
+                holder = self.shard(key).holders.get(key)
+
+                if holder is not None and holder[0] != owner and holder[1] > now:
+                    return False
+
+            for key in keys:
+                self.shard(key).holders[key] = (owner, expires_at)
+
+            return True
+        finally:
+            for shard in shards:
+                shard.mutex.release()
+
+    def release_local(self, keys: list[str], owner: str) -> None:
+        for key in keys:
+            shard = self.shard(key)
+
+            with shard.mutex:
+                if shard.holders.get(key, (None,))[0] == owner:
+                    del shard.holders[key]
+
+    def acquire_shared(self, keys: list[str], owner: str, expires_at: float) -> bool:
+        statement = insert(JobLock).values([{'key': key, 'owner': owner, 'expires_at': expires_at} for key in keys])
+        statement = statement.on_conflict_do_update(
+            index_elements=[JobLock.key],
+            set_={JobLock.owner: statement.excluded.owner, JobLock.expires_at: statement.excluded.expires_at},
+            where=(JobLock.expires_at < time.time()) | (JobLock.owner == owner)
+        )
+
+        with self.engine.connect() as connection:
+            if connection.execute(statement).rowcount != len(keys):
+                connection.rollback()
+
+                return False
+
+            connection.commit()
+
+        return True
+
+
+lock_manager = LockManager(engine)
@@ -0,0 +1,185 @@
+from __future__ import annotations
+
+import time
+from bisect import bisect_left
+from threading import Lock
+from typing import Callable
+
+from sqlalchemy import Engine, select, func, text
+from sqlalchemy.dialects.sqlite import insert
+
+from api.database.configuration import engine
+from api.database.models import JobMetric, DeadJob
+from api.jobs.configuration import JOB_METRICS_FLUSH_INTERVAL, JOB_QUEUES
+
+
+def render_labels(**labels: str) -> str:
+    return '{' + ','.join(f'{name}="{value}"' for name, value in labels.items()) + '}'
+
+
+class JobMetrics:
+    """
+    Metrics of the jobs run by the workers, per job class: how long they waited once due, how long they ran, and how
+    many of them succeeded, failed, were retried, were moved to the dead jobs or were postponed on a lock.
+
+    A worker gathers them in memory and adds them to the running totals in the `job_metrics` table every
+    `flush_interval` seconds, so that /metrics of any process reports the jobs of every worker process. The depth of
+    the queues is read off the queue itself when the metrics are rendered.
+    """
+
+    FAMILIES: dict[str, tuple[str, str]] = {
+        'jobs_succeeded_total': ('counter', 'Jobs that ran successfully.'),
+        'jobs_failed_total': ('counter', 'Job attempts that failed.'),
+        'jobs_retried_total': ('counter', 'Failed jobs released back onto the queue to be retried.'),
+        'jobs_dead_total': ('counter', 'Failed jobs moved to the dead jobs.'),
+        'jobs_postponed_total': ('counter', 'Jobs put back onto the queue because another job held their locks.'),
+        'job_wait_seconds': ('histogram', 'Time from when a job was due until a worker started it.'),
+        'job_run_seconds': ('histogram', 'Time a job took to run.'),
+    }
+
+    BUCKETS: tuple[float, ...] = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 300)
+
+    def __init__(
+        self,
+        engine: Engine,
+        queues: list[str] = JOB_QUEUES,
+        flush_interval: float = JOB_METRICS_FLUSH_INTERVAL,
+        clock: Callable[[], float] = time.monotonic
+    ):
+        self.engine: Engine = engine
+        self.queues: list[str] = queues
+        self.flush_interval: float = flush_interval
+        self.clock: Callable[[], float] = clock
+
+        self._pending: dict[tuple[str, str, str], float] = {}
+        self._observations: dict[tuple[str, str], list[float]] = {}
+        self._flushed_at: float = clock()
+        self._lock = Lock()
+
+    def inc(self, name: str, job_class: str, amount: float = 1) -> None:
+        self.add(name, job_class, '', amount)
+
+    def observe(self, name: str, job_class: str, seconds: float) -> None:
+        # Kept per bucket rather than cumulatively until flushed, so that an observation is only a few additions
+        with self._lock:
+            observations = self._observations.setdefault((name, job_class), [0] * (len(self.BUCKETS) + 3))
+            observations[bisect_left(self.BUCKETS, seconds)] += 1
+            observations[-2] += seconds
+            observations[-1] += 1
+
+    def add(self, name: str, job_class: str, le: str, amount: float) -> None:
+        with self._lock:
+            self._pending[(name, job_class, le)] = self._pending.get((name, job_class, le), 0) + amount
+
+    def flush_if_due(self) -> None:
+        if self.clock() - self._flushed_at >= self.flush_interval:
+            self.flush()
+
+    def flush(self) -> None:
+        with self._lock:
+            pending, self._pending = self._pending, {}
+            observations, self._observations = self._observations, {}
+            self._flushed_at = self.clock()
+
+        for (name, job_class), counts in observations.items():
+            cumulative = 0
+
+            for le, count in zip([*map(str, self.BUCKETS), '+Inf'], counts):
+                cumulative += count
+
+                if cumulative:
+                    pending[(f'{name}_bucket', job_class, le)] = cumulative
+
+            pending[(f'{name}_sum', job_class, '')] = counts[-2]
+            pending[(f'{name}_count', job_class, '')] = counts[-1]
+
+        if not pending:
+            return
+
+        statement = insert(JobMetric)
+        statement = statement.on_conflict_do_update(
+            index_elements=[JobMetric.name, JobMetric.job_class, JobMetric.le],
+            set_={JobMetric.value: JobMetric.value + statement.excluded.value}
+        )
+
+        with self.engine.begin() as connection:
+            connection.execute(
+                statement,
+                [
+                    {'name': name, 'job_class': job_class, 'le': le, 'value': value}
+                    for (name, job_class, le), value in pending.items()
+                ]
+            )
+
+    def family(self, name: str) -> str:
+        for suffix in ('_bucket', '_sum', '_count'):
+            if name.endswith(suffix) and name.removesuffix(suffix) in self.FAMILIES:
+                return name.removesuffix(suffix)
+
+        return name
+
+    def render(self) -> str:
+        with self.engine.connect() as connection:
+            rows = connection.execute(select(JobMetric.name, JobMetric.job_class, JobMetric.le, JobMetric.value)).all()
+            queues = self.render_queues(connection)
+
+        samples: dict[str, list[tuple]] = {name: [] for name in self.FAMILIES}
+
+        for name, job_class, le, value in rows:
+            samples.setdefault(self.family(name), []).append((name, job_class, le, value))
+
+        lines = []
+
+        for family, (metric_type, description) in self.FAMILIES.items():
+            lines += [f'# HELP {family} {description}', f'# TYPE {family} {metric_type}']
+
+            for name, job_class, le, value in sorted(
+                samples[family],
+                key=lambda sample: (sample[1], sample[0], float(sample[2] or 0))
+            ):
+                labels = render_labels(job_class=job_class, le=le) if le else render_labels(job_class=job_class)
+                lines.append(f'{name}{labels} {value}')
+
+        return '\n'.join(lines) + '\n' + queues
+
+    def render_queues(self, connection) -> str:
+        """
+        Gauges of the jobs on each queue: all of them, those due and free to be leased right now, which is the backlog
+        to scale the workers on, those leased by a worker, and the dead ones
+        """
+        now = time.time()
+        gauges = {
+            'job_queue_depth': ('Jobs on the queue.', {}),
+            'job_queue_ready': ('Jobs on the queue that are due and not leased.', {}),
+            'job_queue_leased': ('Jobs on the queue leased by a worker.', {}),
+            'job_queue_dead': ('Dead jobs of the queue.', {}),
+        }
+
+        for queue, depth, ready, leased in connection.execute(
+            text(
+                'SELECT queue, COUNT(*), '
+                'SUM(available_at <= :now AND (leased_until IS NULL OR leased_until < :now)), '
+                'SUM(leased_until >= :now) '
+                'FROM jobs GROUP BY queue'
+            ),
+            {'now': now}
+        ):
+            gauges['job_queue_depth'][1][queue] = depth
+            gauges['job_queue_ready'][1][queue] = ready or 0
+            gauges['job_queue_leased'][1][queue] = leased or 0
+
+        for queue, dead in connection.execute(select(DeadJob.queue, func.count()).group_by(DeadJob.queue)):
+            gauges['job_queue_dead'][1][queue] = dead
+
+        lines = []
+
+        for name, (description, values) in gauges.items():
+            lines += [f'# HELP {name} {description}', f'# TYPE {name} gauge']
+
+            for queue in sorted(set(self.queues) | set(values)):
+                lines.append(f'{name}{render_labels(queue=queue)} {values.get(queue, 0)}')
+
+        return '\n'.join(lines) + '\n'
+
+
+job_metrics = JobMetrics(engine)
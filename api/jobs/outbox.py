@@ -0,0 +1,98 @@
+from __future__ import annotations
+
+import logging
+import threading
+from typing import TYPE_CHECKING
+
+from sqlalchemy import Engine, select, delete, insert
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from api.database.configuration import engine
+from api.database.models import OutboxJob
+from api.jobs.configuration import JOB_OUTBOX_BATCH_SIZE, JOB_OUTBOX_POLL_INTERVAL
+from api.jobs.queue import JobQueue, job_queue
+
+if TYPE_CHECKING:
+    from api.jobs.base_jobs import Job
+
+logger = logging.getLogger(__name__)
+
+
+class Outbox:
+    """
+    Transactional outbox of the job queue. A request adds the jobs for its changes to the `job_outbox` table in the
+    same transaction as the changes themselves, so the jobs exist if and only if the changes were committed, and the
+    request does not wait on the job queue. The dispatcher of a worker then moves them onto the queue in batches.
+    """
+
+    COLUMNS = ('queue', 'job_class', 'payload', 'available_at', 'created_at', 'dedup_key')
+
+    def __init__(self, engine: Engine, job_queue: JobQueue = job_queue, batch_size: int = JOB_OUTBOX_BATCH_SIZE):
+        self.engine: Engine = engine
+        self.job_queue: JobQueue = job_queue
+        self.batch_size: int = batch_size
+
+    async def add(self, db_session: AsyncSession, jobs: list[Job]) -> None:
+        # A single executemany, where adding the rows to the session would insert them one by one to learn their ids
+        await db_session.execute(insert(OutboxJob), JobQueue.rows(jobs))
+
+    def dispatch(self) -> int:
+        dispatched = 0
+
+        while True:
+            count = self.dispatch_batch()
+            dispatched += count
+
+            if count < self.batch_size:
+                return dispatched
+
+    def dispatch_batch(self) -> int:
+        # Looking first spares an idle dispatcher taking the write lock on every poll
+        with self.engine.connect() as connection:
+            if connection.scalar(select(OutboxJob.id).limit(1)) is None:
+                return 0
+
+        # The batch is claimed with a DELETE, which takes the write lock right away, so that the dispatchers of several
+        # worker processes never move the same jobs
+        with self.engine.begin() as connection:
+            rows = connection.execute(
+                delete(OutboxJob)
+                    .where(OutboxJob.id.in_(select(OutboxJob.id).order_by(OutboxJob.id).limit(self.batch_size)))
+                    .returning(OutboxJob.id, *[getattr(OutboxJob, column) for column in self.COLUMNS])
+            ).all()
+
+            if rows:
+                self.job_queue.insert(connection, [
+                    {column: getattr(row, column) for column in self.COLUMNS}
+                    for row in sorted(rows, key=lambda row: row.id)
+                ])
+
+        return len(rows)
+
+
+class OutboxDispatcher:
+    """Moves the jobs of the outbox onto the job queue until it is stopped, checking for new ones every poll interval"""
+
+    def __init__(self, outbox: Outbox, poll_interval: float = JOB_OUTBOX_POLL_INTERVAL):
+        self.outbox: Outbox = outbox
+        self.poll_interval: float = poll_interval
+
+        self._stopped = threading.Event()
+
+    def run(self) -> None:
+        while not self._stopped.is_set():
+            try:
+                self.outbox.dispatch()
+            except Exception:
+                logger.exception('Failed to dispatch the job outbox')
+
+            self._stopped.wait(self.poll_interval)
+
+        # Whatever was committed before the worker was stopped still makes it onto the queue
+        self.outbox.dispatch()
+
+    def stop(self) -> None:
+        self._stopped.set()
+
+
+outbox = Outbox(engine)
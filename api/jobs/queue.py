@@ -0,0 +1,217 @@
+from __future__ import annotations
+
+import json
+import time
+from dataclasses import dataclass
+from typing import Any, TYPE_CHECKING
+
+from sqlalchemy import Connection, Engine, delete, update, select, func, text, literal, ColumnElement
+from sqlalchemy.dialects.sqlite import insert
+
+from api.database.configuration import engine
+from api.database.models import QueuedJob, DeadJob
+from api.jobs.configuration import JOB_LEASE_SECONDS
+
+if TYPE_CHECKING:
+    from api.jobs.base_jobs import Job
+
+
+@dataclass(frozen=True)
+class LeasedJob:
+    id: int
+    queue: str
+    job_class: str
+    payload: dict[str, Any]
+    attempts: int
+    available_at: float
+
+    @property
+    def job_class_name(self) -> str:
+        return self.job_class.rsplit('.', 1)[-1]
+
+
+class JobQueue:
+    """
+    Durable queue of jobs kept in the `jobs` table. A worker leases jobs for a while rather than taking them off the
+    queue, and only deletes them once they ran, renewing the leases of the jobs it still holds meanwhile; a job whose
+    lease runs out, because its worker died or hung, becomes visible to the other workers again. Leasing is a single
+    UPDATE ... RETURNING, so workers in other processes never lease the same job.
+
+    A job that failed for good is moved to the `dead_jobs` table, where it stays until it is replayed.
+
+    A job with a dedup key is coalesced into the pending job of the same key, if there is one, and otherwise waits out
+    its dedup window so that the enqueues following it shortly after are coalesced into it.
+    """
+
+    def __init__(self, engine: Engine):
+        self.engine: Engine = engine
+
+    def push(self, jobs: list[Job], delay: float = 0) -> None:
+        if not jobs:
+            return
+
+        with self.engine.begin() as connection:
+            self.insert(connection, self.rows(jobs, delay))
+
+    @staticmethod
+    def rows(jobs: list[Job], delay: float = 0) -> list[dict[str, Any]]:
+        now = time.time()
+
+        return [
+            {
+                'queue': job.queue_name,
+                'job_class': job.class_path(),
+                'payload': json.dumps(job.payload()),
+                'available_at': now + delay + (job.dedup_window if job.dedup_key() is not None else 0),
+                'created_at': now,
+                'dedup_key': job.dedup_key(),
+            }
+            for job in jobs
+        ]
+
+    def insert(self, connection: Connection, rows: list[dict[str, Any]]) -> None:
+        """Queues the rows of jobs within the transaction of the connection"""
+        connection.execute(
+            insert(QueuedJob).on_conflict_do_nothing(
+                index_elements=[QueuedJob.dedup_key],
+                index_where=QueuedJob.dedup_key.is_not(None) & QueuedJob.lease_owner.is_(None)
+            ),
+            [{**row, 'attempts': 0} for row in rows]
+        )
+
+    def lease(
+        self,
+        queue: str,
+        limit: int,
+        owner: str,
+        lease_seconds: float = JOB_LEASE_SECONDS
+    ) -> list[LeasedJob]:
+        now = time.time()
+
+        with self.engine.begin() as connection:
+            rows = connection.execute(
+                text(
+                    'UPDATE jobs SET leased_until = :leased_until, lease_owner = :owner, attempts = attempts + 1 '
+                    'WHERE id IN ('
+                    'SELECT id FROM jobs '
+                    'WHERE queue = :queue AND available_at <= :now AND (leased_until IS NULL OR leased_until < :now) '
+                    'ORDER BY available_at, id LIMIT :limit'
+                    ') '
+                    'RETURNING id, queue, job_class, payload, attempts, available_at'
+                ),
+                {'leased_until': now + lease_seconds, 'owner': owner, 'queue': queue, 'now': now, 'limit': limit}
+            ).all()
+
+        return sorted(
+            (
+                LeasedJob(row.id, row.queue, row.job_class, json.loads(row.payload), row.attempts, row.available_at)
+                for row in rows
+            ),
+            key=lambda leased_job: (leased_job.available_at, leased_job.id)
+        )
+
+    def complete(self, job_ids: list[int], owner: str) -> None:
+        if not job_ids:
+            return
+
+        with self.engine.begin() as connection:
+            connection.execute(delete(QueuedJob).where(QueuedJob.id.in_(job_ids)).where(QueuedJob.lease_owner == owner))
+
+    def renew(self, job_ids: list[int], owner: str, lease_seconds: float = JOB_LEASE_SECONDS) -> None:
+        if not job_ids:
+            return
+
+        with self.engine.begin() as connection:
+            connection.execute(
+                update(QueuedJob)
+                    .where(QueuedJob.id.in_(job_ids))
+                    .where(QueuedJob.lease_owner == owner)
+                    .values({QueuedJob.leased_until: time.time() + lease_seconds})
+            )
+
+    def release(self, job_id: int, owner: str, delay: float = 0, count_attempt: bool = True) -> None:
+        values = {
+            QueuedJob.available_at: time.time() + delay,
+            QueuedJob.leased_until: None,
+            QueuedJob.lease_owner: None,
+        }
+
+        if not count_attempt:
+            values[QueuedJob.attempts] = QueuedJob.attempts - 1
+
+        # Should a job of the same dedup key have been queued meanwhile, the released job takes its place
+        with self.engine.begin() as connection:
+            connection.execute(
+                update(QueuedJob)
+                    .prefix_with('OR REPLACE')
+                    .where(QueuedJob.id == job_id)
+                    .where(QueuedJob.lease_owner == owner)
+                    .values(values)
+            )
+
+    def depth(self, queue: str) -> int:
+        with self.engine.connect() as connection:
+            return connection.scalar(select(func.count()).select_from(QueuedJob).where(QueuedJob.queue == queue))
+
+    def bury(self, job_id: int, owner: str, error: str) -> None:
+        columns = ['queue', 'job_class', 'payload', 'attempts', 'created_at', 'dedup_key']
+
+        with self.engine.begin() as connection:
+            connection.execute(
+                insert(DeadJob).from_select(
+                    [*columns, 'error', 'failed_at'],
+                    select(*[getattr(QueuedJob, column) for column in columns], literal(error), literal(time.time()))
+                        .where(QueuedJob.id == job_id)
+                        .where(QueuedJob.lease_owner == owner)
+                )
+            )
+            connection.execute(delete(QueuedJob).where(QueuedJob.id == job_id).where(QueuedJob.lease_owner == owner))
+
+    def dead(
+        self,
+        ids: list[int] | None = None,
+        queue: str | None = None,
+        job_class: str | None = None
+    ) -> list[DeadJob]:
+        with self.engine.connect() as connection:
+            return connection.execute(
+                select(DeadJob).where(*self.dead_job_filters(ids, queue, job_class)).order_by(DeadJob.id)
+            ).all()
+
+    def replay(self, ids: list[int] | None = None, queue: str | None = None, job_class: str | None = None) -> int:
+        """
+        Queues the matching dead jobs again with a clean slate of attempts, and returns how many there were. A dead
+        job of the same dedup key as a pending job is coalesced into it.
+        """
+        filters = self.dead_job_filters(ids, queue, job_class)
+        columns = ['queue', 'job_class', 'payload', 'created_at', 'dedup_key']
+
+        with self.engine.begin() as connection:
+            connection.execute(
+                insert(QueuedJob).prefix_with('OR IGNORE').from_select(
+                    [*columns, 'attempts', 'available_at'],
+                    select(*[getattr(DeadJob, column) for column in columns], literal(0), literal(time.time()))
+                        .where(*filters)
+                        .order_by(DeadJob.id)
+                )
+            )
+
+            return connection.execute(delete(DeadJob).where(*filters)).rowcount
+
+    @staticmethod
+    def dead_job_filters(ids: list[int] | None, queue: str | None, job_class: str | None) -> list[ColumnElement]:
+        filters = []
+
+        if ids:
+            filters.append(DeadJob.id.in_(ids))
+
+        if queue is not None:
+            filters.append(DeadJob.queue == queue)
+
+        if job_class is not None:
+            filters.append(DeadJob.job_class == job_class)
+
+        return filters
+
+
+job_queue = JobQueue(engine)
@@ -0,0 +1,40 @@
+"""
+Lists the dead jobs, or queues them again with a clean slate of attempts once whatever made them fail is fixed.
+
+    python -m api.jobs.replay --list
+    python -m api.jobs.replay --queue reservations
+    python -m api.jobs.replay --id 12 --id 13
+"""
+from __future__ import annotations
+
+import argparse
+
+from api.jobs.queue import JobQueue, job_queue
+
+
+def main(argv: list[str] | None = None, job_queue: JobQueue = job_queue) -> None:
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--list', action='store_true', help='list the matching dead jobs instead of replaying them')
+    parser.add_argument('--id', dest='ids', type=int, action='append')
+    parser.add_argument('--queue')
+    parser.add_argument('--job-class')
+    parser.add_argument('--all', action='store_true', help='replay every dead job when no other filter is given')
+    arguments = parser.parse_args(argv)
+
+    filters = {'ids': arguments.ids, 'queue': arguments.queue, 'job_class': arguments.job_class}
+
+    if arguments.list:
+        for dead_job in job_queue.dead(**filters):
+            error = dead_job.error.strip().splitlines()[-1] if dead_job.error else ''
+            print(f'{dead_job.id}\t{dead_job.queue}\t{dead_job.job_class}\t{dead_job.payload}\t{error}')
+
+        return
+
+    if not any(filters.values()) and not arguments.all:
+        parser.error('pass --id, --queue or --job-class to pick the dead jobs to replay, or --all for every one')
+
+    print(f'Replayed {job_queue.replay(**filters)} dead jobs')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,235 @@
+from __future__ import annotations
+
+import itertools
+import threading
+import time
+from concurrent.futures import Future
+from dataclasses import dataclass
+from typing import Any, Callable
+
+from api.exceptions import CircuitOpenError
+from api.jobs.configuration import RESERVATION_BATCH_SIZE, RESERVATION_BATCH_WAIT_MS, RESERVATION_CIRCUIT_FAILURES, \
+    RESERVATION_CIRCUIT_RESET_SECONDS
+
+
+@dataclass(frozen=True)
+class ReservationRequest:
+    product_id: int
+    quantity: int
+    reservation_identifier: str | None = None
+
+
+class ReservationClient:
+    """
+    Client of the external reservation service, which takes any number of reservations or releases per request. The
+    single item calls are requests of one.
+    """
+
+    def reserve(self, request: ReservationRequest) -> str:
+        return self.reserve_many([request])[0]
+
+    def release(self, reservation_identifier: str) -> None:
+        self.release_many([reservation_identifier])
+
+    def reserve_many(self, requests: list[ReservationRequest]) -> list[str]:
+        """Creates the reservations without an identifier and updates the quantity of the others"""
+        raise NotImplementedError()
+
+    def release_many(self, reservation_identifiers: list[str]) -> None:
+        raise NotImplementedError()
+
+
+class StubReservationClient(ReservationClient):
+    """
+    Local stand-in for the reservation service, for tests and benchmarks. It keeps the reservations in memory, counts
+    the requests it was sent and can take a while to answer each of them, like a service across the network would.
+    """
+
+    def __init__(self, latency: float = 0):
+        self.latency: float = latency
+        self.reservations: dict[str, tuple[int, int]] = {}
+        self.requests: int = 0
+
+        self._identifiers = itertools.count(1)
+        self._lock = threading.Lock()
+
+    def reserve_many(self, requests: list[ReservationRequest]) -> list[str]:
+        time.sleep(self.latency)
+
+        with self._lock:
+            self.requests += 1
+            reservation_identifiers = []
+
+            for request in requests:
+                reservation_identifier = request.reservation_identifier or f'reservation-{next(self._identifiers)}'
+                self.reservations[reservation_identifier] = (request.product_id, request.quantity)
+                reservation_identifiers.append(reservation_identifier)
+
+            return reservation_identifiers
+
+    def release_many(self, reservation_identifiers: list[str]) -> None:
+        time.sleep(self.latency)
+
+        with self._lock:
+            self.requests += 1
+
+            for reservation_identifier in reservation_identifiers:
+                self.reservations.pop(reservation_identifier, None)
+
+
+class PendingBatch:
+    def __init__(self):
+        self.arguments: list[Any] = []
+        self.futures: list[Future] = []
+        self.closed = threading.Event()
+
+
+class BatchingReservationClient(ReservationClient):
+    """
+    Gathers the single item calls that the jobs running on a worker's threads make at about the same time into one
+    request of the wrapped client. The first call of a batch waits until either `max_batch_size` calls joined it or
+    `max_wait` seconds went by, sends the batch, and hands every call its own result, or the error of the request.
+    """
+
+    def __init__(self, client: ReservationClient, max_batch_size: int, max_wait: float):
+        self.client: ReservationClient = client
+        self.max_batch_size: int = max_batch_size
+        self.max_wait: float = max_wait
+
+        self._pending: dict[str, PendingBatch] = {}
+        self._lock = threading.Lock()
+
+    def reserve(self, request: ReservationRequest) -> str:
+        return self.submit('reserve_many', request)
+
+    def release(self, reservation_identifier: str) -> None:
+        self.submit('release_many', reservation_identifier)
+
+    def reserve_many(self, requests: list[ReservationRequest]) -> list[str]:
+        return self.client.reserve_many(requests)
+
+    def release_many(self, reservation_identifiers: list[str]) -> None:
+        self.client.release_many(reservation_identifiers)
+
+    def submit(self, operation: str, argument: Any) -> Any:
+        future = Future()
+
+        with self._lock:
+            batch = self._pending.get(operation)
+            leading = batch is None
+
+            if leading:
+                batch = self._pending[operation] = PendingBatch()
+
+            batch.arguments.append(argument)
+            batch.futures.append(future)
+
+            if len(batch.arguments) >= self.max_batch_size:
+                self.close(operation, batch)
+
+        if leading:
+            batch.closed.wait(self.max_wait)
+
+            with self._lock:
+                self.close(operation, batch)
+
+            self.send(operation, batch)
+
+        return future.result()
+
+    def close(self, operation: str, batch: PendingBatch) -> None:
+        if self._pending.get(operation) is batch:
+            del self._pending[operation]
+
+        batch.closed.set()
+
+    def send(self, operation: str, batch: PendingBatch) -> None:
+        try:
+            results = getattr(self.client, operation)(batch.arguments)
+        except Exception as exception:
+            for future in batch.futures:
+                future.set_exception(exception)
+
+            return
+
+        for future, result in zip(batch.futures, results or itertools.repeat(None)):
+            future.set_result(result)
+
+
+class CircuitBreakingReservationClient(ReservationClient):
+    """
+    Stops calling the wrapped client once `failure_threshold` requests in a row failed: for the next `reset_timeout`
+    seconds every request fails right away with a CircuitOpenError, so the jobs back off instead of holding worker
+    threads on a service that is down. After that a single request is let through, and its outcome closes the circuit
+    or opens it again.
+    """
+
+    def __init__(
+        self,
+        client: ReservationClient,
+        failure_threshold: int,
+        reset_timeout: float,
+        clock: Callable[[], float] = time.monotonic
+    ):
+        self.client: ReservationClient = client
+        self.failure_threshold: int = failure_threshold
+        self.reset_timeout: float = reset_timeout
+        self.clock: Callable[[], float] = clock
+
+        self.failures: int = 0
+        self.opened_at: float | None = None
+        self._probing: bool = False
+        self._lock = threading.Lock()
+
+    @property
+    def open(self) -> bool:
+        return self.opened_at is not None
+
+    def reserve_many(self, requests: list[ReservationRequest]) -> list[str]:
+        return self.call(self.client.reserve_many, requests)
+
+    def release_many(self, reservation_identifiers: list[str]) -> None:
+        self.call(self.client.release_many, reservation_identifiers)
+
+    def call(self, request: Callable[[list], Any], arguments: list) -> Any:
+        with self._lock:
+            if self.opened_at is not None:
+                if self._probing or self.clock() - self.opened_at < self.reset_timeout:
+                    raise CircuitOpenError('The reservation service is unavailable')
+
+                self._probing = True
+
+        try:
+            result = request(arguments)
+        except Exception:
+            with self._lock:
+                self._probing = False
+                self.failures += 1
+
+                if self.opened_at is not None or self.failures >= self.failure_threshold:
+                    self.opened_at = self.clock()
+
+            raise
+
+        with self._lock:
+            self._probing = False
+            self.failures = 0
+            self.opened_at = None
+
+        return result
+
+
+def make_reservation_client() -> ReservationClient:
+    client = CircuitBreakingReservationClient(
+        StubReservationClient(),
+        RESERVATION_CIRCUIT_FAILURES,
+        RESERVATION_CIRCUIT_RESET_SECONDS
+    )
+
+    if RESERVATION_BATCH_SIZE <= 1:
+        return client
+
+    return BatchingReservationClient(client, RESERVATION_BATCH_SIZE, RESERVATION_BATCH_WAIT_MS / 1000)
+
+
+reservation_client = make_reservation_client()
@@ -1,27 +1,34 @@
 from __future__ import annotations
 
-from sqlalchemy.orm import Session
+from typing import Any
 
-from api.database.configuration import DBSession
 from api.database.models import Item
 from api.jobs.base_jobs import Job
+from api.jobs.configuration import JOB_DEDUP_WINDOW, RESERVATION_MAX_ATTEMPTS, RESERVATION_RETRY_DELAY
+from api.jobs.reservation_client import ReservationRequest, reservation_client
+from api.jobs.retries import RetryPolicy
 
 
 class BaseItemJob(Job):
-    def __init__(self, item_id: int):
+    queue_name = 'reservations'
+    retry_policy = RetryPolicy(max_attempts=RESERVATION_MAX_ATTEMPTS, base_delay=RESERVATION_RETRY_DELAY)
+
+    def __init__(self, item_id: int, product_id: int | None = None):
         self.item_id: int = item_id
-        self.db_session: Session = DBSession()
+        self.product_id: int | None = product_id
         self._item: Item | None = None
 
-    def queue(self) -> None:
-        # TODO: add logic to create the appropriate queue locks so that jobs related to the same item or product do not
-        #       get processed concurrently
-        pass
+    def payload(self) -> dict[str, Any]:
+        return {'item_id': self.item_id, 'product_id': self.product_id}
+
+    def lock_keys(self) -> list[str]:
+        # The product travels in the payload, so the locks are known before the item is loaded
+        keys = [f'item:{self.item_id}']
+
+        if self.product_id is not None:
+            keys.append(f'product:{self.product_id}')
 
-    def before_start(self) -> None:
-        # TODO: ensure that another job for the same item or product is not currently being processed. If there are any
-        #       then leave this job back onto the queue for processing later
-        pass
+        return keys
 
     @property
     def item(self) -> Item:
@@ -32,21 +39,34 @@ class BaseItemJob(Job):
 
 
 class ReserveItemJob(BaseItemJob):
-    def reserve_item(self) -> str:
-        if self.item.reservation_identifier is not None:
-            # TODO: call external service with reservation identifier and update the quantity of the reservation
-            return self.item.reservation_identifier
+    # The reservation is made for the quantity the item has when the job runs, so a burst of quantity updates only
+    # needs the one job
+    dedup_window = JOB_DEDUP_WINDOW
 
-        # TODO: call external service with the specific product id from the item
-        return 'new_reservation_identifier'
+    def dedup_key(self) -> str | None:
+        return f'{self.class_path()}:{self.item_id}'
+
+    def reserve_item(self) -> str:
+        return reservation_client.reserve(
+            ReservationRequest(self.item.product_id, self.item.quantity, self.item.reservation_identifier)
+        )
 
     def update_item(self, reservation_identifier: str) -> None:
-        self.db_session.query(Item).filter(Item.id == self.item.id).update({
+        updated = self.db_session.query(Item).filter(Item.id == self.item.id).update({
             Item.reservation_identifier: reservation_identifier
         })
         self.db_session.commit()
 
+        # The item was swept with its expired shopping cart while the reservation was being made, so nothing else would
+        # ever release it
+        if not updated:
+            reservation_client.release(reservation_identifier)
+
     def handle(self) -> None:
+        # The item was removed, or swept with its expired shopping cart, while the job was pending
+        if self.item is None:
+            return
+
         reservation_identifier = self.reserve_item()
 
         self.update_item(reservation_identifier)
@@ -54,13 +74,33 @@ class ReserveItemJob(BaseItemJob):
 
 class ReleaseReservedItemJob(BaseItemJob):
     def release_reserved_item(self) -> None:
-        # TODO: call external service to release the reservation by using the stored release identifier on the item
-        pass
+        if self.item.reservation_identifier is not None:
+            reservation_client.release(self.item.reservation_identifier)
 
     def delete_item(self) -> None:
         self.db_session.delete(self.item)
         self.db_session.commit()
 
     def handle(self) -> None:
+        # The item is read under its lock, and the product may have been added back to the shopping cart since it was
+        # removed, reusing the same item, which the pending reservation job then reserves again
+        if self.item is None or self.item.quantity != 0:
+            return
+
         self.release_reserved_item()
         self.delete_item()
+
+
+class ReleaseReservationsJob(Job):
+    """Releases the reservations of items that are gone already, such as those of expired shopping carts, at once"""
+    queue_name = 'reservations'
+    retry_policy = BaseItemJob.retry_policy
+
+    def __init__(self, reservation_identifiers: list[str]):
+        self.reservation_identifiers: list[str] = reservation_identifiers
+
+    def payload(self) -> dict[str, Any]:
+        return {'reservation_identifiers': self.reservation_identifiers}
+
+    def handle(self) -> None:
+        reservation_client.release_many(self.reservation_identifiers)
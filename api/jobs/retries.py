@@ -0,0 +1,30 @@
+from __future__ import annotations
+
+import random
+from dataclasses import dataclass, field
+from typing import Callable
+
+from api.jobs.configuration import JOB_MAX_ATTEMPTS, JOB_RETRY_DELAY, JOB_RETRY_MAX_DELAY, JOB_RETRY_JITTER
+
+
+@dataclass(frozen=True)
+class RetryPolicy:
+    """
+    Exponential backoff with jitter: the n-th failed attempt waits `base_delay * multiplier ** (n - 1)`, capped at
+    `max_delay`, less a random share of up to `jitter` of it.
+    """
+
+    max_attempts: int = JOB_MAX_ATTEMPTS
+    base_delay: float = JOB_RETRY_DELAY
+    max_delay: float = JOB_RETRY_MAX_DELAY
+    multiplier: float = 2
+    jitter: float = JOB_RETRY_JITTER
+    random: Callable[[], float] = field(default=random.random, compare=False, repr=False)
+
+    def exhausted(self, attempts: int) -> bool:
+        return attempts >= self.max_attempts
+
+    def delay(self, attempts: int) -> float:
+        delay = min(self.max_delay, self.base_delay * self.multiplier ** max(attempts - 1, 0))
+
+        return delay * (1 - self.jitter * self.random())
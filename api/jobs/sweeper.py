@@ -0,0 +1,103 @@
+"""
+Deletes the expired shopping carts along with their items, and queues the release of the reservations they held.
+
+    python -m api.jobs.sweeper --interval 60
+    python -m api.jobs.sweeper --once
+"""
+from __future__ import annotations
+
+import argparse
+import signal
+import threading
+from datetime import datetime
+
+import arrow
+from sqlalchemy import Engine, select, delete
+
+from api.database.configuration import engine
+from api.database.models import ShoppingCart, Item
+from api.jobs.configuration import CART_SWEEP_BATCH_SIZE, CART_SWEEP_INTERVAL
+from api.jobs.queue import JobQueue, job_queue
+from api.jobs.reservation_jobs import ReleaseReservationsJob
+
+
+class CartSweeper:
+    """
+    Sweeps the expired shopping carts off the `expires_at` index in batches of `batch_size`, those that expired first
+    going first. Every batch is deleted in a transaction of its own, so the sweep never holds the write lock of SQLite
+    for long and the requests writing in between only wait for one batch. The reservations of the items of a batch are
+    released by a single job, queued in the transaction of the batch.
+    """
+
+    def __init__(self, engine: Engine, batch_size: int = CART_SWEEP_BATCH_SIZE, job_queue: JobQueue = job_queue):
+        self.engine: Engine = engine
+        self.batch_size: int = batch_size
+        self.job_queue: JobQueue = job_queue
+
+    def sweep(self, now: datetime | None = None) -> int:
+        now = now or arrow.now().datetime
+        swept = 0
+
+        while True:
+            expired, deleted = self.sweep_batch(now)
+            swept += deleted
+
+            if expired < self.batch_size:
+                return swept
+
+    def sweep_batch(self, now: datetime) -> tuple[int, int]:
+        with self.engine.begin() as connection:
+            shopping_cart_ids = connection.scalars(
+                select(ShoppingCart.id)
+                    .where(ShoppingCart.expires_at < now)
+                    .order_by(ShoppingCart.expires_at)
+                    .limit(self.batch_size)
+            ).all()
+
+            if not shopping_cart_ids:
+                return 0, 0
+
+            # The expiry is checked again, as a request may have bumped it since the shopping cart was read
+            deleted_ids = connection.scalars(
+                delete(ShoppingCart)
+                    .where(ShoppingCart.id.in_(shopping_cart_ids))
+                    .where(ShoppingCart.expires_at < now)
+                    .returning(ShoppingCart.id)
+            ).all()
+
+            reservation_identifiers = connection.scalars(
+                delete(Item)
+                    .where(Item.shopping_cart_id.in_(deleted_ids))
+                    .returning(Item.reservation_identifier)
+            ).all()
+            reservation_identifiers = [identifier for identifier in reservation_identifiers if identifier is not None]
+
+            # Queued along with the deletes, so the reservations are released if and only if the batch is committed
+            if reservation_identifiers:
+                self.job_queue.insert(connection, JobQueue.rows([ReleaseReservationsJob(reservation_identifiers)]))
+
+        return len(shopping_cart_ids), len(deleted_ids)
+
+
+def main(argv: list[str] | None = None, sweeper: CartSweeper | None = None) -> None:
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--once', action='store_true', help='sweep once and exit, for running off a cron job')
+    parser.add_argument('--interval', type=float, default=CART_SWEEP_INTERVAL, help='seconds between sweeps')
+    parser.add_argument('--batch-size', type=int, default=CART_SWEEP_BATCH_SIZE)
+    arguments = parser.parse_args(argv)
+
+    sweeper = sweeper or CartSweeper(engine, arguments.batch_size)
+    stopped = threading.Event()
+
+    for signal_number in (signal.SIGTERM, signal.SIGINT):
+        signal.signal(signal_number, lambda *_: stopped.set())
+
+    while True:
+        print(f'Swept {sweeper.sweep()} expired shopping carts', flush=True)
+
+        if arguments.once or stopped.wait(arguments.interval):
+            return
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,313 @@
+from __future__ import annotations
+
+import logging
+import os
+import socket
+import threading
+import time
+import traceback
+from concurrent.futures import Executor, ThreadPoolExecutor, ProcessPoolExecutor, Future, wait, FIRST_COMPLETED
+from dataclasses import dataclass
+from typing import Any
+
+from api.exceptions import JobLockedError
+from api.jobs.base_jobs import Job
+from api.jobs.configuration import JOB_WORKER_CONCURRENCY, JOB_WORKER_PREFETCH, JOB_WORKER_POLL_INTERVAL, \
+    JOB_LEASE_SECONDS, JOB_LOCKED_RETRY_DELAY
+from api.jobs.metrics import JobMetrics, job_metrics
+from api.jobs.queue import JobQueue, LeasedJob, job_queue
+from api.jobs.retries import RetryPolicy
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass(frozen=True)
+class JobOutcome:
+    started_at: float
+    finished_at: float
+    error: BaseException | None = None
+    formatted_error: str | None = None
+
+
+def execute_job(job_class: str, payload: dict[str, Any], lock_owner: str | None = None) -> JobOutcome:
+    """
+    Runs a single job. Kept at module level so that it can be handed to a process pool as well as to a thread pool, and
+    reports how it went rather than raising, so that its timings and traceback make it back from a process pool too.
+    """
+    started_at = time.time()
+
+    try:
+        job = Job.resolve_class(job_class).from_payload(payload)
+        job.lock_owner = lock_owner
+        job.before_start()
+
+        try:
+            job.handle()
+        finally:
+            job.after_finish()
+    except Exception as exception:
+        return JobOutcome(started_at, time.time(), exception, ''.join(traceback.format_exception(exception)))
+
+    return JobOutcome(started_at, time.time())
+
+
+class Worker:
+    """
+    Leases jobs off the given queues and runs them on a pool of threads, or of processes for CPU bound jobs, keeping up
+    to `prefetch` leased jobs waiting beyond the running ones. Jobs that ran are deleted from the queue in one
+    statement per round; jobs that failed are released back onto it after the backoff of the retry policy of their
+    class, or moved to the dead jobs once it allows no more attempts. A job that finds another one holding its locks is
+    put back after a short delay rather than waited for, which neither counts as an attempt nor ties up a worker. How
+    each job went is recorded in the job metrics.
+
+    The leases of the jobs a worker holds, prefetched as well as running, are renewed every third of their length, so
+    no other worker leases them again however long they wait or run; only the jobs of a worker that died or hung are
+    run again, once their leases ran out. Once stopped, a worker leases nothing more, hands the jobs it prefetched back
+    to the queue and lets the running ones finish before it returns, so rolling workers loses no job.
+    """
+
+    def __init__(
+        self,
+        queues: list[str],
+        job_queue: JobQueue = job_queue,
+        job_metrics: JobMetrics = job_metrics,
+        concurrency: int = JOB_WORKER_CONCURRENCY,
+        prefetch: int = JOB_WORKER_PREFETCH,
+        use_processes: bool = False,
+        lease_seconds: float = JOB_LEASE_SECONDS,
+        locked_retry_delay: float = JOB_LOCKED_RETRY_DELAY,
+        poll_interval: float = JOB_WORKER_POLL_INTERVAL
+    ):
+        self.queues: list[str] = queues
+        self.job_queue: JobQueue = job_queue
+        self.job_metrics: JobMetrics = job_metrics
+        self.concurrency: int = concurrency
+        self.prefetch: int = prefetch
+        self.use_processes: bool = use_processes
+        self.lease_seconds: float = lease_seconds
+        self.locked_retry_delay: float = locked_retry_delay
+        self.poll_interval: float = poll_interval
+
+        self.owner: str = f'{socket.gethostname()}:{os.getpid()}:{id(self)}'
+        self.stopping = threading.Event()
+        self._executor: Executor | None = None
+        self._renewed_at: float = 0
+
+    @property
+    def capacity(self) -> int:
+        return self.concurrency + self.prefetch
+
+    def executor(self) -> Executor:
+        if self._executor is None:
+            executor_class = ProcessPoolExecutor if self.use_processes else ThreadPoolExecutor
+            self._executor = executor_class(max_workers=self.concurrency)
+
+        return self._executor
+
+    def run(self) -> None:
+        in_flight: dict[Future, LeasedJob] = {}
+        self._renewed_at = time.time()
+
+        try:
+            while not self.stopping.is_set():
+                try:
+                    self.poll(in_flight)
+                except Exception:
+                    # Such as the database being locked for longer than the busy timeout, which the next pass outlasts
+                    logger.exception('Worker pass failed, retrying in %.1fs', self.poll_interval)
+
+                    self.stopping.wait(self.poll_interval)
+        finally:
+            self.drain(in_flight)
+            self.shutdown()
+            self.job_metrics.flush()
+
+    def poll(self, in_flight: dict[Future, LeasedJob]) -> None:
+        """Runs a single pass of the run loop: tops the leased jobs up and settles those that finished meanwhile"""
+        in_flight.update(self.submit(self.lease(self.capacity - len(in_flight))))
+
+        if not in_flight:
+            self.stopping.wait(self.poll_interval)
+
+            return
+
+        self.renew(list(in_flight.values()))
+
+        done, _ = wait(in_flight, self.poll_interval, FIRST_COMPLETED)
+        self.settle({future: in_flight.pop(future) for future in done})
+        self.job_metrics.flush_if_due()
+
+    def renew(self, leased_jobs: list[LeasedJob]) -> None:
+        """
+        Renews the leases of the jobs every third of their length. Each job was leased at the last renewal or after it,
+        so none of their leases runs out before the next one.
+        """
+        now = time.time()
+
+        if not leased_jobs or now < self._renewed_at + self.lease_seconds / 3:
+            return
+
+        try:
+            self.job_queue.renew([leased_job.id for leased_job in leased_jobs], self.owner, self.lease_seconds)
+        except Exception:
+            # Retried on the next pass, the leases have two thirds of their length left
+            logger.exception('Failed to renew the leases of %s jobs', len(leased_jobs))
+
+            return
+
+        self._renewed_at = now
+
+    def wait_renewing(self, futures: dict[Future, LeasedJob]) -> None:
+        pending = set(futures)
+
+        while pending:
+            self.renew([futures[future] for future in pending])
+
+            _, pending = wait(pending, self.poll_interval)
+
+    def drain(self, in_flight: dict[Future, LeasedJob]) -> None:
+        # Prefetched jobs that did not start yet go straight back to the queue, the running ones are waited for
+        postponed = [leased_job for future, leased_job in in_flight.items() if future.cancel()]
+
+        for leased_job in postponed:
+            self.job_queue.release(leased_job.id, self.owner, count_attempt=False)
+
+        running = {future: leased_job for future, leased_job in in_flight.items() if not future.cancelled()}
+
+        self.wait_renewing(running)
+        self.settle(running)
+
+    def stop(self) -> None:
+        self.stopping.set()
+
+    def shutdown(self) -> None:
+        if self._executor is not None:
+            self._executor.shutdown(wait=True)
+            self._executor = None
+
+    def lease(self, limit: int) -> list[LeasedJob]:
+        leased_jobs = []
+
+        for queue in self.queues:
+            if len(leased_jobs) >= limit:
+                break
+
+            leased_jobs += self.job_queue.lease(queue, limit - len(leased_jobs), self.owner, self.lease_seconds)
+
+        return leased_jobs
+
+    def submit(self, leased_jobs: list[LeasedJob]) -> dict[Future, LeasedJob]:
+        return {
+            self.executor().submit(
+                execute_job,
+                leased_job.job_class,
+                leased_job.payload,
+                f'{self.owner}:{leased_job.id}'
+            ): leased_job
+            for leased_job in leased_jobs
+        }
+
+    def run_once(self) -> int:
+        """Runs a single round of as many jobs as the worker holds, up to the end"""
+        self._renewed_at = time.time()
+        futures = self.submit(self.lease(self.capacity))
+
+        if not futures:
+            return 0
+
+        self.wait_renewing(futures)
+        self.settle(futures)
+        self.job_metrics.flush_if_due()
+
+        return len(futures)
+
+    def settle(self, futures: dict[Future, LeasedJob]) -> None:
+        completed = []
+        unfinished: list[tuple[LeasedJob, JobOutcome]] = []
+
+        for future, leased_job in futures.items():
+            outcome = self.outcome(future)
+            job_class = leased_job.job_class_name
+
+            if isinstance(outcome.error, JobLockedError):
+                self.job_metrics.inc('jobs_postponed_total', job_class)
+                unfinished.append((leased_job, outcome))
+
+                continue
+
+            waited = max(outcome.started_at - leased_job.available_at, 0)
+
+            self.job_metrics.observe('job_wait_seconds', job_class, waited)
+            self.job_metrics.observe('job_run_seconds', job_class, outcome.finished_at - outcome.started_at)
+
+            if outcome.error is None:
+                self.job_metrics.inc('jobs_succeeded_total', job_class)
+                completed.append(leased_job.id)
+            else:
+                self.job_metrics.inc('jobs_failed_total', job_class)
+                unfinished.append((leased_job, outcome))
+
+        # The jobs that ran are deleted before any other is released, so a failing release cannot have them run again
+        self.job_queue.complete(completed, self.owner)
+
+        for leased_job, outcome in unfinished:
+            try:
+                if isinstance(outcome.error, JobLockedError):
+                    self.postpone(leased_job)
+                else:
+                    self.fail(leased_job, outcome)
+            except Exception:
+                # The job stays leased, and is run again once its lease runs out
+                logger.exception('Failed to release job %s %s', leased_job.job_class, leased_job.payload)
+
+    def outcome(self, future: Future) -> JobOutcome:
+        if future.exception() is None:
+            return future.result()
+
+        # Only reached when the job could not even be handed to the pool, such as a process of it dying
+        now = time.time()
+
+        return JobOutcome(now, now, future.exception(), ''.join(traceback.format_exception(future.exception())))
+
+    def fail(self, leased_job: LeasedJob, outcome: JobOutcome) -> None:
+        retry_policy = self.retry_policy(leased_job)
+
+        if retry_policy.exhausted(leased_job.attempts):
+            logger.error(
+                'Job %s %s failed on its last attempt %s, moving it to the dead jobs\n%s',
+                leased_job.job_class,
+                leased_job.payload,
+                leased_job.attempts,
+                outcome.formatted_error
+            )
+
+            self.job_metrics.inc('jobs_dead_total', leased_job.job_class_name)
+            self.job_queue.bury(leased_job.id, self.owner, outcome.formatted_error)
+
+            return
+
+        delay = retry_policy.delay(leased_job.attempts)
+
+        logger.warning(
+            'Job %s %s failed on attempt %s, retrying in %.1fs\n%s',
+            leased_job.job_class,
+            leased_job.payload,
+            leased_job.attempts,
+            delay,
+            outcome.formatted_error
+        )
+
+        self.job_metrics.inc('jobs_retried_total', leased_job.job_class_name)
+        self.job_queue.release(leased_job.id, self.owner, delay)
+
+    def retry_policy(self, leased_job: LeasedJob) -> RetryPolicy:
+        try:
+            return Job.resolve_class(leased_job.job_class).retry_policy
+        except (ImportError, AttributeError, ValueError):
+            # No worker is ever going to run a job of a class that does not exist
+            return RetryPolicy(max_attempts=0)
+
+    def postpone(self, leased_job: LeasedJob) -> None:
+        logger.debug('Job %s %s is locked, postponing it', leased_job.job_class, leased_job.payload)
+
+        self.job_queue.release(leased_job.id, self.owner, self.locked_retry_delay, count_attempt=False)
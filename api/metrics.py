@@ -0,0 +1,61 @@
+from __future__ import annotations
+
+from threading import Lock
+from typing import Callable
+
+from fastapi import APIRouter
+from fastapi.responses import PlainTextResponse
+
+
+class Counter:
+    type = 'counter'
+
+    def __init__(self, name: str, description: str):
+        self.name: str = name
+        self.description: str = description
+        self.value: float = 0
+
+        self._lock = Lock()
+
+    def inc(self, amount: float = 1) -> None:
+        with self._lock:
+            self.value += amount
+
+    def render(self) -> str:
+        return f'# HELP {self.name} {self.description}\n# TYPE {self.name} {self.type}\n{self.name} {self.value}\n'
+
+
+class MetricsRegistry:
+    """
+    Process-wide registry of the metrics exposed on /metrics in the Prometheus text format. Besides the metrics kept in
+    this process, collectors render metrics gathered elsewhere, at the time they are scraped.
+    """
+
+    def __init__(self):
+        self.metrics: dict[str, Counter] = {}
+        self.collectors: list[Callable[[], str]] = []
+
+    def counter(self, name: str, description: str) -> Counter:
+        return self.metrics.setdefault(name, Counter(name, description))
+
+    def collector(self, collector: Callable[[], str]) -> None:
+        if collector not in self.collectors:
+            self.collectors.append(collector)
+
+    def render(self) -> str:
+        return ''.join(
+            [metric.render() for metric in self.metrics.values()] + [collector() for collector in self.collectors]
+        )
+
+    def router(self) -> APIRouter:
+        router = APIRouter(tags=['Metrics'])
+        router.add_api_route('/metrics', self.endpoint, methods=['GET'], response_class=PlainTextResponse)
+
+        return router
+
+    def endpoint(self) -> str:
+        # Collectors may query the database, so the endpoint is left to run on the threadpool
+        return self.render()
+
+
+metrics = MetricsRegistry()
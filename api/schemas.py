@@ -2,7 +2,7 @@ from __future__ import annotations
 
 from datetime import datetime
 
-from pydantic import BaseModel
+from pydantic import BaseModel, Field
 
 
 class UserSchema(BaseModel):
@@ -33,6 +33,10 @@ class ItemCreateSchema(ItemBaseSchema):
     quantity: int | None = 1
 
 
+class ItemBulkCreateSchema(ItemBaseSchema):
+    items: list[ItemCreateSchema] = Field(min_length=1, max_length=100)
+
+
 class ItemPartialUpdateSchema(ItemBaseSchema):
     quantity: int
 
@@ -46,3 +50,8 @@ class ItemSchema(ItemBaseSchema):
 
     class Config:
         from_attributes = True
+
+
+class ItemPageSchema(BaseModel):
+    items: list[ItemSchema]
+    next_after: int | None = None
@@ -1,107 +1,206 @@
 from __future__ import annotations
 
-import arrow
-from sqlalchemy.orm import Session
+from contextlib import asynccontextmanager
+from typing import AsyncIterator
 
-from api.database.models import User, ShoppingCart, Item
+import arrow
+from sqlalchemy import select, update
+from sqlalchemy.dialects.sqlite import insert
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm.attributes import set_committed_value
+
+from api.database.identity_map import IdentityMap
+from api.database.model_cache import product_cache
+from api.database.models import User, ShoppingCart, Item, Product
+from api.jobs.base_jobs import Job
+from api.jobs.outbox import outbox
 from api.jobs.reservation_jobs import ReserveItemJob, ReleaseReservedItemJob
 
 
 class ShoppingCartService:
     user: User
 
-    def __init__(self, db_session: Session):
-        self.db_session: Session = db_session
+    def __init__(self, db_session: AsyncSession):
+        self.db_session: AsyncSession = db_session
         self._shopping_cart: ShoppingCart | None = None
+        self._deferred_jobs: list[Job] | None = None
 
     def for_user(self, user: User) -> ShoppingCartService:
         self.user = user
 
         return self
 
-    @property
-    def shopping_cart(self) -> ShoppingCart:
+    @asynccontextmanager
+    async def transaction(self) -> AsyncIterator[ShoppingCartService]:
+        """
+        Unit of work of a single cart operation: everything done within it is committed once when it exits, or rolled
+        back if it raises. Operations calling one another join the outermost transaction, and the jobs they defer are
+        written to the job outbox in that same transaction, so they are queued if and only if the changes are committed.
+        """
+        if self._deferred_jobs is not None:
+            yield self
+
+            return
+
+        self._deferred_jobs = []
+
+        try:
+            yield self
+
+            if self._deferred_jobs:
+                await outbox.add(self.db_session, self._deferred_jobs)
+
+            await self.db_session.commit()
+        except BaseException:
+            await self.db_session.rollback()
+
+            raise
+        finally:
+            self._deferred_jobs = None
+
+    def defer(self, job: Job) -> None:
+        self._deferred_jobs.append(job)
+
+    async def get_shopping_cart(self) -> ShoppingCart:
         if self._shopping_cart is None:
-            self._shopping_cart = self.find_shopping_cart()
+            self._shopping_cart = await self.find_shopping_cart()
 
             if self._shopping_cart is None:
-                self._shopping_cart = self.create_shopping_cart()
+                self._shopping_cart = await self.create_shopping_cart()
 
         return self._shopping_cart
 
     def new_expiry(self) -> arrow:
         return arrow.now().shift(minutes=30)
 
-    def find_shopping_cart(self) -> ShoppingCart:
-        return self.db_session.query(ShoppingCart).filter(ShoppingCart.user == self.user).first()
+    async def find_shopping_cart(self) -> ShoppingCart:
+        return await self.db_session.scalar(select(ShoppingCart).where(ShoppingCart.user == self.user))
 
-    def create_shopping_cart(self) -> ShoppingCart:
-        shopping_cart = ShoppingCart(user=self.user, expires_at=self.new_expiry().datetime)
-        self.db_session.add(shopping_cart)
-        self.db_session.commit()
-        self.db_session.refresh(shopping_cart)
+    async def create_shopping_cart(self) -> ShoppingCart:
+        async with self.transaction():
+            shopping_cart = ShoppingCart(user=self.user, expires_at=self.new_expiry().datetime)
+            self.db_session.add(shopping_cart)
+            await self.db_session.flush()
 
         return shopping_cart
 
-    def delete_shopping_cart(self) -> None:
-        self.db_session.delete(self.shopping_cart)
-        self.db_session.commit()
+    async def delete_shopping_cart(self) -> None:
+        async with self.transaction():
+            await self.db_session.delete(await self.get_shopping_cart())
 
         self._shopping_cart = None
 
-    def increase_expiry_of_shopping_cart(self) -> None:
-        self.db_session.query(ShoppingCart).filter(ShoppingCart.id == self.shopping_cart.id).update({
-            ShoppingCart.expires_at: self.new_expiry().datetime
-        })
-
-        self.db_session.commit()
-        self.db_session.refresh(self._shopping_cart)
+    async def increase_expiry_of_shopping_cart(self) -> None:
+        async with self.transaction():
+            shopping_cart = await self.get_shopping_cart()
+
+            # The ORM enabled update also moves the expiry of the loaded shopping cart, so it needs no refresh
+            await self.db_session.execute(
+                update(ShoppingCart)
+                    .where(ShoppingCart.id == shopping_cart.id)
+                    .values({ShoppingCart.expires_at: self.new_expiry().datetime})
+            )
+
+    async def get_product(self, product_id: int) -> Product:
+        # Reuse the product resolved earlier in the request, so the new item does not load it again
+        product = IdentityMap.of(self.db_session).get(Product, 'id', product_id)
+
+        if product is None:
+            product = await product_cache.fetch(self.db_session, 'id', product_id)
+
+        return product
+
+    async def upsert_items(self, shopping_cart: ShoppingCart, quantities: dict[int, int]) -> dict[int, Item]:
+        """
+        Inserts the items of the products, adding the quantities to the items already in the shopping cart instead, in
+        one statement, so requests adding the same product concurrently add up rather than race into the unique index.
+        """
+        statement = insert(Item).values([
+            {Item.shopping_cart_id: shopping_cart.id, Item.product_id: product_id, Item.quantity: quantity}
+            for product_id, quantity in quantities.items()
+        ])
+        statement = statement.on_conflict_do_update(
+            index_elements=[Item.shopping_cart_id, Item.product_id],
+            set_={Item.quantity: Item.quantity + statement.excluded.quantity}
+        )
 
-    def add_item(self, product_id: int, quantity: int) -> Item:
-        item = (
-            self.db_session.query(Item)
-                .filter(Item.shopping_cart == self.shopping_cart)
-                .filter(Item.product_id == product_id)
-                .first()
+        items = await self.db_session.scalars(
+            statement.returning(Item).execution_options(populate_existing=True)
         )
 
-        if item is not None:
-            return self.update_quantity(item, item.quantity + quantity)
+        return {item.product_id: item for item in items}
+
+    async def add_item(self, product_id: int, quantity: int) -> Item:
+        async with self.transaction():
+            shopping_cart = await self.get_shopping_cart()
+            product = await self.get_product(product_id)
 
-        item = Item(shopping_cart=self.shopping_cart, product_id=product_id, quantity=quantity)
-        self.db_session.add(item)
-        self.db_session.commit()
-        self.db_session.refresh(item)
+            item = (await self.upsert_items(shopping_cart, {product_id: quantity}))[product_id]
+            set_committed_value(item, 'product', product)
 
-        # Update the current instance of the shopping cart
-        self.increase_expiry_of_shopping_cart()
+            # Update the current instance of the shopping cart
+            await self.increase_expiry_of_shopping_cart()
 
-        # Queue reservation async job
-        ReserveItemJob(item.id).queue()
+            # Queue reservation async job
+            self.defer(ReserveItemJob(item.id, item.product_id))
 
         return item
 
-    def update_quantity(self, item: Item, quantity: int) -> Item | None:
-        self.db_session.query(Item).filter(Item.id == item.id).update({Item.quantity: quantity})
+    async def add_items(self, lines: list[tuple[int, int]]) -> list[Item]:
+        """
+        Adds several products to the shopping cart in a single transaction, bumping its expiry once and queueing the
+        reservations of all the items as one batch.
+        """
+        async with self.transaction():
+            shopping_cart = await self.get_shopping_cart()
+
+            quantities: dict[int, int] = {}
+
+            for product_id, quantity in lines:
+                quantities[product_id] = quantities.get(product_id, 0) + quantity
+
+            identity_map = IdentityMap.of(self.db_session)
+            missing_product_ids = {
+                product_id for product_id in quantities if identity_map.get(Product, 'id', product_id) is None
+            }
+
+            if missing_product_ids:
+                for product in await product_cache.fetch_many(self.db_session, {'id': missing_product_ids}):
+                    identity_map.add(product)
+
+            upserted_items = await self.upsert_items(shopping_cart, quantities)
+            items = [upserted_items[product_id] for product_id in quantities]
+
+            for item in items:
+                set_committed_value(item, 'product', identity_map.get(Product, 'id', item.product_id))
+
+            # Update the current instance of the shopping cart
+            await self.increase_expiry_of_shopping_cart()
+
+            # Queue reservation async jobs
+            for item in items:
+                self.defer(ReserveItemJob(item.id, item.product_id))
+
+        return items
 
-        self.db_session.commit()
-        self.db_session.refresh(item)
+    async def update_quantity(self, item: Item, quantity: int) -> Item | None:
+        async with self.transaction():
+            await self.db_session.execute(update(Item).where(Item.id == item.id).values({Item.quantity: quantity}))
 
-        # Update the current instance of the shopping cart
-        self.increase_expiry_of_shopping_cart()
+            # Update the current instance of the shopping cart
+            await self.increase_expiry_of_shopping_cart()
 
-        # Queue reservation async job
-        ReserveItemJob(item.id).queue()
+            # Queue reservation async job
+            self.defer(ReserveItemJob(item.id, item.product_id))
 
         return item
 
-    def remove_item(self, item: Item) -> None:
-        self.db_session.query(Item).filter(Item.id == item.id).update({Item.quantity: 0})
-        self.db_session.commit()
-        self.db_session.refresh(item)
+    async def remove_item(self, item: Item) -> None:
+        async with self.transaction():
+            await self.db_session.execute(update(Item).where(Item.id == item.id).values({Item.quantity: 0}))
 
-        # Update the current instance of the shopping cart
-        self.increase_expiry_of_shopping_cart()
+            # Update the current instance of the shopping cart
+            await self.increase_expiry_of_shopping_cart()
 
-        # Queue reservation release async job
-        ReleaseReservedItemJob(item.id).queue()
+            # Queue reservation release async job
+            self.defer(ReleaseReservedItemJob(item.id, item.product_id))
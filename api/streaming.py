@@ -0,0 +1,51 @@
+from __future__ import annotations
+
+from enum import Enum
+from typing import Any, AsyncIterator, Sequence, Type
+
+from pydantic import BaseModel, TypeAdapter
+
+
+class StreamFormat(str, Enum):
+    NDJSON = 'ndjson'
+    JSON = 'json'
+
+    @property
+    def media_type(self) -> str:
+        if self is StreamFormat.NDJSON:
+            return 'application/x-ndjson'
+
+        return 'application/json'
+
+
+async def encode_stream(
+    partitions: AsyncIterator[Sequence[Any]],
+    schema: Type[BaseModel],
+    stream_format: StreamFormat
+) -> AsyncIterator[bytes]:
+    """
+    Serializes the rows of every partition in one pass through pydantic-core and writes the partition as a single chunk,
+    so memory stays bounded by the partition size no matter how many rows the stream ends up carrying.
+    """
+    adapter = TypeAdapter(list[schema])
+    is_first_partition = True
+
+    if stream_format is StreamFormat.JSON:
+        yield b'['
+
+    async for rows in partitions:
+        if len(rows) == 0:
+            continue
+
+        models = adapter.validate_python(rows, from_attributes=True)
+
+        if stream_format is StreamFormat.NDJSON:
+            yield b''.join(model.model_dump_json().encode() + b'\n' for model in models)
+        else:
+            separator = b'' if is_first_partition else b','
+            yield separator + adapter.dump_json(models)[1:-1]
+
+        is_first_partition = False
+
+    if stream_format is StreamFormat.JSON:
+        yield b']'
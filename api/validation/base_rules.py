@@ -1,139 +1,274 @@
 from __future__ import annotations
 
-from functools import cached_property
-from typing import Any, Type
+from enum import IntEnum
+from types import NoneType, UnionType
+from typing import Any, Type, Annotated, Optional, Union, get_args, get_origin
 
+from annotated_types import Ge
 from pydantic import BaseModel
+from sqlalchemy.ext.asyncio import AsyncSession
 
-from api.database.configuration import Base, DBSession
-from api.exceptions import RequestValidationError, NullableValidationError
+from api.database.configuration import Base
+from api.database.identity_map import IdentityMap
+from api.exceptions import RequestValidationError
+
+
+class RuleCost(IntEnum):
+    """
+    What checking a value by a rule takes. The validator runs the cheaper rules of every path before any costlier one,
+    so a payload failing a cheap rule never costs more than that. The schema rules are enforced by pydantic while it
+    parses a payload into the schema constrained by them, and only checked again for payloads built any other way.
+    """
+
+    SCHEMA = 0
+    MEMORY = 1
+    DATABASE = 2
+
+
+class FieldConstraints:
+    """What the schema rules of a path constrain its field to"""
+
+    __slots__ = ('type', 'nullable', 'required', 'metadata')
+
+    def __init__(self):
+        self.type: type | None = None
+        self.nullable: bool = False
+        self.required: bool = False
+        self.metadata: list[Any] = []
+
+    def annotation(self, field_type: Any) -> Any:
+        annotation = self.type or self.non_null(field_type)
+
+        if self.metadata:
+            annotation = Annotated[(annotation, *self.metadata)]
+
+        return Optional[annotation] if self.nullable else annotation
+
+    @staticmethod
+    def non_null(annotation: Any) -> Any:
+        if get_origin(annotation) in (Union, UnionType):
+            return Union[tuple(arg for arg in get_args(annotation) if arg is not NoneType)]
+
+        return annotation
+
+
+class ValidationContext:
+    """
+    What the value of a path is validated against besides itself: the payload it is part of, the rows resolved for the
+    request, and the session the async rules of the path query on.
+    """
+
+    __slots__ = ('schema', 'identity_map', 'db_session')
+
+    def __init__(
+            self,
+            schema: BaseModel,
+            identity_map: IdentityMap | None = None,
+            db_session: AsyncSession | None = None
+    ):
+        self.schema: BaseModel = schema
+        self.identity_map: IdentityMap | None = identity_map
+        self.db_session: AsyncSession | None = db_session
 
 
 class Rule:
-    path: str
-    schema: BaseModel
+    """
+    A check of the value of a single path. Rules hold nothing but their own arguments, so the rules of a validator are
+    built once and shared by every payload it validates.
+    """
+
+    __slots__ = ()
 
-    @cached_property
-    def value(self) -> Any:
-        return getattr(self.schema, self.path)
+    cost: RuleCost = RuleCost.MEMORY
 
-    def validate(self) -> bool:
+    # A value failing a rule that stops skips the rules following it, rather than failing the validation
+    stops: bool = False
+
+    def constrain(self, field: FieldConstraints) -> bool:
+        """Adds the rule to the constraints of its field, if it can be one. Returns whether it could"""
+        return False
+
+    def validate(self, value: Any, context: ValidationContext) -> bool:
         raise NotImplementedError()
 
-    def fail(self) -> None:
+    def validate_column(self, values: list[Any], contexts: list[ValidationContext]) -> list[bool]:
+        """Validates the values of the same path of several payloads in a single loop"""
+        return [self.validate(value, context) for value, context in zip(values, contexts)]
+
+    def message(self, path: str) -> str:
+        raise NotImplementedError()
+
+    def fail(self, path: str) -> None:
+        raise RequestValidationError(self.message(path))
+
+
+class AsyncRule(Rule):
+    """
+    A rule awaiting the database to check a value. The async rules of different paths run concurrently, each path on a
+    session of its own, so they only ever query on the session of their context.
+    """
+
+    __slots__ = ()
+
+    cost = RuleCost.DATABASE
+
+    async def validate(self, value: Any, context: ValidationContext) -> bool:
         raise NotImplementedError()
 
+    async def validate_column(self, values: list[Any], contexts: list[ValidationContext]) -> list[bool]:
+        return [await self.validate(value, context) for value, context in zip(values, contexts)]
+
 
 class RequiredRule(Rule):
-    def validate(self) -> bool:
-        if self.value is None:
-            self.fail()
+    __slots__ = ()
+
+    cost = RuleCost.SCHEMA
+
+    def constrain(self, field: FieldConstraints) -> bool:
+        field.required = True
 
         return True
 
-    def fail(self) -> None:
-        message = f'A value for "{self.path}" is required.'
+    def validate(self, value: Any, context: ValidationContext) -> bool:
+        return value is not None
 
-        raise RequestValidationError(message)
+    def validate_column(self, values: list[Any], contexts: list[ValidationContext]) -> list[bool]:
+        return [value is not None for value in values]
+
+    def message(self, path: str) -> str:
+        return f'A value for "{path}" is required.'
 
 
 class RequiredIfRule(RequiredRule):
-    def __init__(self, condition: bool):
-        self.condition = condition
+    """Requires a value while the value of `other_path` is `other_value`"""
 
-        super().__init__()
+    __slots__ = ('other_path', 'other_value')
 
-    def validate(self) -> bool:
-        if self.condition:
-            if self.value is None:
-                self.fail()
+    def __init__(self, other_path: str, other_value: Any = None):
+        self.other_path: str = other_path
+        self.other_value: Any = other_value
 
-        return True
+    def constrain(self, field: FieldConstraints) -> bool:
+        # Compares the field to another one, so it can only be checked by a validator of the whole model
+        return False
+
+    def validate(self, value: Any, context: ValidationContext) -> bool:
+        return value is not None or getattr(context.schema, self.other_path) != self.other_value
+
+    def validate_column(self, values: list[Any], contexts: list[ValidationContext]) -> list[bool]:
+        other_path, other_value = self.other_path, self.other_value
+
+        return [
+            value is not None or getattr(context.schema, other_path) != other_value
+            for value, context in zip(values, contexts)
+        ]
 
 
 class NullableRule(Rule):
-    def validate(self) -> bool:
-        if self.value is None:
-            self.skip_following_rules()
+    __slots__ = ()
+
+    cost = RuleCost.SCHEMA
+    stops = True
+
+    def constrain(self, field: FieldConstraints) -> bool:
+        field.nullable = True
 
         return True
 
-    def skip_following_rules(self) -> None:
-        raise NullableValidationError()
+    def validate(self, value: Any, context: ValidationContext) -> bool:
+        return value is not None
+
+    def validate_column(self, values: list[Any], contexts: list[ValidationContext]) -> list[bool]:
+        return [value is not None for value in values]
 
-    def fail(self) -> None:
+    def fail(self, path: str) -> None:
         pass
 
 
 class IntegerRule(Rule):
-    def validate(self) -> bool:
-        if type(self.value) is not int:
-            self.fail()
+    __slots__ = ()
+
+    cost = RuleCost.SCHEMA
+
+    def constrain(self, field: FieldConstraints) -> bool:
+        field.type = int
 
         return True
 
-    def fail(self) -> None:
-        message = f'The value for "{self.path}" must be an integer.'
+    def validate(self, value: Any, context: ValidationContext) -> bool:
+        return type(value) is int
+
+    def validate_column(self, values: list[Any], contexts: list[ValidationContext]) -> list[bool]:
+        return [type(value) is int for value in values]
 
-        raise RequestValidationError(message)
+    def message(self, path: str) -> str:
+        return f'The value for "{path}" must be an integer.'
 
 
 class StringRule(Rule):
-    def validate(self) -> bool:
-        if type(self.value) is not str:
-            self.fail()
+    __slots__ = ()
+
+    cost = RuleCost.SCHEMA
+
+    def constrain(self, field: FieldConstraints) -> bool:
+        field.type = str
 
         return True
 
-    def fail(self) -> None:
-        message = f'The value for "{self.path}" must be a string.'
+    def validate(self, value: Any, context: ValidationContext) -> bool:
+        return type(value) is str
 
-        raise RequestValidationError(message)
+    def validate_column(self, values: list[Any], contexts: list[ValidationContext]) -> list[bool]:
+        return [type(value) is str for value in values]
+
+    def message(self, path: str) -> str:
+        return f'The value for "{path}" must be a string.'
 
 
 class ExistsInRule(Rule):
-    def __init__(self, model: Type[Base], column: str = 'id'):
-        self.model = model
-        self.column = column
+    __slots__ = ('model', 'column')
 
-        super().__init__()
+    cost = RuleCost.DATABASE
 
-    def db_session(self) -> DBSession:
-        return DBSession()
+    def __init__(self, model: Type[Base], column: str = 'id'):
+        self.model: Type[Base] = model
+        self.column: str = column
 
-    def validate(self) -> bool:
-        db_session = self.db_session()
+    def validate(self, value: Any, context: ValidationContext) -> bool:
+        # The rows are resolved for every payload by the validator in batched queries once all the cheaper rules passed
+        return context.identity_map.get(self.model, self.column, value) is not None
 
-        result = (
-            db_session.query(
-                db_session.query(self.model).filter(self.column == self.value).exists()
-            ).scalar()
-        )
+    def validate_column(self, values: list[Any], contexts: list[ValidationContext]) -> list[bool]:
+        model, column = self.model, self.column
 
-        if result is False:
-            self.fail()
+        return [
+            context.identity_map.get(model, column, value) is not None for value, context in zip(values, contexts)
+        ]
 
-        return True
+    def message(self, path: str) -> str:
+        return f'The value for "{path}" must exist in column "{self.column}" of model "{self.model}".'
 
-    def fail(self) -> None:
-        message = f'The value for "{self.path}" must exist in column "{self.column}" of model "{self.model}".'
 
-        raise RequestValidationError(message)
+class GreaterThanRule(Rule):
+    __slots__ = ('min_value',)
 
+    cost = RuleCost.SCHEMA
 
-class GreaterThanRule(Rule):
     def __init__(self, min_value: int | float):
-        self.min_value = min_value
+        self.min_value: int | float = min_value
 
-        super().__init__()
-
-    def validate(self) -> bool:
-        if self.value < self.min_value:
-            self.fail()
+    def constrain(self, field: FieldConstraints) -> bool:
+        field.metadata.append(Ge(self.min_value))
 
         return True
 
-    def fail(self) -> None:
-        message = f'The value for "{self.path}" must be greater than "{self.min_value}".'
+    def validate(self, value: Any, context: ValidationContext) -> bool:
+        return not value < self.min_value
+
+    def validate_column(self, values: list[Any], contexts: list[ValidationContext]) -> list[bool]:
+        min_value = self.min_value
+
+        return [not value < min_value for value in values]
 
-        raise RequestValidationError(message)
+    def message(self, path: str) -> str:
+        return f'The value for "{path}" must be greater than "{self.min_value}".'
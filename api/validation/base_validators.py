@@ -1,26 +1,519 @@
-from pydantic import BaseModel
+from __future__ import annotations
 
-from api.exceptions import NullableValidationError, RequestValidationError
-from api.validation.base_rules import Rule
+import asyncio
+from collections import defaultdict
+from contextlib import nullcontext
+from typing import Any, Type, AsyncContextManager
+
+from pydantic import BaseModel, create_model, model_validator
+from pydantic.fields import FieldInfo
+from pydantic_core import PydanticUndefined
+from sqlalchemy import select, or_
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from api.database.configuration import Base, DB_VALIDATION_CONCURRENCY
+from api.database.identity_map import IdentityMap
+from api.database.model_cache import ModelCache
+from api.exceptions import BatchValidationError
+from api.validation.base_rules import Rule, AsyncRule, ExistsInRule, ValidationContext, RuleCost, FieldConstraints
+
+RULE_COSTS = tuple(RuleCost)
+
+
+class Lookups(defaultdict):
+    """
+    The values to look up per model and column
+    """
+
+    def __init__(self):
+        super().__init__(lambda: defaultdict(set))
+
+
+class ValidationPlan:
+    """
+    The rules of a validator compiled once for every payload it validates, in stages of the same cost: each stage
+    holds the rules of that cost of every path in the order they run, preceded by the stopping rules of the path that
+    came before them, so that a path stopped in an earlier stage stays stopped. The lookups of the database backed rules
+    are resolved before the first stage needing them. The paths of a stage with async rules are checked concurrently.
+    """
+
+    __slots__ = ('paths', 'stages', 'costs', 'parsed_costs', 'concurrent', 'lookups')
+
+    def __init__(self, rules: dict[str, list[Rule]]):
+        self.paths: tuple[tuple[str, tuple[Rule, ...]], ...] = tuple(
+            (path, tuple(path_rules)) for path, path_rules in rules.items()
+        )
+        self.stages: dict[RuleCost, tuple[tuple[str, tuple[Rule, ...]], ...]] = {
+            cost: self.stage(cost) for cost in RuleCost
+        }
+        self.costs: tuple[RuleCost, ...] = tuple(cost for cost, stage in self.stages.items() if stage)
+
+        # The schema rules of the payloads parsed into the constrained schema were already enforced by pydantic
+        self.parsed_costs: tuple[RuleCost, ...] = tuple(cost for cost in self.costs if cost is not RuleCost.SCHEMA)
+
+        # The stages with async rules, as the paths checked right away and the ones checked concurrently
+        self.concurrent: dict[RuleCost, tuple[tuple[tuple[str, tuple[Rule, ...]], ...], ...]] = {
+            cost: (
+                tuple((path, rules) for path, rules in stage if not self.awaits(rules)),
+                tuple((path, rules) for path, rules in stage if self.awaits(rules)),
+            )
+            for cost, stage in self.stages.items() if any(self.awaits(rules) for path, rules in stage)
+        }
+
+        self.lookups: tuple[tuple[str, ExistsInRule], ...] = tuple(
+            (path, rule) for path, path_rules in self.paths for rule in path_rules if isinstance(rule, ExistsInRule)
+        )
+
+    def stage(self, cost: RuleCost) -> tuple[tuple[str, tuple[Rule, ...]], ...]:
+        stage = []
+
+        for path, rules in self.paths:
+            stage_rules = tuple(
+                rule for index, rule in enumerate(rules)
+                if rule.cost == cost
+                or rule.stops and rule.cost < cost and any(later.cost == cost for later in rules[index + 1:])
+            )
+
+            if any(rule.cost == cost for rule in stage_rules):
+                stage.append((path, stage_rules))
+
+        return tuple(stage)
+
+    @staticmethod
+    def awaits(rules: tuple[Rule, ...]) -> bool:
+        return any(isinstance(rule, AsyncRule) for rule in rules)
+
+    @staticmethod
+    def session(context: ValidationContext) -> AsyncContextManager[AsyncSession | None]:
+        """A session of its own for the async rules of a path, on the same database as the request's session"""
+        if context.db_session is None:
+            return nullcontext()
+
+        return AsyncSession(bind=context.db_session.bind, autoflush=False, expire_on_commit=False)
+
+    def plan_lookups(self, context: ValidationContext, lookups: Lookups) -> Lookups:
+        for path, rule in self.lookups:
+            value = getattr(context.schema, path)
+
+            if value is not None and not context.identity_map.has(rule.model, rule.column, value):
+                lookups[rule.model][rule.column].add(value)
+
+        return lookups
+
+    def check(self, context: ValidationContext, cost: RuleCost) -> None:
+        """Runs the rules of the stage, and raises the error of the first of them to fail"""
+        self.check_paths(self.stages[cost], context)
+
+    @staticmethod
+    def check_paths(paths: tuple[tuple[str, tuple[Rule, ...]], ...], context: ValidationContext) -> None:
+        schema = context.schema
+
+        for path, rules in paths:
+            value = getattr(schema, path)
+
+            for rule in rules:
+                if rule.validate(value, context):
+                    continue
+
+                # If the value is null and has a nullable rule in front it should skip the rest of the rules
+                if rule.stops:
+                    break
+
+                rule.fail(path)
+
+    async def check_concurrently(
+            self,
+            context: ValidationContext,
+            cost: RuleCost,
+            semaphore: asyncio.Semaphore
+    ) -> None:
+        """
+        Runs the rules of the stage, the paths without async rules first and then the ones with async rules all at once,
+        no more async rules at a time than the semaphore lets through, and raises the error of the first path to fail
+        """
+        paths, concurrent_paths = self.concurrent[cost]
+
+        self.check_paths(paths, context)
+
+        results = await asyncio.gather(
+            *(self.check_path_concurrently(path, rules, context, semaphore) for path, rules in concurrent_paths),
+            return_exceptions=True
+        )
+
+        for result in results:
+            if isinstance(result, BaseException):
+                raise result
+
+    @classmethod
+    async def check_path_concurrently(
+            cls,
+            path: str,
+            rules: tuple[Rule, ...],
+            context: ValidationContext,
+            semaphore: asyncio.Semaphore
+    ) -> None:
+        async with cls.session(context) as db_session:
+            path_context = ValidationContext(context.schema, context.identity_map, db_session)
+            value = getattr(context.schema, path)
+
+            for rule in rules:
+                if isinstance(rule, AsyncRule):
+                    async with semaphore:
+                        passed = await rule.validate(value, path_context)
+                else:
+                    passed = rule.validate(value, path_context)
+
+                if passed:
+                    continue
+
+                if rule.stops:
+                    break
+
+                rule.fail(path)
+
+    async def check_column(
+            self,
+            contexts: list[ValidationContext],
+            cost: RuleCost,
+            rows: list[int],
+            errors: dict[int, str],
+            semaphore: asyncio.Semaphore | None = None
+    ) -> None:
+        """
+        Runs the rules of the stage over several payloads a path at a time, each rule over the values of every payload
+        still passing in a single loop, and records the first rule each of the payloads fails by its index. The paths
+        with async rules are checked all at once, after the rest of them.
+        """
+        paths, concurrent_paths = self.concurrent.get(cost, (self.stages[cost], ()))
+
+        for path, rules in paths:
+            pending = [row for row in rows if row not in errors]
+
+            errors.update(await self.check_path_column(path, rules, contexts, pending))
+
+        if not concurrent_paths:
+            return
+
+        pending = [row for row in rows if row not in errors]
+        results = await asyncio.gather(*(
+            self.check_path_column_concurrently(path, rules, contexts, pending, semaphore)
+            for path, rules in concurrent_paths
+        ))
+
+        for path_errors in results:
+            for row, message in path_errors.items():
+                errors.setdefault(row, message)
+
+    @classmethod
+    async def check_path_column_concurrently(
+            cls,
+            path: str,
+            rules: tuple[Rule, ...],
+            contexts: list[ValidationContext],
+            rows: list[int],
+            semaphore: asyncio.Semaphore
+    ) -> dict[int, str]:
+        async with cls.session(contexts[0]) as db_session:
+            path_contexts = [
+                ValidationContext(context.schema, context.identity_map, db_session) for context in contexts
+            ]
+
+            return await cls.check_path_column(path, rules, path_contexts, rows, semaphore)
+
+    @staticmethod
+    async def check_path_column(
+            path: str,
+            rules: tuple[Rule, ...],
+            contexts: list[ValidationContext],
+            rows: list[int],
+            semaphore: asyncio.Semaphore | None = None
+    ) -> dict[int, str]:
+        errors = {}
+        pending = rows
+        pending_contexts = [contexts[row] for row in pending]
+        values = [getattr(context.schema, path) for context in pending_contexts]
+
+        for rule in rules:
+            if not pending:
+                break
+
+            if isinstance(rule, AsyncRule):
+                async with semaphore:
+                    passed = await rule.validate_column(values, pending_contexts)
+            else:
+                passed = rule.validate_column(values, pending_contexts)
+
+            if all(passed):
+                continue
+
+            if not rule.stops:
+                errors.update((row, rule.message(path)) for row, valid in zip(pending, passed) if not valid)
+
+            pending = [row for row, valid in zip(pending, passed) if valid]
+            pending_contexts = [context for context, valid in zip(pending_contexts, passed) if valid]
+            values = [value for value, valid in zip(values, passed) if valid]
+
+        return errors
+
+
+class ConstrainedSchema:
+    """
+    The schema rules of a validator, enforced by pydantic while it parses a payload into a subclass of the schema: the
+    rules of a single field become the constraints of its annotation, and the rest of them run in a validator of the
+    model, so the payload is checked in the same pass of pydantic-core it is parsed in.
+    """
+
+    __slots__ = ('fields', 'checks')
+
+    def __init__(self, rules: dict[str, list[Rule]]):
+        self.fields: dict[str, FieldConstraints] = {}
+        checks = []
+
+        for path, path_rules in rules.items():
+            field = FieldConstraints()
+
+            # The stopping rules stay in front of the checks following them even once they constrain the field
+            path_checks = [
+                rule for rule in path_rules
+                if rule.cost is RuleCost.SCHEMA and (not rule.constrain(field) or rule.stops)
+            ]
+
+            while path_checks and path_checks[-1].stops:
+                path_checks.pop()
+
+            if any(rule.cost is RuleCost.SCHEMA for rule in path_rules):
+                self.fields[path] = field
+
+            if path_checks:
+                checks.append((path, tuple(path_checks)))
+
+        self.checks: tuple[tuple[str, tuple[Rule, ...]], ...] = tuple(checks)
+
+    def model(self, schema_class: Type[BaseModel], annotations: dict[str, Any]) -> Type[BaseModel]:
+        fields = {}
+
+        for path in [*self.fields, *(path for path in annotations if path not in self.fields)]:
+            field_info = schema_class.model_fields[path]
+            field = self.fields.get(path, FieldConstraints())
+
+            if field.required:
+                field_info = FieldInfo.merge_field_infos(field_info, default=PydanticUndefined)
+
+            fields[path] = (field.annotation(annotations.get(path, field_info.annotation)), field_info)
+
+        validators = {}
+        checks = self.checks
+
+        if checks:
+            def check_rules(model: BaseModel) -> BaseModel:
+                ValidationPlan.check_paths(checks, ValidationContext(model))
+
+                return model
+
+            validators['check_rules'] = model_validator(mode='after')(check_rules)
+
+        return create_model(
+            schema_class.__name__,
+            __base__=schema_class,
+            __module__=schema_class.__module__,
+            __validators__=validators,
+            **fields
+        )
 
 
 class Validator:
-    def __init__(self, schema: BaseModel):
+    schema_class: Type[BaseModel] | None = None
+
+    _plans: dict[type, ValidationPlan] = {}
+    _models: dict[type, Type[BaseModel]] = {}
+
+    def __init__(self, schema: BaseModel, db_session: AsyncSession | None = None):
         self.schema: BaseModel = schema
+        self.db_session: AsyncSession | None = db_session
 
-    def rules(self) -> dict[str, list[Rule]]:
+    @classmethod
+    def rules(cls) -> dict[str, list[Rule]]:
         raise NotImplementedError()
 
-    def validate(self) -> None:
-        for path, rules in self.rules().items():
-            for rule in rules:
-                rule.path = path
-                rule.schema = self.schema
-
-                try:
-                    rule.validate()
-                except RequestValidationError as e:
-                    print(e.message)
-                except NullableValidationError:
-                    # If the value is null and has a nullable rule in front it should skip the rest of the rules
-                    break
+    @classmethod
+    def plan(cls) -> ValidationPlan:
+        """The rules of the validator, compiled the first time it validates a payload"""
+        plan = Validator._plans.get(cls)
+
+        if plan is None:
+            plan = Validator._plans[cls] = ValidationPlan(cls.rules())
+
+        return plan
+
+    @classmethod
+    def annotations(cls) -> dict[str, Any]:
+        """The annotations of the fields of the constrained schema that differ from the ones of the schema class"""
+        return {}
+
+    @classmethod
+    def model(cls) -> Type[BaseModel]:
+        """The schema class constrained by the schema rules of the validator, for the payloads to be parsed into"""
+        model = Validator._models.get(cls)
+
+        if model is None:
+            model = Validator._models[cls] = ConstrainedSchema(cls.rules()).model(cls.schema_class, cls.annotations())
+
+        return model
+
+    def parsed(self) -> bool:
+        """Whether pydantic already enforced the schema rules while parsing the payload into the constrained schema"""
+        model = Validator._models.get(type(self))
+
+        return model is not None and isinstance(self.schema, model)
+
+    def context(self) -> ValidationContext:
+        identity_map = IdentityMap.of(self.db_session) if self.db_session is not None else IdentityMap()
+
+        return ValidationContext(self.schema, identity_map, self.db_session)
+
+    def semaphore(self) -> asyncio.Semaphore:
+        """Caps the async rules the request runs at once, across every payload it validates"""
+        if self.db_session is None:
+            return asyncio.Semaphore(DB_VALIDATION_CONCURRENCY)
+
+        semaphore = self.db_session.info.get('validation_semaphore')
+
+        if semaphore is None:
+            semaphore = self.db_session.info['validation_semaphore'] = asyncio.Semaphore(DB_VALIDATION_CONCURRENCY)
+
+        return semaphore
+
+    async def validate(self) -> None:
+        await self.validate_all([self])
+
+    @staticmethod
+    async def validate_all(validators: list[Validator]) -> None:
+        """
+        Validates several payloads on the same session together, a stage at a time, and fails on the first rule any of
+        them fails. The lookups of the database backed rules of all of them are only resolved once every cheaper rule
+        passed, so that invalid payloads never reach the database, and the lookups against the same model are still
+        answered by a single query. The schema rules of the payloads parsed into the constrained schema are skipped, as
+        pydantic already enforced them.
+        """
+        if not validators:
+            return
+
+        plans = [(validator.plan(), validator.context()) for validator in validators]
+
+        costs = [
+            plan.parsed_costs if validator.parsed() else plan.costs
+            for validator, (plan, context) in zip(validators, plans)
+        ]
+
+        for cost in RULE_COSTS:
+            if cost is RuleCost.DATABASE:
+                await validators[0].resolve_database_rules(plans)
+
+            for (plan, context), plan_costs in zip(plans, costs):
+                if cost not in plan_costs:
+                    continue
+
+                if cost in plan.concurrent:
+                    await plan.check_concurrently(context, cost, validators[0].semaphore())
+                else:
+                    plan.check(context, cost)
+
+    @classmethod
+    async def validate_batch(cls, schemas: list[BaseModel], db_session: AsyncSession | None = None) -> None:
+        """
+        Validates a list of payloads of the validator column-wise, a stage at a time, and fails with the error of every
+        payload failing a rule of the stage, by its index. The lookups of the database backed rules of all of them are
+        resolved in a single query per model once every cheaper rule passed.
+        """
+        if not schemas:
+            return
+
+        validators = [cls(schema, db_session) for schema in schemas]
+        contexts = [validator.context() for validator in validators]
+        plan = cls.plan()
+        errors = {}
+
+        for cost in plan.costs:
+            if cost is RuleCost.DATABASE:
+                await validators[0].resolve_database_rules([(plan, context) for context in contexts])
+
+            rows = [
+                row for row, validator in enumerate(validators) if cost is not RuleCost.SCHEMA or not validator.parsed()
+            ]
+            await plan.check_column(contexts, cost, rows, errors, validators[0].semaphore())
+
+            if errors:
+                errors = dict(sorted(errors.items()))
+
+                raise BatchValidationError('\n'.join(f'{row}: {message}' for row, message in errors.items()), errors)
+
+    async def resolve_database_rules(self, plans: list[tuple[ValidationPlan, ValidationContext]]) -> None:
+        """
+        Plans the lookups of every database backed rule in the payloads up front and answers all the lookups against
+        the same model in a single query on the request's session. The resolved rows are kept in the request's identity
+        map, where the rules read them from, as do the controllers and services handling the rest of the request.
+        """
+        # Nothing can be looked up without a session, so the database backed rules fail as for rows that do not exist
+        if self.db_session is None:
+            return
+
+        lookups = Lookups()
+
+        for plan, context in plans:
+            plan.plan_lookups(context, lookups)
+
+        await self.resolve_lookups(lookups)
+
+    async def resolve_lookups(self, lookups: Lookups) -> None:
+        """
+        Answers the lookups against each model with a query of its own. The lookups of a single model run on the
+        request's session; those of several models run concurrently, each on a session of its own as a session runs a
+        single query at a time, no more of them at once than the semaphore of the request lets through, and their rows
+        are merged into the request's session.
+        """
+        if len(lookups) <= 1:
+            for model, columns in lookups.items():
+                self.add_rows(model, columns, await self.fetch_rows(self.db_session, model, columns))
+
+            return
+
+        semaphore = self.semaphore()
+        results = await asyncio.gather(
+            *(self.fetch_rows_concurrently(model, columns, semaphore) for model, columns in lookups.items())
+        )
+
+        for (model, columns), rows in zip(lookups.items(), results):
+            self.add_rows(model, columns, [await self.db_session.merge(row, load=False) for row in rows])
+
+    async def fetch_rows_concurrently(
+            self,
+            model: Type[Base],
+            columns: dict[str, set[Any]],
+            semaphore: asyncio.Semaphore
+    ) -> list[Base]:
+        async with semaphore, self.lookup_session() as db_session:
+            return await self.fetch_rows(db_session, model, columns)
+
+    def lookup_session(self) -> AsyncSession:
+        return AsyncSession(bind=self.db_session.bind, autoflush=False, expire_on_commit=False)
+
+    @staticmethod
+    async def fetch_rows(db_session: AsyncSession, model: Type[Base], columns: dict[str, set[Any]]) -> list[Base]:
+        cache = ModelCache.for_model(model)
+
+        if cache is not None:
+            return await cache.fetch_many(db_session, columns)
+
+        return list(await db_session.scalars(
+            select(model).where(or_(*[getattr(model, column).in_(values) for column, values in columns.items()]))
+        ))
+
+    def add_rows(self, model: Type[Base], columns: dict[str, set[Any]], rows: list[Base]) -> None:
+        identity_map = IdentityMap.of(self.db_session)
+
+        for row in rows:
+            identity_map.add(row, columns)
+
+        for column, values in columns.items():
+            for value in values:
+                identity_map.add_missing(model, column, value)
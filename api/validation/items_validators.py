@@ -1,19 +1,27 @@
+from typing import Any
+
 from api.database.models import Product
+from api.schemas import ItemCreateSchema, ItemBulkCreateSchema, ItemPartialUpdateSchema
 from api.validation.base_rules import Rule, RequiredRule, RequiredIfRule, NullableRule, StringRule, IntegerRule, \
     ExistsInRule, GreaterThanRule
 from api.validation.base_validators import Validator
 
 
 class CreateItemValidator(Validator):
-    def rules(self) -> dict[str, list[Rule]]:
+    schema_class = ItemCreateSchema
+
+    @classmethod
+    def rules(cls) -> dict[str, list[Rule]]:
         return {
             'product_id': [
-                RequiredIfRule(self.schema.product_name is None),
+                RequiredIfRule('product_name', None),
+                NullableRule(),
                 IntegerRule(),
                 ExistsInRule(Product)
             ],
             'product_name': [
-                RequiredIfRule(self.schema.product_id is None),
+                RequiredIfRule('product_id', None),
+                NullableRule(),
                 StringRule(),
                 ExistsInRule(Product, 'name')
             ],
@@ -25,8 +33,32 @@ class CreateItemValidator(Validator):
         }
 
 
+class BulkCreateItemValidator(Validator):
+    schema_class = ItemBulkCreateSchema
+
+    @classmethod
+    def annotations(cls) -> dict[str, Any]:
+        return {'items': list[CreateItemValidator.model()]}
+
+    @classmethod
+    def rules(cls) -> dict[str, list[Rule]]:
+        return {
+            'items': [
+                RequiredRule()
+            ]
+        }
+
+    async def validate(self) -> None:
+        await super().validate()
+
+        await CreateItemValidator.validate_batch(self.schema.items, self.db_session)
+
+
 class PartialUpdateItemValidator(Validator):
-    def rules(self) -> dict[str, list[Rule]]:
+    schema_class = ItemPartialUpdateSchema
+
+    @classmethod
+    def rules(cls) -> dict[str, list[Rule]]:
         return {
             'quantity': [
                 RequiredRule(),
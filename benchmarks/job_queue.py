@@ -0,0 +1,73 @@
+"""
+Jobs/sec drained by a single worker from the durable job queue, for jobs that do no work of their own.
+
+    python -m benchmarks.job_queue --jobs 20000 --concurrency 8 --prefetch 248
+"""
+from __future__ import annotations
+
+import argparse
+import os
+import tempfile
+import time
+
+from sqlalchemy import create_engine
+
+from api.database.migrations import MIGRATIONS, Migrator
+from api.database.pragmas import TUNED_PROFILE, apply_pragmas_on_connect
+from api.jobs.base_jobs import Job
+from api.jobs.metrics import JobMetrics
+from api.jobs.queue import JobQueue
+from api.jobs.worker import Worker
+
+
+class NoopJob(Job):
+    queue_name = 'benchmark'
+
+    def handle(self) -> None:
+        pass
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--jobs', type=int, default=20000)
+    parser.add_argument('--concurrency', type=int, default=8)
+    parser.add_argument('--prefetch', type=int, default=248)
+    parser.add_argument('--processes', action='store_true')
+    arguments = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as directory:
+        engine = create_engine(f'sqlite:///{os.path.join(directory, "benchmark.db")}')
+        apply_pragmas_on_connect(engine, TUNED_PROFILE)
+
+        with engine.begin() as connection:
+            Migrator(connection, MIGRATIONS).migrate()
+
+        job_queue = JobQueue(engine)
+
+        started_at = time.perf_counter()
+        job_queue.push([NoopJob() for _ in range(arguments.jobs)])
+        pushed_at = time.perf_counter()
+
+        worker = Worker(
+            ['benchmark'],
+            job_queue,
+            JobMetrics(engine),
+            concurrency=arguments.concurrency,
+            prefetch=arguments.prefetch,
+            use_processes=arguments.processes
+        )
+
+        while worker.run_once():
+            pass
+
+        worker.shutdown()
+        drained_at = time.perf_counter()
+
+        engine.dispose()
+
+    print(f'pushed: {arguments.jobs / (pushed_at - started_at):10.1f} jobs/sec')
+    print(f'ran:    {arguments.jobs / (drained_at - pushed_at):10.1f} jobs/sec')
+
+
+if __name__ == '__main__':
+    main()
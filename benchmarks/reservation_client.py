@@ -0,0 +1,50 @@
+"""
+Reservations/sec made by a worker's threads against a stub reservation service with network-like latency, with every
+call sent on its own and with the calls batched.
+
+    python -m benchmarks.reservation_client --reservations 2000 --concurrency 8 --latency-ms 5 --batch-size 8
+"""
+from __future__ import annotations
+
+import argparse
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from api.jobs.reservation_client import ReservationClient, ReservationRequest, StubReservationClient, \
+    BatchingReservationClient
+
+
+def run(client: ReservationClient, reservations: int, concurrency: int) -> float:
+    started_at = time.perf_counter()
+
+    with ThreadPoolExecutor(concurrency) as executor:
+        list(executor.map(client.reserve, [ReservationRequest(product_id, 1) for product_id in range(reservations)]))
+
+    return reservations / (time.perf_counter() - started_at)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--reservations', type=int, default=2000)
+    parser.add_argument('--concurrency', type=int, default=8)
+    parser.add_argument('--latency-ms', type=float, default=5)
+    parser.add_argument('--batch-size', type=int, default=8)
+    parser.add_argument('--batch-wait-ms', type=float, default=10)
+    arguments = parser.parse_args()
+
+    single = StubReservationClient(arguments.latency_ms / 1000)
+    single_rate = run(single, arguments.reservations, arguments.concurrency)
+
+    batched = StubReservationClient(arguments.latency_ms / 1000)
+    batched_rate = run(
+        BatchingReservationClient(batched, arguments.batch_size, arguments.batch_wait_ms / 1000),
+        arguments.reservations,
+        arguments.concurrency
+    )
+
+    print(f'single:  {single_rate:10.1f} reservations/sec in {single.requests} requests')
+    print(f'batched: {batched_rate:10.1f} reservations/sec in {batched.requests} requests')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,95 @@
+"""
+Writes/sec of concurrent cart writers against a file database, per pragma profile.
+
+    python -m benchmarks.sqlite_writes --writers 8 --writes 250
+"""
+from __future__ import annotations
+
+import argparse
+import os
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+
+from sqlalchemy import create_engine, Engine, insert, update
+from sqlalchemy.exc import OperationalError
+
+from api.database.migrations import MIGRATIONS, Migrator
+from api.database.models import ShoppingCart, Item
+from api.database.pragmas import PROFILES, apply_pragmas_on_connect
+
+
+def build_engine(path: str, profile: str, pool_size: int) -> Engine:
+    engine = create_engine(
+        f'sqlite:///{path}',
+        connect_args={'check_same_thread': False},
+        pool_size=pool_size,
+        max_overflow=0,
+    )
+    apply_pragmas_on_connect(engine, PROFILES[profile])
+
+    with engine.begin() as connection:
+        Migrator(connection, MIGRATIONS).migrate()
+
+    return engine
+
+
+def write(engine: Engine, writer: int, writes: int) -> int:
+    """
+    Every write is a transaction of its own, shaped like adding an item to a cart: insert the item and bump the expiry
+    """
+    locked = 0
+
+    with engine.begin() as connection:
+        shopping_cart_id = connection.execute(
+            insert(ShoppingCart).values(user_id=1, expires_at=datetime.now())
+        ).inserted_primary_key[0]
+
+    for product_id in range(writes):
+        try:
+            with engine.begin() as connection:
+                connection.execute(insert(Item).values(
+                    shopping_cart_id=shopping_cart_id,
+                    product_id=writer * writes + product_id,
+                    quantity=1
+                ))
+                connection.execute(
+                    update(ShoppingCart).where(ShoppingCart.id == shopping_cart_id).values(expires_at=datetime.now())
+                )
+        except OperationalError:
+            locked += 1
+
+    return locked
+
+
+def benchmark(profile: str, writers: int, writes: int) -> tuple[float, int]:
+    with tempfile.TemporaryDirectory() as directory:
+        engine = build_engine(os.path.join(directory, 'benchmark.db'), profile, writers)
+
+        started_at = time.perf_counter()
+
+        with ThreadPoolExecutor(writers) as executor:
+            locked = sum(executor.map(lambda writer: write(engine, writer, writes), range(writers)))
+
+        elapsed = time.perf_counter() - started_at
+        engine.dispose()
+
+    return (writers * writes - locked) / elapsed, locked
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--writers', type=int, default=8)
+    parser.add_argument('--writes', type=int, default=250)
+    parser.add_argument('--profiles', nargs='+', default=list(PROFILES), choices=list(PROFILES))
+    arguments = parser.parse_args()
+
+    for profile in arguments.profiles:
+        writes_per_second, locked = benchmark(profile, arguments.writers, arguments.writes)
+
+        print(f'{profile:>10}: {writes_per_second:10.1f} writes/sec, {locked} failed with "database is locked"')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,74 @@
+"""
+Validations/sec of CreateItemValidator, parsing the payloads into its constrained schema as the API does, with the
+products the payloads refer to already in the request's identity map, so that only the validation itself is measured.
+The lines of bulk payloads are validated both one validator per line and column-wise in a single batch.
+
+    python -m benchmarks.validation --validations 100000 --lines 200
+"""
+from __future__ import annotations
+
+import argparse
+import asyncio
+import time
+from types import SimpleNamespace
+
+from api.database.identity_map import IdentityMap
+from api.database.models import Product
+from api.validation.base_validators import Validator
+from api.validation.items_validators import CreateItemValidator
+
+PAYLOADS = [
+    {'product_id': 1, 'product_name': 'Computer', 'quantity': 2},
+    {'product_id': 1, 'product_name': 'Computer'},
+]
+
+
+def make_db_session() -> SimpleNamespace:
+    db_session = SimpleNamespace(info={})
+    IdentityMap.of(db_session).add(Product(id=1, name='Computer'), ['name'])
+
+    return db_session
+
+
+async def run(validations: int) -> float:
+    db_session = make_db_session()
+    model = CreateItemValidator.model()
+
+    started_at = time.perf_counter()
+
+    for index in range(validations):
+        await CreateItemValidator(model.model_validate(PAYLOADS[index % 2]), db_session).validate()
+
+    return validations / (time.perf_counter() - started_at)
+
+
+async def run_lines(validations: int, lines: int, batched: bool) -> float:
+    db_session = make_db_session()
+    model = CreateItemValidator.model()
+    schemas = [model.model_validate(PAYLOADS[index % 2]) for index in range(lines)]
+    batches = max(validations // lines, 1)
+
+    started_at = time.perf_counter()
+
+    for _ in range(batches):
+        if batched:
+            await CreateItemValidator.validate_batch(schemas, db_session)
+        else:
+            await Validator.validate_all([CreateItemValidator(schema, db_session) for schema in schemas])
+
+    return batches * lines / (time.perf_counter() - started_at)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--validations', type=int, default=100000)
+    parser.add_argument('--lines', type=int, default=200)
+    arguments = parser.parse_args()
+
+    print(f'validated: {asyncio.run(run(arguments.validations)):10.1f} payloads/sec')
+    print(f'per line:  {asyncio.run(run_lines(arguments.validations, arguments.lines, False)):10.1f} lines/sec')
+    print(f'batched:   {asyncio.run(run_lines(arguments.validations, arguments.lines, True)):10.1f} lines/sec')
+
+
+if __name__ == '__main__':
+    main()
@@ -1,30 +1,27 @@
 from fastapi import FastAPI
-from sqlalchemy import event
 
 from api.controllers.items_controller import ItemsController
-from api.database.configuration import engine, DBSession
-from api.database.models import User, Base, Product
-from api.database.seeder import seed_table
+from api.database.configuration import engine, async_engine, DB_STATEMENT_BUDGET
+from api.database.migrations import MIGRATIONS, Migrator
+from api.database.statement_budget import StatementBudgetMiddleware
+from api.jobs.metrics import job_metrics
+from api.metrics import metrics
 
-event.listen(User.__table__, 'after_create', seed_table)
-event.listen(Product.__table__, 'after_create', seed_table)
+app = FastAPI(exception_handlers=ItemsController.exception_handlers())
 
-app = FastAPI()
+if DB_STATEMENT_BUDGET is not None:
+    app.add_middleware(StatementBudgetMiddleware, max_statements=DB_STATEMENT_BUDGET)
 
-items_controller = ItemsController(DBSession())
-app.include_router(items_controller.router)
+app.include_router(ItemsController.router())
+app.include_router(metrics.router())
+
+metrics.collector(job_metrics.render)
 
 @app.on_event("startup")
 def configure():
-    Base.metadata.create_all(bind=engine)
-
-
-
-
-
-
-
-
-
+    Migrator.migrate_engine(engine, MIGRATIONS)
 
 
+@app.on_event("shutdown")
+async def teardown():
+    await async_engine.dispose()
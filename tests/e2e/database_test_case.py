@@ -0,0 +1,45 @@
+from typing import AsyncIterator
+from unittest import IsolatedAsyncioTestCase
+
+from fastapi import FastAPI
+from httpx import AsyncClient, ASGITransport
+from sqlalchemy import StaticPool
+from sqlalchemy.ext.asyncio import create_async_engine, async_sessionmaker, AsyncSession
+
+from api.controllers.items_controller import ItemsController
+from api.database.configuration import get_async_db_session
+from api.database.migrations import MIGRATIONS, Migrator
+from api.database.model_cache import product_cache
+from api.database.statement_budget import listen_for_statements
+
+
+def migrate(connection) -> None:
+    Migrator(connection, MIGRATIONS).migrate()
+
+
+class DatabaseTestCase(IsolatedAsyncioTestCase):
+    async def asyncSetUp(self) -> None:
+        self.engine = create_async_engine('sqlite+aiosqlite://', poolclass=StaticPool)
+        listen_for_statements(self.engine.sync_engine)
+
+        async with self.engine.begin() as connection:
+            await connection.run_sync(migrate)
+
+        self.db_session_factory = async_sessionmaker(bind=self.engine, autoflush=False, expire_on_commit=False)
+
+        app = FastAPI(exception_handlers=ItemsController.exception_handlers())
+        app.include_router(ItemsController.router())
+        app.dependency_overrides[get_async_db_session] = self.get_db_session
+
+        self.client = AsyncClient(transport=ASGITransport(app=app), base_url='http://testserver')
+
+    async def asyncTearDown(self) -> None:
+        await self.client.aclose()
+        await self.engine.dispose()
+
+        # Every test case seeds a database of its own, so none of them may see the rows cached by another
+        product_cache.clear()
+
+    async def get_db_session(self) -> AsyncIterator[AsyncSession]:
+        async with self.db_session_factory() as db_session:
+            yield db_session
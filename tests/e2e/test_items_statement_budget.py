@@ -0,0 +1,151 @@
+from datetime import datetime, timedelta
+
+from sqlalchemy import event, select
+
+from api.database.models import ShoppingCart, Item, Product, OutboxJob
+from api.database.statement_budget import statement_budget
+from api.exceptions import StatementBudgetExceededError
+from api.jobs.reservation_jobs import ReserveItemJob, ReleaseReservedItemJob
+from tests.e2e.database_test_case import DatabaseTestCase
+
+
+class ItemsStatementBudgetE2ETest(DatabaseTestCase):
+    async def asyncSetUp(self) -> None:
+        await super().asyncSetUp()
+
+        async with self.db_session_factory() as db_session:
+            shopping_cart = ShoppingCart(user_id=1, expires_at=datetime.now() + timedelta(minutes=30))
+            db_session.add_all([
+                Item(shopping_cart=shopping_cart, product_id=1, quantity=1),
+                Item(shopping_cart=shopping_cart, product_id=2, quantity=3),
+                Item(shopping_cart=shopping_cart, product=Product(name='Keyboard', price=50), quantity=0),
+            ])
+            await db_session.commit()
+
+    async def test_index_loads_products_without_n_plus_one(self) -> None:
+        with statement_budget(2):
+            response = await self.client.get('/items')
+
+        self.assertEqual(200, response.status_code)
+        self.assertEqual(
+            ['Computer', 'Monitor'],
+            [item['product']['name'] for item in response.json()['items']]
+        )
+
+    async def test_partial_update(self) -> None:
+        with statement_budget(6):
+            response = await self.client.patch('/items/2', json={'quantity': 5})
+
+        self.assertEqual(200, response.status_code)
+        self.assertEqual(5, response.json()['quantity'])
+        self.assertEqual('Monitor', response.json()['product']['name'])
+
+    async def test_delete(self) -> None:
+        with statement_budget(6):
+            response = await self.client.delete('/items/2')
+
+        self.assertEqual(200, response.status_code)
+
+    async def test_create_resolves_product_once(self) -> None:
+        with statement_budget(7):
+            response = await self.client.post('/items', json={'product_name': 'Monitor', 'quantity': 1})
+
+        self.assertEqual(200, response.status_code)
+        self.assertEqual('Monitor', response.json()['product']['name'])
+        self.assertEqual(4, response.json()['quantity'])
+
+    async def test_bulk_create(self) -> None:
+        lines = [{'product_id': 1, 'quantity': 1}, {'product_name': 'Monitor', 'quantity': 2}, {'product_id': 1}]
+
+        with statement_budget(7):
+            response = await self.client.post('/items/bulk', json={'items': lines})
+
+        self.assertEqual(200, response.status_code)
+        self.assertEqual(
+            [('Computer', 3), ('Monitor', 5)],
+            [(item['product']['name'], item['quantity']) for item in response.json()]
+        )
+
+    async def test_invalid_payloads_are_rejected_while_parsing(self) -> None:
+        requests = [
+            ('POST', '/items', {'quantity': 1}),
+            ('POST', '/items', {'product_id': 'Monitor'}),
+            ('POST', '/items/bulk', {'items': [{'product_id': 1}, {'product_id': 2, 'quantity': -1}]}),
+            ('PATCH', '/items/2', {'quantity': -5}),
+        ]
+
+        for method, url, payload in requests:
+            # Only the authenticated user is loaded, the payload is rejected before any product is looked up
+            with statement_budget(1):
+                response = await self.client.request(method, url, json=payload)
+
+            self.assertEqual(422, response.status_code, f'{method} {url}')
+
+    async def test_null_quantities_add_the_default_quantity_to_existing_items(self) -> None:
+        response = await self.client.post('/items', json={'product_id': 1, 'quantity': None})
+
+        self.assertEqual(200, response.status_code)
+        self.assertEqual(2, response.json()['quantity'])
+
+        response = await self.client.post('/items/bulk', json={'items': [{'product_id': 2, 'quantity': None}]})
+
+        self.assertEqual(200, response.status_code)
+        self.assertEqual([4], [item['quantity'] for item in response.json()])
+
+    async def test_unknown_products_are_rejected_with_their_errors(self) -> None:
+        response = await self.client.post('/items', json={'product_id': 999})
+
+        self.assertEqual(422, response.status_code)
+        self.assertEqual(
+            {'detail': f'The value for "product_id" must exist in column "id" of model "{Product}".'},
+            response.json()
+        )
+
+        response = await self.client.post(
+            '/items/bulk',
+            json={'items': [{'product_id': 1}, {'product_id': 999}, {'product_name': 'Unknown'}]}
+        )
+
+        self.assertEqual(422, response.status_code)
+        self.assertEqual(
+            {
+                '1': f'The value for "product_id" must exist in column "id" of model "{Product}".',
+                '2': f'The value for "product_name" must exist in column "name" of model "{Product}".',
+            },
+            response.json()['errors']
+        )
+
+    async def test_cart_operations_commit_once(self) -> None:
+        commits = []
+        event.listen(self.engine.sync_engine, 'commit', lambda connection: commits.append(connection))
+
+        requests = [
+            ('POST', '/items', {'product_name': 'Monitor', 'quantity': 1}),
+            ('POST', '/items/bulk', {'items': [{'product_id': 1}, {'product_id': 2}]}),
+            ('PATCH', '/items/2', {'quantity': 5}),
+            ('DELETE', '/items/2', None),
+        ]
+
+        for method, url, payload in requests:
+            commits.clear()
+
+            response = await self.client.request(method, url, json=payload)
+
+            self.assertEqual(200, response.status_code)
+            self.assertEqual(1, len(commits), f'{method} {url}')
+
+    async def test_cart_operations_write_their_jobs_to_the_outbox(self) -> None:
+        await self.client.post('/items', json={'product_name': 'Monitor', 'quantity': 1})
+        await self.client.delete('/items/1')
+
+        async with self.db_session_factory() as db_session:
+            job_classes = (await db_session.scalars(select(OutboxJob.job_class).order_by(OutboxJob.id))).all()
+
+        self.assertEqual([ReserveItemJob.class_path(), ReleaseReservedItemJob.class_path()], job_classes)
+
+    async def test_budget_is_enforced(self) -> None:
+        with self.assertRaises(StatementBudgetExceededError) as mock_e:
+            with statement_budget(1):
+                await self.client.get('/items')
+
+        self.assertIn('Issued 2 SQL statements, the budget is 1', mock_e.exception.message)
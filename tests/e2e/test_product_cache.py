@@ -0,0 +1,39 @@
+from sqlalchemy import select
+
+from api.database.model_cache import product_cache
+from api.database.models import Product
+from api.database.statement_budget import statement_budget
+from tests.e2e.database_test_case import DatabaseTestCase
+
+
+class ProductCacheE2ETest(DatabaseTestCase):
+    async def test_create_skips_product_lookup_once_cached(self) -> None:
+        with statement_budget(9) as budget:
+            response = await self.client.post('/items', json={'product_name': 'Monitor', 'quantity': 1})
+
+        self.assertEqual(200, response.status_code)
+        self.assertTrue(any('FROM products' in statement for statement in budget.statements))
+
+        with statement_budget(6) as budget:
+            response = await self.client.post('/items', json={'product_name': 'Monitor', 'quantity': 1})
+
+        self.assertEqual(200, response.status_code)
+        self.assertEqual(2, response.json()['quantity'])
+        self.assertEqual('Monitor', response.json()['product']['name'])
+        self.assertFalse(any('FROM products' in statement for statement in budget.statements))
+
+    async def test_product_writes_invalidate_the_cache(self) -> None:
+        await self.client.post('/items', json={'product_name': 'Monitor', 'quantity': 1})
+        self.assertIsNotNone(product_cache.get('name', 'Monitor'))
+
+        async with self.db_session_factory() as db_session:
+            product = await db_session.scalar(select(Product).where(Product.name == 'Monitor'))
+            product.name = 'Display'
+            await db_session.commit()
+
+        self.assertIsNone(product_cache.get('name', 'Monitor'))
+
+        response = await self.client.post('/items', json={'product_name': 'Display', 'quantity': 1})
+
+        self.assertEqual(200, response.status_code)
+        self.assertEqual('Display', response.json()['product']['name'])
@@ -0,0 +1,51 @@
+from unittest.mock import MagicMock
+
+from sqlalchemy import select, Select
+
+from api.controllers.items_controller import ItemsController
+from api.database.models import Item, ShoppingCart, User
+from tests.e2e.database_test_case import DatabaseTestCase
+
+
+class QueryPlansE2ETest(DatabaseTestCase):
+    async def query_plan(self, statement: Select) -> list[str]:
+        async with self.engine.connect() as connection:
+            compiled = statement.compile(connection.sync_connection)
+            parameters = tuple(compiled.params[name] for name in compiled.positiontup)
+
+            result = await connection.exec_driver_sql(f'EXPLAIN QUERY PLAN {compiled}', parameters)
+
+            return [row[3] for row in result]
+
+    async def test_index_uses_the_non_removed_items_index(self) -> None:
+        controller = ItemsController(MagicMock())
+        controller._user = User(id=1)
+
+        plan = await self.query_plan(controller.index_statement(after=10).limit(50))
+
+        self.assertIn('SEARCH shopping_carts USING INDEX ix_shopping_carts_user_id (user_id=?)', plan)
+        self.assertIn(
+            'SEARCH items USING INDEX ix_items_shopping_cart_id_id_not_removed (shopping_cart_id=? AND id>?)',
+            plan
+        )
+
+    async def test_item_of_product_in_cart_uses_the_unique_index(self) -> None:
+        plan = await self.query_plan(select(Item).where(Item.shopping_cart_id == 1).where(Item.product_id == 2))
+
+        self.assertEqual(
+            ['SEARCH items USING INDEX ix_items_shopping_cart_id_product_id (shopping_cart_id=? AND product_id=?)'],
+            plan
+        )
+
+    async def test_shopping_cart_of_user_uses_the_user_index(self) -> None:
+        plan = await self.query_plan(select(ShoppingCart).where(ShoppingCart.user == User(id=1)))
+
+        self.assertEqual(['SEARCH shopping_carts USING INDEX ix_shopping_carts_user_id (user_id=?)'], plan)
+
+    async def test_expired_shopping_carts_use_the_expiry_index(self) -> None:
+        plan = await self.query_plan(select(ShoppingCart.id).where(ShoppingCart.expires_at < '2024-01-01'))
+
+        self.assertEqual(
+            ['SEARCH shopping_carts USING COVERING INDEX ix_shopping_carts_expires_at (expires_at<?)'],
+            plan
+        )
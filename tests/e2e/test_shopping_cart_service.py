@@ -0,0 +1,64 @@
+import asyncio
+import os
+import tempfile
+from datetime import datetime, timedelta
+from unittest import IsolatedAsyncioTestCase
+
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import create_async_engine, async_sessionmaker
+
+from api.database.model_cache import product_cache
+from api.database.models import User, ShoppingCart, Item
+from api.services.shopping_cart_service import ShoppingCartService
+from tests.e2e.database_test_case import migrate
+
+
+class ShoppingCartServiceE2ETest(IsolatedAsyncioTestCase):
+    async def asyncSetUp(self) -> None:
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+
+        # Every session gets a connection of its own, as concurrent requests do
+        self.engine = create_async_engine(f'sqlite+aiosqlite:///{os.path.join(directory.name, "cart.db")}')
+
+        async with self.engine.begin() as connection:
+            await connection.run_sync(migrate)
+
+        self.db_session_factory = async_sessionmaker(bind=self.engine, expire_on_commit=False)
+
+        async with self.db_session_factory() as db_session:
+            db_session.add(ShoppingCart(user_id=1, expires_at=datetime.now() + timedelta(minutes=30)))
+            await db_session.commit()
+
+    async def asyncTearDown(self) -> None:
+        await self.engine.dispose()
+
+        product_cache.clear()
+
+    async def add(self, *lines: tuple[int, int]) -> list[Item]:
+        async with self.db_session_factory() as db_session:
+            service = ShoppingCartService(db_session).for_user(await db_session.get(User, 1))
+
+            if len(lines) == 1:
+                return [await service.add_item(*lines[0])]
+
+            return await service.add_items(list(lines))
+
+    async def items(self) -> list[tuple[int, int]]:
+        async with self.db_session_factory() as db_session:
+            items = await db_session.scalars(select(Item).order_by(Item.product_id))
+
+            return [(item.product_id, item.quantity) for item in items]
+
+    async def test_concurrent_adds_of_the_same_product_add_up(self) -> None:
+        await asyncio.gather(self.add((1, 2)), self.add((1, 3)))
+
+        self.assertEqual([(1, 5)], await self.items())
+
+    async def test_concurrent_bulk_adds_of_the_same_products_add_up(self) -> None:
+        first, second = await asyncio.gather(self.add((1, 1), (2, 2)), self.add((2, 3), (1, 4)))
+
+        self.assertEqual([(1, 5), (2, 5)], await self.items())
+        self.assertEqual([1, 2], [item.product_id for item in first])
+        self.assertEqual([2, 1], [item.product_id for item in second])
+        self.assertEqual('Computer', first[0].product.name)
@@ -1,34 +1,89 @@
-from unittest import TestCase
-from unittest.mock import patch, MagicMock, PropertyMock
+from unittest import IsolatedAsyncioTestCase
+from unittest.mock import patch, MagicMock, AsyncMock
+
+from fastapi.responses import StreamingResponse
 
 from api.controllers.items_controller import ItemsController
-from api.database.models import User, Item, ShoppingCart, Product
-from api.schemas import ItemCreateSchema, ItemPartialUpdateSchema
+from api.database.identity_map import IdentityMap
+from api.database.models import User, Item, Product
+from api.schemas import ItemCreateSchema, ItemPartialUpdateSchema, ItemPageSchema, ItemBulkCreateSchema
+from api.streaming import StreamFormat
+
 
+class ItemsControllerIntegrationTest(IsolatedAsyncioTestCase):
+    async def test_index(self) -> None:
+        product = Product(id=1, name='Computer', price=1500)
+        items = [Item(id=1, shopping_cart_id=1, product=product, quantity=1)]
 
-class ItemsControllerIntegrationTest(TestCase):
-    def test_index(self) -> None:
-        mock_query = MagicMock()
-        mock_query.join = MagicMock(return_value=mock_query)
-        mock_query.filter = MagicMock(return_value=mock_query)
+        mock_result = MagicMock()
+        mock_result.all = MagicMock(return_value=items)
 
         mock_db_session = MagicMock()
-        mock_db_session.query = MagicMock(return_value=mock_query)
+        mock_db_session.scalars = AsyncMock(return_value=mock_result)
 
         controller = ItemsController(mock_db_session)
         controller._user = User(id=1)
 
         with patch.object(controller, 'authorized_to', return_value=None) as mock_authorized_to:
-            controller.index()
+            page = await controller.index()
+
+        self.assertIsInstance(page, ItemPageSchema)
+        self.assertEqual([1], [item.id for item in page.items])
+        self.assertIsNone(page.next_after)
 
         mock_authorized_to.assert_called_once_with('index_items')
-        mock_db_session.query.assert_called_once_with(Item)
-        mock_query.join.assert_called_once_with(ShoppingCart)
+        mock_db_session.scalars.assert_awaited_once()
+
+        statement = str(mock_db_session.scalars.call_args.args[0])
+        self.assertIn('JOIN shopping_carts', statement)
+        self.assertIn('shopping_carts.user_id', statement)
+        self.assertIn('items.quantity !=', statement)
+        self.assertIn('ORDER BY items.id', statement)
+        self.assertIn('LIMIT', statement)
+
+    async def test_index_returns_cursor_of_the_next_page(self) -> None:
+        product = Product(id=1, name='Computer', price=1500)
+        items = [Item(id=identifier, shopping_cart_id=1, product=product, quantity=1) for identifier in (4, 7, 9)]
+
+        mock_result = MagicMock()
+        mock_result.all = MagicMock(return_value=items)
+
+        mock_db_session = MagicMock()
+        mock_db_session.scalars = AsyncMock(return_value=mock_result)
+
+        controller = ItemsController(mock_db_session)
+        controller._user = User(id=1)
+
+        page = await controller.index(limit=2, after=3)
+
+        self.assertEqual([4, 7], [item.id for item in page.items])
+        self.assertEqual(7, page.next_after)
 
-        self.assertEqual(2, mock_query.filter.call_count)
+        statement = mock_db_session.scalars.call_args.args[0]
+        self.assertIn('items.id >', str(statement))
+        self.assertEqual(3, statement._limit)
+
+    async def test_index_streams(self) -> None:
+        mock_db_session = MagicMock()
+        mock_db_session.scalars = AsyncMock()
+
+        controller = ItemsController(mock_db_session)
+        controller._user = User(id=1)
+
+        with patch.object(controller, 'stream_index', return_value=MagicMock()) as mock_stream_index:
+            response = await controller.index(after=3, stream=StreamFormat.NDJSON)
+
+        self.assertIsInstance(response, StreamingResponse)
+        self.assertEqual('application/x-ndjson', response.media_type)
+        mock_db_session.scalars.assert_not_awaited()
+
+        statement, stream_format = mock_stream_index.call_args.args
+        self.assertIn('items.id >', str(statement))
+        self.assertNotIn('LIMIT', str(statement))
+        self.assertEqual(StreamFormat.NDJSON, stream_format)
 
     @patch('api.controllers.items_controller.CreateItemValidator.validate')
-    def test_create(self, mock_validator_validate) -> None:
+    async def test_create(self, mock_validator_validate) -> None:
         product_id = 1
         quantity = 2
 
@@ -41,33 +96,31 @@ class ItemsControllerIntegrationTest(TestCase):
         mock_authorized_to = MagicMock(return_value=controller)
         mock_shopping_cart_service = MagicMock()
         mock_shopping_cart_service.for_user = MagicMock(return_value=mock_shopping_cart_service)
-        mock_shopping_cart_service.add_item = MagicMock(return_value=item)
+        mock_shopping_cart_service.add_item = AsyncMock(return_value=item)
 
         with patch.multiple(
             controller,
             authorized_to=mock_authorized_to,
             shopping_cart_service=mock_shopping_cart_service
-        ) as mocks:
-            self.assertEqual(item, controller.create(schema))
+        ):
+            self.assertEqual(item, await controller.create(schema))
 
             mock_authorized_to.assert_called_once_with('create_item')
-            mock_validator_validate.assert_called_once()
-            mock_shopping_cart_service.add_item.assert_called_once_with(product_id, quantity)
+            mock_validator_validate.assert_awaited_once()
+            mock_shopping_cart_service.add_item.assert_awaited_once_with(product_id, quantity)
 
+    @patch('api.controllers.items_controller.product_cache.fetch')
     @patch('api.controllers.items_controller.CreateItemValidator.validate')
-    def test_create_resolves_product_id_from_product_name(self, mock_validator_validate) -> None:
+    async def test_create_resolves_product_id_from_product_name(self, mock_validator_validate, mock_fetch) -> None:
         product_id = 2
         product_name = 'Computer'
         quantity = 2
 
         item = Item(id=1, product_id=product_id, quantity=quantity)
-
-        mock_query = MagicMock()
-        mock_query.filter = MagicMock(return_value=mock_query)
-        mock_query.first = MagicMock(return_value=Product(id=product_id))
+        mock_fetch.return_value = Product(id=product_id, name=product_name)
 
         mock_db_session = MagicMock()
-        mock_db_session.query = MagicMock(return_value=mock_query)
+        mock_db_session.info = {}
 
         controller = ItemsController(mock_db_session)
         schema = ItemCreateSchema(product_name=product_name, quantity=quantity)
@@ -75,24 +128,76 @@ class ItemsControllerIntegrationTest(TestCase):
         mock_authorized_to = MagicMock(return_value=controller)
         mock_shopping_cart_service = MagicMock()
         mock_shopping_cart_service.for_user = MagicMock(return_value=mock_shopping_cart_service)
-        mock_shopping_cart_service.add_item = MagicMock(return_value=item)
+        mock_shopping_cart_service.add_item = AsyncMock(return_value=item)
 
         with patch.multiple(
                 controller,
                 authorized_to=mock_authorized_to,
                 shopping_cart_service=mock_shopping_cart_service
-        ) as mocks:
-            self.assertEqual(item, controller.create(schema))
+        ):
+            self.assertEqual(item, await controller.create(schema))
 
             mock_authorized_to.assert_called_once_with('create_item')
-            mock_validator_validate.assert_called_once()
-            mock_shopping_cart_service.add_item.assert_called_once_with(product_id, quantity)
+            mock_validator_validate.assert_awaited_once()
+            mock_fetch.assert_awaited_once_with(mock_db_session, 'name', product_name)
+            mock_shopping_cart_service.add_item.assert_awaited_once_with(product_id, quantity)
+
+    @patch('api.controllers.items_controller.CreateItemValidator.validate')
+    async def test_create_reuses_product_resolved_by_validation(self, mock_validator_validate) -> None:
+        product = Product(id=2, name='Computer')
+        quantity = 2
+
+        item = Item(id=1, product_id=product.id, quantity=quantity)
 
-        for mock in mocks:
-            mock.assert_called_once()
+        mock_db_session = MagicMock()
+        mock_db_session.info = {}
+        mock_db_session.scalar = AsyncMock(return_value=None)
+        IdentityMap.of(mock_db_session).add(product, ['name'])
+
+        controller = ItemsController(mock_db_session)
+        schema = ItemCreateSchema(product_name=product.name, quantity=quantity)
+
+        mock_shopping_cart_service = MagicMock()
+        mock_shopping_cart_service.for_user = MagicMock(return_value=mock_shopping_cart_service)
+        mock_shopping_cart_service.add_item = AsyncMock(return_value=item)
+
+        with patch.object(controller, 'shopping_cart_service', mock_shopping_cart_service):
+            self.assertEqual(item, await controller.create(schema))
+
+        mock_validator_validate.assert_awaited_once()
+        mock_db_session.scalar.assert_not_awaited()
+        mock_shopping_cart_service.add_item.assert_awaited_once_with(product.id, quantity)
+
+    @patch('api.controllers.items_controller.BulkCreateItemValidator.validate')
+    async def test_bulk_create(self, mock_validator_validate) -> None:
+        product = Product(id=2, name='Monitor')
+        items = [Item(id=1, product_id=1, quantity=2), Item(id=2, product_id=product.id, quantity=1)]
+
+        mock_db_session = MagicMock()
+        mock_db_session.info = {}
+        IdentityMap.of(mock_db_session).add(product, ['name'])
+
+        controller = ItemsController(mock_db_session)
+        schema = ItemBulkCreateSchema(items=[{'product_id': 1, 'quantity': 2}, {'product_name': product.name}])
+
+        mock_authorized_to = MagicMock(return_value=controller)
+        mock_shopping_cart_service = MagicMock()
+        mock_shopping_cart_service.for_user = MagicMock(return_value=mock_shopping_cart_service)
+        mock_shopping_cart_service.add_items = AsyncMock(return_value=items)
+
+        with patch.multiple(
+                controller,
+                authorized_to=mock_authorized_to,
+                shopping_cart_service=mock_shopping_cart_service
+        ):
+            self.assertEqual(items, await controller.bulk_create(schema))
+
+            mock_authorized_to.assert_called_once_with('create_item')
+            mock_validator_validate.assert_awaited_once()
+            mock_shopping_cart_service.add_items.assert_awaited_once_with([(1, 2), (product.id, 1)])
 
     @patch('api.controllers.items_controller.PartialUpdateItemValidator.validate')
-    def test_partial_update(self, mock_validator_validate) -> None:
+    async def test_partial_update(self, mock_validator_validate) -> None:
         product_id = 1
         quantity = 2
         item = Item(id=1, product_id=product_id, quantity=quantity)
@@ -101,27 +206,26 @@ class ItemsControllerIntegrationTest(TestCase):
         controller = ItemsController(mock_db_session)
         schema = ItemPartialUpdateSchema(quantity=quantity)
 
+        mock_get_object = AsyncMock(return_value=item)
         mock_authorized_to = MagicMock(return_value=controller)
         mock_shopping_cart_service = MagicMock()
         mock_shopping_cart_service.for_user = MagicMock(return_value=mock_shopping_cart_service)
-        mock_shopping_cart_service.update_quantity = MagicMock(return_value=item)
+        mock_shopping_cart_service.update_quantity = AsyncMock(return_value=item)
 
         with patch.multiple(
                 controller,
-                get_object=MagicMock(return_value=item),
+                get_object=mock_get_object,
                 authorized_to=mock_authorized_to,
                 shopping_cart_service=mock_shopping_cart_service
-        ) as mocks:
-            self.assertEqual(item, controller.partial_update(item.id, schema))
+        ):
+            self.assertEqual(item, await controller.partial_update(item.id, schema))
 
             mock_authorized_to.assert_called_once_with('update_item')
-            mock_validator_validate.assert_called_once()
-            mock_shopping_cart_service.update_quantity.assert_called_once_with(item, quantity)
-
-        for mock in mocks:
-            mock.assert_called_once()
+            mock_validator_validate.assert_awaited_once()
+            mock_get_object.assert_awaited_once_with(item.id)
+            mock_shopping_cart_service.update_quantity.assert_awaited_once_with(item, quantity)
 
-    def test_delete(self) -> None:
+    async def test_delete(self) -> None:
         product_id = 1
         quantity = 2
         item = Item(id=1, product_id=product_id, quantity=quantity)
@@ -129,21 +233,20 @@ class ItemsControllerIntegrationTest(TestCase):
         mock_db_session = MagicMock()
         controller = ItemsController(mock_db_session)
 
+        mock_get_object = AsyncMock(return_value=item)
         mock_authorized_to = MagicMock(return_value=controller)
         mock_shopping_cart_service = MagicMock()
         mock_shopping_cart_service.for_user = MagicMock(return_value=mock_shopping_cart_service)
-        mock_shopping_cart_service.remove_item = MagicMock(return_value=None)
+        mock_shopping_cart_service.remove_item = AsyncMock(return_value=None)
 
         with patch.multiple(
                 controller,
-                get_object=MagicMock(return_value=item),
+                get_object=mock_get_object,
                 authorized_to=mock_authorized_to,
                 shopping_cart_service=mock_shopping_cart_service
-        ) as mocks:
-            self.assertIsNone(controller.delete(item.id))
+        ):
+            self.assertIsNone(await controller.delete(item.id))
 
             mock_authorized_to.assert_called_once_with('delete_item')
-            mock_shopping_cart_service.remove_item.assert_called_once_with(item)
-
-        for mock in mocks:
-            mock.assert_called_once()
+            mock_get_object.assert_awaited_once_with(item.id)
+            mock_shopping_cart_service.remove_item.assert_awaited_once_with(item)
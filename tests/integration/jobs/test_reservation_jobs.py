@@ -1,7 +1,20 @@
+import asyncio
+import json
+import os
+import tempfile
 from unittest import TestCase
 from unittest.mock import patch, MagicMock
 
+from sqlalchemy import create_engine, event, text, select
+from sqlalchemy.ext.asyncio import create_async_engine, AsyncSession
+from sqlalchemy.orm import scoped_session, sessionmaker
+
+from api.database.migrations import MIGRATIONS, Migrator
+from api.database.models import Item, User
+from api.jobs.reservation_client import StubReservationClient
 from api.jobs.reservation_jobs import ReserveItemJob, ReleaseReservedItemJob
+from api.jobs.worker import execute_job
+from api.services.shopping_cart_service import ShoppingCartService
 
 
 class ReserveItemJobIntegrationTest(TestCase):
@@ -9,6 +22,7 @@ class ReserveItemJobIntegrationTest(TestCase):
         item_id = 1
         reservation_identifier = 'new_reservation_identifier'
         job = ReserveItemJob(item_id)
+        job._item = Item(id=item_id)
 
         mock_update_item = MagicMock(return_value=None)
 
@@ -29,6 +43,7 @@ class ReleaseReservedItemJobIntegrationTest(TestCase):
     def test_handle(self) -> None:
         item_id = 1
         job = ReleaseReservedItemJob(item_id)
+        job._item = Item(id=item_id, quantity=0)
 
         with patch.multiple(
                 job,
@@ -39,3 +54,95 @@ class ReleaseReservedItemJobIntegrationTest(TestCase):
 
         for mock in mocks:
             mock.assert_called_once()
+
+    def test_handle_keeps_an_item_added_back_to_the_shopping_cart(self) -> None:
+        item_id = 1
+        job = ReleaseReservedItemJob(item_id)
+        job._item = Item(id=item_id, quantity=3)
+
+        with patch.multiple(
+                job,
+                release_reserved_item=MagicMock(return_value=None),
+                delete_item=MagicMock(return_value=None)
+        ) as mocks:
+            job.handle()
+
+        for mock in mocks.values():
+            mock.assert_not_called()
+
+
+class ReservationJobSessionsIntegrationTest(TestCase):
+    def setUp(self) -> None:
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+
+        self.engine = create_engine(f'sqlite:///{os.path.join(directory.name, "jobs.db")}', pool_use_lifo=True)
+        self.addCleanup(self.engine.dispose)
+
+        self.connects = []
+        event.listen(self.engine, 'connect', lambda *args: self.connects.append(args))
+
+        with self.engine.begin() as connection:
+            Migrator(connection, MIGRATIONS).migrate()
+            connection.execute(text(
+                'INSERT INTO shopping_carts (id, user_id) SELECT 1, id FROM users LIMIT 1'
+            ))
+            connection.execute(text(
+                'INSERT INTO items (shopping_cart_id, product_id, quantity) SELECT 1, id, 1 FROM products LIMIT 2'
+            ))
+
+        for target, new in (
+            ('api.jobs.base_jobs.job_sessions', scoped_session(sessionmaker(bind=self.engine))),
+            ('api.jobs.base_jobs.lock_manager', MagicMock()),
+            ('api.jobs.reservation_jobs.reservation_client', StubReservationClient()),
+        ):
+            patcher = patch(target, new)
+            patcher.start()
+            self.addCleanup(patcher.stop)
+
+    def test_jobs_of_a_thread_reuse_the_connection_and_hand_it_back(self) -> None:
+        with self.engine.connect() as connection:
+            item_ids = connection.execute(text('SELECT id FROM items ORDER BY id LIMIT 2')).scalars().all()
+
+        for item_id in item_ids:
+            execute_job(ReserveItemJob.class_path(), {'item_id': item_id, 'product_id': None}, 'owner')
+
+            self.assertEqual(0, self.engine.pool.checkedout())
+
+        with self.engine.connect() as connection:
+            reservation_identifiers = connection.execute(
+                text('SELECT reservation_identifier FROM items ORDER BY id LIMIT 2')
+            ).scalars().all()
+
+        self.assertEqual(['reservation-1', 'reservation-2'], reservation_identifiers)
+        self.assertEqual(1, len(self.connects))
+
+    def test_removing_and_adding_back_a_product_before_the_jobs_run_keeps_the_item(self) -> None:
+        async def remove_and_add_back() -> None:
+            async_engine = create_async_engine(f'sqlite+aiosqlite:///{self.engine.url.database}')
+
+            try:
+                async with AsyncSession(async_engine, expire_on_commit=False) as db_session:
+                    item = await db_session.scalar(select(Item).order_by(Item.id))
+                    user = await db_session.scalar(select(User).order_by(User.id))
+                    service = ShoppingCartService(db_session).for_user(user)
+
+                    await service.remove_item(item)
+                    await service.add_item(item.product_id, 3)
+            finally:
+                await async_engine.dispose()
+
+        asyncio.run(remove_and_add_back())
+
+        with self.engine.connect() as connection:
+            jobs = connection.execute(text('SELECT job_class, payload FROM job_outbox ORDER BY id')).all()
+
+        self.assertEqual([ReleaseReservedItemJob.class_path(), ReserveItemJob.class_path()], [job[0] for job in jobs])
+
+        for job_class, payload in jobs:
+            self.assertIsNone(execute_job(job_class, json.loads(payload), 'owner').error)
+
+        with self.engine.connect() as connection:
+            items = connection.execute(text('SELECT quantity, reservation_identifier FROM items ORDER BY id')).all()
+
+        self.assertEqual((3, 'reservation-1'), tuple(items[0]))
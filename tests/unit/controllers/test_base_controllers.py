@@ -1,27 +1,83 @@
-from unittest import TestCase
-from unittest.mock import MagicMock, patch, PropertyMock
-
-from sqlalchemy.orm import Session
+import json
+from inspect import signature
+from unittest import TestCase, IsolatedAsyncioTestCase
+from unittest.mock import MagicMock, AsyncMock
 
 from api.controllers.base_controllers import AuthenticatedController, AuthorizedController, ValidatedController, \
     ResourcefulController, DBSessionController
-from api.database.configuration import DBSession
-from api.database.models import Item
-from api.exceptions import RequestValidationError, ObjectNotFoundError
+from api.database.configuration import AsyncDBSession
+from api.database.models import Item, User
+from api.exceptions import RequestValidationError, ObjectNotFoundError, BatchValidationError
+
+
+class EndpointTestController(DBSessionController):
+    async def show(self, item_id: int, verbose: bool = False) -> str:
+        return f'{item_id}:{verbose}:{id(self.db_session)}'
+
+
+class DBSessionControllerUnitTest(IsolatedAsyncioTestCase):
+    async def test_from_request(self) -> None:
+        db_session = AsyncDBSession()
+        controller = await EndpointTestController.from_request(db_session)
+
+        self.assertIsInstance(controller, EndpointTestController)
+        self.assertEqual(db_session, controller.db_session)
+
+    def test_endpoint_mirrors_action_signature(self) -> None:
+        endpoint = EndpointTestController.endpoint('show')
+        parameters = signature(endpoint).parameters
 
+        self.assertEqual('show', endpoint.__name__)
+        self.assertEqual(['item_id', 'verbose', 'controller'], list(parameters))
+        self.assertEqual(int, parameters['item_id'].annotation)
+        self.assertFalse(parameters['verbose'].default)
+        self.assertEqual(EndpointTestController, parameters['controller'].annotation)
+        self.assertEqual(str, signature(endpoint).return_annotation)
 
-class AuthenticatedControllerUnitTest(TestCase):
+    async def test_endpoint_dispatches_to_the_request_controller(self) -> None:
+        endpoint = EndpointTestController.endpoint('show')
+        db_session = MagicMock()
+        controller = EndpointTestController(db_session)
+
+        self.assertEqual(f'1:True:{id(db_session)}', await endpoint(item_id=1, verbose=True, controller=controller))
+
+
+class AuthenticatedControllerUnitTest(IsolatedAsyncioTestCase):
     def test_init(self) -> None:
-        db_session = DBSession()
+        db_session = AsyncDBSession()
         controller = AuthenticatedController(db_session)
 
         self.assertIsInstance(controller, DBSessionController)
         self.assertEqual(db_session, controller.db_session)
 
+    async def test_from_request_authenticates(self) -> None:
+        user = User(id=1)
+
+        mock_db_session = MagicMock()
+        mock_db_session.scalar = AsyncMock(return_value=user)
+
+        controller = await AuthenticatedController.from_request(mock_db_session)
+
+        self.assertEqual(user, controller.user)
+        mock_db_session.scalar.assert_awaited_once()
+
+    async def test_authenticate_returns_preset(self) -> None:
+        user = User(id=1)
+
+        mock_db_session = MagicMock()
+        mock_db_session.scalar = AsyncMock(return_value=None)
+
+        controller = AuthenticatedController(mock_db_session)
+        controller._user = user
+
+        self.assertEqual(controller, await controller.authenticate())
+        self.assertEqual(user, controller.user)
+        mock_db_session.scalar.assert_not_awaited()
+
 
 class AuthorizedControllerUnitTest(TestCase):
     def test_init(self) -> None:
-        db_session = DBSession()
+        db_session = AsyncDBSession()
         controller = AuthorizedController(db_session)
 
         self.assertIsInstance(controller, AuthenticatedController)
@@ -34,29 +90,56 @@ class AuthorizedControllerUnitTest(TestCase):
         self.skipTest('AuthorizedController.authorized_to() functionality not yet implemented')
 
 
-class ValidatedControllerUnitTest(TestCase):
-    def test_validate_to_success(self) -> None:
+class ValidatedControllerUnitTest(IsolatedAsyncioTestCase):
+    async def test_validate_to_success(self) -> None:
         validator = MagicMock()
-        validator.validate = MagicMock(return_value=None)
+        validator.validate = AsyncMock(return_value=None)
         controller = ValidatedController()
 
-        controller.validate(validator)
-        validator.validate.assert_called_once()
+        self.assertEqual(controller, await controller.validate(validator))
+        validator.validate.assert_awaited_once()
 
-    def test_validate_to_failure(self) -> None:
+    async def test_validate_to_failure(self) -> None:
         validator = MagicMock()
-        validator.validate = MagicMock(side_effect=RequestValidationError)
+        validator.validate = AsyncMock(side_effect=RequestValidationError)
         controller = ValidatedController()
 
-        with self.assertRaises(RequestValidationError) as mock_e:
-            controller.validate(validator)
+        with self.assertRaises(RequestValidationError):
+            await controller.validate(validator)
+
+        validator.validate.assert_awaited_once()
+
+    def test_exception_handlers(self) -> None:
+        self.assertEqual(
+            {RequestValidationError: ValidatedController.validation_error_response},
+            ValidatedController.exception_handlers()
+        )
+
+    async def test_validation_error_response(self) -> None:
+        response = await ValidatedController.validation_error_response(
+            MagicMock(),
+            RequestValidationError('The value for "quantity" must be an integer.')
+        )
 
-            validator.validate.assert_called_once()
+        self.assertEqual(422, response.status_code)
+        self.assertEqual({'detail': 'The value for "quantity" must be an integer.'}, json.loads(response.body))
 
+    async def test_validation_error_response_reports_the_failed_lines(self) -> None:
+        response = await ValidatedController.validation_error_response(
+            MagicMock(),
+            BatchValidationError('1: The line is invalid.', {1: 'The line is invalid.'})
+        )
 
-class ResourcefulControllerUnitTest(TestCase):
+        self.assertEqual(422, response.status_code)
+        self.assertEqual(
+            {'detail': '1: The line is invalid.', 'errors': {'1': 'The line is invalid.'}},
+            json.loads(response.body)
+        )
+
+
+class ResourcefulControllerUnitTest(IsolatedAsyncioTestCase):
     def test_init(self) -> None:
-        db_session = DBSession()
+        db_session = AsyncDBSession()
         controller = ResourcefulController(db_session)
         controller.model_class = Item
 
@@ -64,43 +147,28 @@ class ResourcefulControllerUnitTest(TestCase):
         self.assertEqual(db_session, controller.db_session)
         self.assertTrue(hasattr(controller, 'model_class'))
 
-    def test_get_object_returns_instance(self) -> None:
+    async def test_get_object_returns_instance(self) -> None:
         identifier = 1
         item = Item(id=identifier)
 
-        mock_query = MagicMock()
-        mock_query.filter = MagicMock(return_value=mock_query)
-        mock_query.first = MagicMock(return_value=item)
-
         mock_db_session = MagicMock()
-        mock_db_session.query = MagicMock(return_value=mock_query)
+        mock_db_session.scalar = AsyncMock(return_value=item)
 
         controller = ResourcefulController(mock_db_session)
         controller.model_class = Item
 
-        self.assertEqual(item, controller.get_object(identifier))
-
-        mock_db_session.query.assert_called_once_with(Item)
-        mock_query.filter.assert_called_once()
-        mock_query.first.assert_called_once()
+        self.assertEqual(item, await controller.get_object(identifier))
 
-    def test_get_object_raises_object_not_found_error(self) -> None:
-        mock_query = MagicMock()
-        mock_query.filter = MagicMock(return_value=mock_query)
-        mock_query.first = MagicMock(return_value=None)
+        mock_db_session.scalar.assert_awaited_once()
 
+    async def test_get_object_raises_object_not_found_error(self) -> None:
         mock_db_session = MagicMock()
-        mock_db_session.query = MagicMock(return_value=mock_query)
+        mock_db_session.scalar = AsyncMock(return_value=None)
 
         controller = ResourcefulController(mock_db_session)
         controller.model_class = Item
 
-        identifier = 1
-        item = Item(id=identifier)
-
-        with self.assertRaises(ObjectNotFoundError) as mock_e:
-            self.assertEqual(item, controller.get_object(identifier))
+        with self.assertRaises(ObjectNotFoundError):
+            await controller.get_object(1)
 
-            mock_db_session.query.assert_called_once_with(Item)
-            mock_query.filter.assert_called_once()
-            mock_query.first.assert_called_once()
+        mock_db_session.scalar.assert_awaited_once()
@@ -1,17 +1,20 @@
-from unittest import TestCase
+from unittest import IsolatedAsyncioTestCase
+from unittest.mock import MagicMock, AsyncMock
 
 from fastapi import APIRouter
 from fastapi.routing import APIRoute
 
 from api.controllers.base_controllers import AuthorizedController, ValidatedController, ResourcefulController
 from api.controllers.items_controller import ItemsController
-from api.database.configuration import DBSession
+from api.database.configuration import AsyncDBSession
+from api.database.models import User
+from api.schemas import ItemCreateSchema
 from api.services.shopping_cart_service import ShoppingCartService
 
 
-class ItemsControllerUnitTest(TestCase):
+class ItemsControllerUnitTest(IsolatedAsyncioTestCase):
     def test_init(self) -> None:
-        db_session = DBSession()
+        db_session = AsyncDBSession()
         controller = ItemsController(db_session)
 
         self.assertIsInstance(controller, AuthorizedController)
@@ -21,23 +24,45 @@ class ItemsControllerUnitTest(TestCase):
         self.assertEqual(db_session, controller.db_session)
         self.assertIsInstance(controller.shopping_cart_service, ShoppingCartService)
 
-        self.assertIsInstance(controller.router, APIRouter)
-        self.assertEqual(['Items'], controller.router.tags)
-
-        self.assertEqual(4, len(controller.router.routes))
-        self.assertIsInstance(controller.router.routes[0], APIRoute)
-        self.assertEqual('/items', controller.router.routes[0].path)
-        self.assertEqual('index', controller.router.routes[0].name)
-        self.assertEqual({'GET'}, controller.router.routes[0].methods)
-        self.assertIsInstance(controller.router.routes[1], APIRoute)
-        self.assertEqual('/items', controller.router.routes[1].path)
-        self.assertEqual('create', controller.router.routes[1].name)
-        self.assertEqual({'POST'}, controller.router.routes[1].methods)
-        self.assertIsInstance(controller.router.routes[2], APIRoute)
-        self.assertEqual('/items/{item_id}', controller.router.routes[2].path)
-        self.assertEqual('partial_update', controller.router.routes[2].name)
-        self.assertEqual({'PATCH'}, controller.router.routes[2].methods)
-        self.assertIsInstance(controller.router.routes[3], APIRoute)
-        self.assertEqual('/items/{item_id}', controller.router.routes[3].path)
-        self.assertEqual('delete', controller.router.routes[3].name)
-        self.assertEqual({'DELETE'}, controller.router.routes[3].methods)
+    async def test_from_request_builds_a_controller_per_request(self) -> None:
+        first_controller = await ItemsController.from_request(MagicMock(scalar=AsyncMock(return_value=User(id=1))))
+        second_controller = await ItemsController.from_request(MagicMock(scalar=AsyncMock(return_value=User(id=2))))
+
+        self.assertIsInstance(first_controller, ItemsController)
+        self.assertIsNot(first_controller, second_controller)
+        self.assertIsNot(first_controller.db_session, second_controller.db_session)
+        self.assertIsNot(first_controller.shopping_cart_service, second_controller.shopping_cart_service)
+        self.assertEqual(1, first_controller.user.id)
+        self.assertEqual(2, second_controller.user.id)
+
+    def test_resolve_quantity_defaults_a_null_quantity(self) -> None:
+        self.assertEqual(3, ItemsController.resolve_quantity(ItemCreateSchema(product_id=1, quantity=3)))
+        self.assertEqual(1, ItemsController.resolve_quantity(ItemCreateSchema(product_id=1, quantity=None)))
+
+    def test_router(self) -> None:
+        router = ItemsController.router()
+
+        self.assertIsInstance(router, APIRouter)
+        self.assertEqual(['Items'], router.tags)
+
+        self.assertEqual(5, len(router.routes))
+        self.assertIsInstance(router.routes[0], APIRoute)
+        self.assertEqual('/items', router.routes[0].path)
+        self.assertEqual('index', router.routes[0].name)
+        self.assertEqual({'GET'}, router.routes[0].methods)
+        self.assertIsInstance(router.routes[1], APIRoute)
+        self.assertEqual('/items', router.routes[1].path)
+        self.assertEqual('create', router.routes[1].name)
+        self.assertEqual({'POST'}, router.routes[1].methods)
+        self.assertIsInstance(router.routes[2], APIRoute)
+        self.assertEqual('/items/bulk', router.routes[2].path)
+        self.assertEqual('bulk_create', router.routes[2].name)
+        self.assertEqual({'POST'}, router.routes[2].methods)
+        self.assertIsInstance(router.routes[3], APIRoute)
+        self.assertEqual('/items/{item_id}', router.routes[3].path)
+        self.assertEqual('partial_update', router.routes[3].name)
+        self.assertEqual({'PATCH'}, router.routes[3].methods)
+        self.assertIsInstance(router.routes[4], APIRoute)
+        self.assertEqual('/items/{item_id}', router.routes[4].path)
+        self.assertEqual('delete', router.routes[4].name)
+        self.assertEqual({'DELETE'}, router.routes[4].methods)
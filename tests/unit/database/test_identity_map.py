@@ -0,0 +1,49 @@
+from unittest import TestCase
+from unittest.mock import MagicMock
+
+from api.database.identity_map import IdentityMap
+from api.database.models import Product
+
+
+class IdentityMapUnitTest(TestCase):
+    def test_of_is_scoped_to_the_session(self) -> None:
+        db_session = MagicMock()
+        db_session.info = {}
+
+        identity_map = IdentityMap.of(db_session)
+
+        self.assertIsInstance(identity_map, IdentityMap)
+        self.assertIs(identity_map, IdentityMap.of(db_session))
+        self.assertIsNot(identity_map, IdentityMap.of(MagicMock(info={})))
+
+    def test_add_registers_primary_key_and_columns(self) -> None:
+        product = Product(id=1, name='Computer')
+
+        identity_map = IdentityMap()
+        identity_map.add(product, ['name'])
+
+        self.assertTrue(identity_map.has(Product, 'id', 1))
+        self.assertEqual(product, identity_map.get(Product, 'id', 1))
+        self.assertEqual(product, identity_map.get(Product, 'name', 'Computer'))
+
+    def test_add_missing(self) -> None:
+        identity_map = IdentityMap()
+        identity_map.add_missing(Product, 'name', 'Keyboard')
+
+        self.assertTrue(identity_map.has(Product, 'name', 'Keyboard'))
+        self.assertIsNone(identity_map.get(Product, 'name', 'Keyboard'))
+
+    def test_add_missing_keeps_resolved_rows(self) -> None:
+        product = Product(id=1, name='Computer')
+
+        identity_map = IdentityMap()
+        identity_map.add(product, ['name'])
+        identity_map.add_missing(Product, 'name', 'Computer')
+
+        self.assertEqual(product, identity_map.get(Product, 'name', 'Computer'))
+
+    def test_get_returns_none_for_unknown_rows(self) -> None:
+        identity_map = IdentityMap()
+
+        self.assertFalse(identity_map.has(Product, 'id', 1))
+        self.assertIsNone(identity_map.get(Product, 'id', 1))
@@ -0,0 +1,161 @@
+import os
+import tempfile
+from unittest import TestCase
+from unittest.mock import MagicMock
+
+from sqlalchemy import create_engine, inspect, text
+
+from api.database.configuration import Base
+from api.database.migrations import MIGRATIONS, Migrator, Migration
+from api.database.migrations.m0001_initial_schema import InitialSchemaMigration
+from api.database.migrations.m0002_hot_query_indexes import HotQueryIndexesMigration
+
+
+class MigratorUnitTest(TestCase):
+    def setUp(self) -> None:
+        self.engine = create_engine('sqlite://')
+
+    def tearDown(self) -> None:
+        self.engine.dispose()
+
+    def test_migrations_are_ordered_by_version(self) -> None:
+        second = MagicMock(spec=Migration, version=2)
+        first = MagicMock(spec=Migration, version=1)
+
+        with self.engine.begin() as connection:
+            self.assertEqual([first, second], Migrator(connection, [second, first]).migrations)
+
+    def test_migrate_applies_pending_migrations_once(self) -> None:
+        with self.engine.begin() as connection:
+            applied = Migrator(connection, MIGRATIONS).migrate()
+
+            self.assertEqual([1, 2, 3, 4, 5, 6, 7, 8], [migration.version for migration in applied])
+            self.assertEqual([], Migrator(connection, MIGRATIONS).migrate())
+            self.assertEqual(
+                [
+                    (1, 'initial_schema'),
+                    (2, 'hot_query_indexes'),
+                    (3, 'jobs'),
+                    (4, 'job_locks'),
+                    (5, 'job_dedup_keys'),
+                    (6, 'dead_jobs'),
+                    (7, 'job_metrics'),
+                    (8, 'job_outbox'),
+                ],
+                connection.execute(text('SELECT version, name FROM schema_migrations ORDER BY version')).all()
+            )
+
+    def test_migrate_skips_applied_migrations(self) -> None:
+        migration = MagicMock(spec=Migration, version=1000)
+        migration.name = 'third'
+
+        with self.engine.begin() as connection:
+            Migrator(connection, MIGRATIONS).migrate()
+            applied = Migrator(connection, [*MIGRATIONS, migration]).migrate()
+
+        self.assertEqual([migration], applied)
+        migration.upgrade.assert_called_once()
+
+    def test_failed_migration_is_not_recorded(self) -> None:
+        migration = MagicMock(spec=Migration, version=1000)
+        migration.name = 'third'
+        migration.upgrade = MagicMock(side_effect=RuntimeError())
+
+        with self.assertRaises(RuntimeError):
+            with self.engine.begin() as connection:
+                Migrator(connection, [*MIGRATIONS, migration]).migrate()
+
+        with self.engine.begin() as connection:
+            self.assertEqual(len(MIGRATIONS) + 1, len(Migrator(connection, [*MIGRATIONS, migration]).pending()))
+
+    def test_migrate_engine_rolls_back_the_schema_of_a_failed_run(self) -> None:
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+
+        engine = create_engine(f'sqlite:///{os.path.join(directory.name, "migrations.db")}')
+        self.addCleanup(engine.dispose)
+
+        migration = MagicMock(spec=Migration, version=1000)
+        migration.name = 'failing'
+        migration.upgrade = MagicMock(side_effect=RuntimeError())
+
+        Migrator.migrate_engine(engine, MIGRATIONS[:2])
+
+        with engine.connect() as connection:
+            tables = sorted(inspect(connection).get_table_names())
+
+        with self.assertRaises(RuntimeError):
+            Migrator.migrate_engine(engine, [*MIGRATIONS[:3], migration])
+
+        with engine.connect() as connection:
+            self.assertEqual(tables, sorted(inspect(connection).get_table_names()))
+            self.assertNotIn('jobs', tables)
+            self.assertEqual([1, 2], list(connection.scalars(text('SELECT version FROM schema_migrations'))))
+
+        applied = Migrator.migrate_engine(engine, MIGRATIONS)
+
+        self.assertEqual([3, 4, 5, 6, 7, 8], [migration.version for migration in applied])
+
+    def test_migrated_schema_matches_the_models(self) -> None:
+        with self.engine.begin() as connection:
+            Migrator(connection, MIGRATIONS).migrate()
+
+            migrated = inspect(connection)
+
+            for table in Base.metadata.sorted_tables:
+                self.assertEqual(
+                    sorted(column.name for column in table.columns),
+                    sorted(column['name'] for column in migrated.get_columns(table.name))
+                )
+                self.assertEqual(
+                    sorted(index.name for index in table.indexes),
+                    sorted(index['name'] for index in migrated.get_indexes(table.name))
+                )
+
+
+class InitialSchemaMigrationUnitTest(TestCase):
+    def test_upgrade_creates_and_seeds_tables(self) -> None:
+        engine = create_engine('sqlite://')
+
+        with engine.begin() as connection:
+            InitialSchemaMigration().upgrade(connection)
+
+            self.assertEqual(
+                ['items', 'products', 'shopping_carts', 'users'],
+                sorted(inspect(connection).get_table_names())
+            )
+            self.assertEqual(2, connection.scalar(text('SELECT COUNT(*) FROM products')))
+            self.assertEqual(1, connection.scalar(text('SELECT COUNT(*) FROM users')))
+
+    def test_upgrade_keeps_existing_tables(self) -> None:
+        engine = create_engine('sqlite://')
+
+        with engine.begin() as connection:
+            connection.execute(text('CREATE TABLE products (id INTEGER NOT NULL, name VARCHAR, PRIMARY KEY (id))'))
+            connection.execute(text("INSERT INTO products (name) VALUES ('Keyboard')"))
+
+            InitialSchemaMigration().upgrade(connection)
+
+            self.assertEqual(['Keyboard'], list(connection.scalars(text('SELECT name FROM products'))))
+            self.assertEqual(1, connection.scalar(text('SELECT COUNT(*) FROM users')))
+
+
+class HotQueryIndexesMigrationUnitTest(TestCase):
+    def test_upgrade_folds_duplicate_items(self) -> None:
+        engine = create_engine('sqlite://')
+
+        with engine.begin() as connection:
+            InitialSchemaMigration().upgrade(connection)
+            connection.execute(text(
+                'INSERT INTO items (shopping_cart_id, product_id, quantity) '
+                'VALUES (1, 1, 1), (1, 2, 3), (1, 1, 2), (2, 1, 5)'
+            ))
+
+            HotQueryIndexesMigration().upgrade(connection)
+
+            self.assertEqual(
+                [(1, 1, 1, 3), (2, 1, 2, 3), (4, 2, 1, 5)],
+                connection.execute(
+                    text('SELECT id, shopping_cart_id, product_id, quantity FROM items ORDER BY id')
+                ).all()
+            )
@@ -0,0 +1,141 @@
+from unittest import IsolatedAsyncioTestCase
+from unittest.mock import MagicMock, AsyncMock
+
+from sqlalchemy import inspect
+
+from api.database.model_cache import ModelCache, product_cache
+from api.database.models import Product
+
+
+class Clock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self) -> float:
+        return self.now
+
+
+def make_cache(max_size: int = 2, ttl: float = 10) -> tuple[ModelCache, Clock]:
+    clock = Clock()
+    cache = ModelCache('test_product', Product, ['name'], max_size, ttl, clock)
+
+    return cache, clock
+
+
+class ModelCacheUnitTest(IsolatedAsyncioTestCase):
+    def test_for_model(self) -> None:
+        self.assertEqual(product_cache, ModelCache.for_model(Product))
+        self.assertIsNone(ModelCache.for_model(MagicMock))
+
+    def test_get_by_any_column(self) -> None:
+        cache, clock = make_cache()
+        cache.add(Product(id=1, name='Computer', price=1500))
+
+        self.assertEqual('Computer', cache.get('id', 1)['name'])
+        self.assertEqual(1, cache.get('name', 'Computer')['id'])
+        self.assertIsNone(cache.get('name', 'Monitor'))
+
+    def test_get_counts_hits_and_misses(self) -> None:
+        cache, clock = make_cache()
+        hits, misses = cache.hits.value, cache.misses.value
+
+        cache.add(Product(id=1, name='Computer'))
+        cache.get('id', 1)
+        cache.get('id', 2)
+
+        self.assertEqual(hits + 1, cache.hits.value)
+        self.assertEqual(misses + 1, cache.misses.value)
+
+    def test_entries_expire(self) -> None:
+        cache, clock = make_cache(ttl=10)
+        cache.add(Product(id=1, name='Computer'))
+
+        clock.now = 10
+
+        self.assertIsNone(cache.get('name', 'Computer'))
+        self.assertEqual(0, len(cache))
+
+    def test_least_recently_used_is_evicted(self) -> None:
+        cache, clock = make_cache(max_size=2)
+        cache.add(Product(id=1, name='Computer'))
+        cache.add(Product(id=2, name='Monitor'))
+        cache.get('id', 1)
+        cache.add(Product(id=3, name='Keyboard'))
+
+        self.assertIsNotNone(cache.get('id', 1))
+        self.assertIsNone(cache.get('id', 2))
+        self.assertIsNone(cache.get('name', 'Monitor'))
+        self.assertIsNotNone(cache.get('id', 3))
+
+    def test_disabled(self) -> None:
+        cache, clock = make_cache(ttl=0)
+        cache.add(Product(id=1, name='Computer'))
+
+        self.assertIsNone(cache.get('id', 1))
+
+    def test_invalidate_drops_every_key_of_the_row(self) -> None:
+        cache, clock = make_cache()
+        cache.add(Product(id=1, name='Computer'))
+
+        cache.invalidate(1)
+
+        self.assertIsNone(cache.get('id', 1))
+        self.assertIsNone(cache.get('name', 'Computer'))
+
+    def test_clear(self) -> None:
+        cache, clock = make_cache()
+        cache.add(Product(id=1, name='Computer'))
+
+        cache.clear()
+
+        self.assertEqual(0, len(cache))
+
+    async def test_merge_does_not_load(self) -> None:
+        cache, clock = make_cache()
+        db_session = MagicMock()
+        db_session.merge = AsyncMock(side_effect=lambda row, load: row)
+
+        row = await cache.merge(db_session, {'id': 1, 'name': 'Computer', 'is_active': True, 'price': 1500})
+
+        self.assertEqual('Computer', row.name)
+        self.assertTrue(inspect(row).detached)
+        self.assertFalse(db_session.merge.call_args.kwargs['load'])
+
+    async def test_fetch_many_queries_only_for_misses(self) -> None:
+        cache, clock = make_cache()
+        cache.add(Product(id=1, name='Computer'))
+
+        db_session = MagicMock()
+        db_session.merge = AsyncMock(side_effect=lambda row, load: row)
+        db_session.scalars = AsyncMock(return_value=[Product(id=2, name='Monitor')])
+
+        rows = await cache.fetch_many(db_session, {'id': {1}, 'name': {'Monitor'}})
+
+        self.assertEqual(['Computer', 'Monitor'], [row.name for row in rows])
+
+        statement = str(db_session.scalars.call_args.args[0])
+        self.assertIn('products.name IN', statement)
+        self.assertNotIn('products.id IN', statement)
+        self.assertIsNotNone(cache.get('name', 'Monitor'))
+
+    async def test_fetch_skips_the_query_on_a_hit(self) -> None:
+        cache, clock = make_cache()
+        cache.add(Product(id=1, name='Computer'))
+
+        db_session = MagicMock()
+        db_session.merge = AsyncMock(side_effect=lambda row, load: row)
+        db_session.scalars = AsyncMock()
+
+        self.assertEqual(1, (await cache.fetch(db_session, 'name', 'Computer')).id)
+        db_session.scalars.assert_not_awaited()
+
+    def test_invalidate_bulk_writes(self) -> None:
+        cache, clock = make_cache()
+        cache.add(Product(id=1, name='Computer'))
+
+        orm_execute_state = MagicMock(is_update=True, is_delete=False)
+        orm_execute_state.all_mappers = [inspect(Product)]
+
+        cache.invalidate_bulk_writes(orm_execute_state)
+
+        self.assertEqual(0, len(cache))
@@ -0,0 +1,38 @@
+import os
+import tempfile
+from unittest import TestCase
+
+from sqlalchemy import create_engine, text
+
+from api.database.pragmas import pragmas_from_environment, apply_pragmas_on_connect, TUNED_PROFILE
+
+
+class PragmasUnitTest(TestCase):
+    def test_pragmas_from_environment(self) -> None:
+        self.assertEqual(TUNED_PROFILE, pragmas_from_environment('tuned', {}))
+        self.assertEqual({}, pragmas_from_environment('baseline', {'DB_PROFILE': 'baseline'}))
+
+    def test_pragmas_from_environment_overrides_the_profile(self) -> None:
+        pragmas = pragmas_from_environment('tuned', {'DB_PRAGMA_BUSY_TIMEOUT': '100', 'DB_PRAGMA_FOREIGN_KEYS': 'ON'})
+
+        self.assertEqual('100', pragmas['busy_timeout'])
+        self.assertEqual('ON', pragmas['foreign_keys'])
+        self.assertEqual('WAL', pragmas['journal_mode'])
+
+    def test_pragmas_from_environment_rejects_unknown_profiles(self) -> None:
+        with self.assertRaises(KeyError):
+            pragmas_from_environment('fastest', {})
+
+    def test_apply_pragmas_on_connect(self) -> None:
+        with tempfile.TemporaryDirectory() as directory:
+            engine = create_engine(f'sqlite:///{os.path.join(directory, "test.db")}')
+            apply_pragmas_on_connect(engine, TUNED_PROFILE)
+
+            with engine.connect() as connection:
+                self.assertEqual('wal', connection.scalar(text('PRAGMA journal_mode')))
+                self.assertEqual(1, connection.scalar(text('PRAGMA synchronous')))
+                self.assertEqual(5000, connection.scalar(text('PRAGMA busy_timeout')))
+                self.assertEqual(-64000, connection.scalar(text('PRAGMA cache_size')))
+                self.assertEqual(2, connection.scalar(text('PRAGMA temp_store')))
+
+            engine.dispose()
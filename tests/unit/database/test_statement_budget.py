@@ -0,0 +1,71 @@
+from unittest import TestCase, IsolatedAsyncioTestCase
+from unittest.mock import MagicMock
+
+from sqlalchemy import create_engine, text
+
+from api.database.statement_budget import StatementBudget, statement_budget, listen_for_statements, \
+    StatementBudgetMiddleware
+from api.exceptions import StatementBudgetExceededError
+
+
+class StatementBudgetUnitTest(TestCase):
+    def test_spend_within_budget(self) -> None:
+        budget = StatementBudget(2)
+        budget.spend('SELECT 1')
+        budget.spend('SELECT 2')
+
+        self.assertEqual(['SELECT 1', 'SELECT 2'], budget.statements)
+
+    def test_spend_raises_statement_budget_exceeded_error(self) -> None:
+        budget = StatementBudget(1)
+        budget.spend('SELECT 1')
+
+        with self.assertRaises(StatementBudgetExceededError) as mock_e:
+            budget.spend('SELECT 2')
+
+        self.assertEqual(
+            'Issued 2 SQL statements, the budget is 1:\nSELECT 1\nSELECT 2',
+            mock_e.exception.message
+        )
+
+    def test_statement_budget_counts_statements_of_listened_engines(self) -> None:
+        engine = create_engine('sqlite://')
+        listen_for_statements(engine)
+
+        with engine.connect() as connection:
+            connection.execute(text('SELECT 1'))
+
+            with statement_budget(5) as budget:
+                connection.execute(text('SELECT 2'))
+                connection.execute(text('SELECT 3'))
+
+            connection.execute(text('SELECT 4'))
+
+        self.assertEqual(['SELECT 2', 'SELECT 3'], budget.statements)
+
+
+class StatementBudgetMiddlewareUnitTest(IsolatedAsyncioTestCase):
+    async def test_call_runs_requests_within_a_budget(self) -> None:
+        engine = create_engine('sqlite://')
+        listen_for_statements(engine)
+
+        async def app(scope, receive, send) -> None:
+            with engine.connect() as connection:
+                connection.execute(text('SELECT 1'))
+                connection.execute(text('SELECT 2'))
+
+        middleware = StatementBudgetMiddleware(app, max_statements=1)
+
+        with self.assertRaises(StatementBudgetExceededError):
+            await middleware({'type': 'http'}, MagicMock(), MagicMock())
+
+    async def test_call_ignores_non_http_scopes(self) -> None:
+        app = MagicMock()
+
+        async def call_app(scope, receive, send) -> None:
+            app(scope)
+
+        middleware = StatementBudgetMiddleware(call_app, max_statements=0)
+        await middleware({'type': 'lifespan'}, MagicMock(), MagicMock())
+
+        app.assert_called_once_with({'type': 'lifespan'})
@@ -1,5 +1,10 @@
+import threading
 from unittest import TestCase
+from unittest.mock import patch, MagicMock
 
+from sqlalchemy.orm import Session
+
+from api.exceptions import JobLockedError
 from api.jobs.base_jobs import Job
 
 
@@ -9,3 +14,109 @@ class JobUnitTest(TestCase):
 
         self.assertTrue(hasattr(job, 'queue'))
         self.assertTrue(hasattr(job, 'before_start'))
+
+    @patch('api.jobs.base_jobs.job_queue')
+    def test_queue(self, mock_job_queue) -> None:
+        job = Job()
+        job.queue()
+
+        mock_job_queue.push.assert_called_once_with([job])
+
+    def test_payload(self) -> None:
+        self.assertEqual({}, Job().payload())
+        self.assertIsInstance(Job.from_payload({}), Job)
+
+    def test_dedup_key(self) -> None:
+        self.assertIsNone(Job().dedup_key())
+        self.assertEqual(0, Job.dedup_window)
+
+    def test_class_path_resolves_back_to_the_class(self) -> None:
+        self.assertEqual('api.jobs.base_jobs.Job', Job.class_path())
+        self.assertIs(Job, Job.resolve_class(Job.class_path()))
+
+    def test_handle_raises_not_implemented_error(self) -> None:
+        with self.assertRaises(NotImplementedError):
+            Job().handle()
+
+    def test_lock_keys(self) -> None:
+        self.assertEqual([], Job().lock_keys())
+
+    @patch('api.jobs.base_jobs.lock_manager')
+    def test_before_start_acquires_the_locks(self, mock_lock_manager) -> None:
+        mock_lock_manager.acquire.return_value = True
+
+        job = Job()
+        job.lock_owner = 'owner'
+        job.before_start()
+
+        mock_lock_manager.acquire.assert_called_once_with([], 'owner', 30)
+
+    @patch('api.jobs.base_jobs.lock_manager')
+    def test_before_start_defaults_the_lock_owner(self, mock_lock_manager) -> None:
+        mock_lock_manager.acquire.return_value = True
+
+        job = Job()
+        job.before_start()
+
+        self.assertIsNotNone(job.lock_owner)
+
+    @patch('api.jobs.base_jobs.lock_manager')
+    def test_before_start_raises_when_locked(self, mock_lock_manager) -> None:
+        mock_lock_manager.acquire.return_value = False
+
+        with self.assertRaises(JobLockedError):
+            Job().before_start()
+
+    @patch('api.jobs.base_jobs.lock_manager')
+    def test_after_finish_releases_the_locks(self, mock_lock_manager) -> None:
+        job = Job()
+        job.lock_owner = 'owner'
+        job.after_finish()
+
+        mock_lock_manager.release.assert_called_once_with([], 'owner')
+
+    @patch('api.jobs.base_jobs.lock_manager')
+    def test_after_finish_closes_the_session_before_releasing_the_locks(self, mock_lock_manager) -> None:
+        mock_db_session = MagicMock()
+        mock_db_session.close = MagicMock(side_effect=lambda: mock_lock_manager.release.assert_not_called())
+
+        job = Job()
+        job.db_session = mock_db_session
+        job.after_finish()
+
+        mock_db_session.close.assert_called_once()
+        mock_lock_manager.release.assert_called_once()
+        self.assertIsNone(job._db_session)
+
+    @patch('api.jobs.base_jobs.lock_manager')
+    def test_after_finish_releases_the_locks_when_closing_the_session_fails(self, mock_lock_manager) -> None:
+        job = Job()
+        job.db_session = MagicMock()
+        job.db_session.close = MagicMock(side_effect=RuntimeError())
+
+        with self.assertRaises(RuntimeError):
+            job.after_finish()
+
+        mock_lock_manager.release.assert_called_once()
+
+    def test_db_session_is_taken_lazily(self) -> None:
+        job = Job()
+
+        self.assertIsNone(job._db_session)
+        self.assertIsInstance(job.db_session, Session)
+        self.assertIs(job.db_session, job._db_session)
+
+        job.close_db_session()
+
+    def test_db_session_is_shared_by_the_jobs_of_a_thread(self) -> None:
+        first, second, other = Job(), Job(), Job()
+
+        thread = threading.Thread(target=lambda: other.db_session)
+        thread.start()
+        thread.join()
+
+        self.assertIs(first.db_session, second.db_session)
+        self.assertIsNot(first.db_session, other.db_session)
+
+        for job in (first, second, other):
+            job.close_db_session()
@@ -0,0 +1,107 @@
+import time
+from unittest import TestCase
+from unittest.mock import patch
+
+from sqlalchemy import create_engine, StaticPool, text
+
+from api.database.migrations import MIGRATIONS, Migrator
+from api.jobs.locks import LockManager
+
+
+def make_lock_manager(shards: int = 4) -> LockManager:
+    engine = create_engine('sqlite://', poolclass=StaticPool, connect_args={'check_same_thread': False})
+
+    with engine.begin() as connection:
+        Migrator(connection, MIGRATIONS).migrate()
+
+    return LockManager(engine, shards)
+
+
+class LockManagerUnitTest(TestCase):
+    def setUp(self) -> None:
+        self.lock_manager = make_lock_manager()
+
+        # A second manager on the same database stands in for a worker in another process
+        self.other_process = LockManager(self.lock_manager.engine, 4)
+
+    def tearDown(self) -> None:
+        self.lock_manager.engine.dispose()
+
+    def rows(self) -> list:
+        with self.lock_manager.engine.connect() as connection:
+            return connection.execute(text('SELECT key, owner FROM job_locks ORDER BY key')).all()
+
+    def test_shard_is_stable(self) -> None:
+        self.assertIs(self.lock_manager.shard('item:1'), self.lock_manager.shard('item:1'))
+        self.assertEqual(
+            self.lock_manager.shard_index('item:1'),
+            make_lock_manager().shard_index('item:1')
+        )
+
+    def test_acquire(self) -> None:
+        self.assertTrue(self.lock_manager.acquire(['item:1', 'product:2'], 'a', 30))
+
+        self.assertEqual([('item:1', 'a'), ('product:2', 'a')], self.rows())
+
+    def test_acquire_nothing(self) -> None:
+        self.assertTrue(self.lock_manager.acquire([], 'a', 30))
+
+        self.assertEqual([], self.rows())
+
+    def test_acquire_held_key_in_the_same_process(self) -> None:
+        self.lock_manager.acquire(['item:1'], 'a', 30)
+
+        with patch.object(self.lock_manager, 'acquire_shared') as mock_acquire_shared:
+            self.assertFalse(self.lock_manager.acquire(['item:1', 'product:2'], 'b', 30))
+
+        mock_acquire_shared.assert_not_called()
+        self.assertEqual([('item:1', 'a')], self.rows())
+
+    def test_acquire_held_key_in_another_process(self) -> None:
+        self.other_process.acquire(['product:2'], 'a', 30)
+
+        self.assertFalse(self.lock_manager.acquire(['item:1', 'product:2'], 'b', 30))
+
+        # Nothing is kept of a partial claim, neither in the table nor in the process
+        self.assertEqual([('product:2', 'a')], self.rows())
+        self.assertTrue(self.lock_manager.acquire(['item:1'], 'c', 30))
+
+    def test_acquire_unrelated_keys(self) -> None:
+        self.assertTrue(self.lock_manager.acquire(['item:1'], 'a', 30))
+        self.assertTrue(self.lock_manager.acquire(['item:2'], 'b', 30))
+        self.assertTrue(self.other_process.acquire(['item:3'], 'c', 30))
+
+    def test_acquire_again_by_the_same_owner(self) -> None:
+        self.lock_manager.acquire(['item:1'], 'a', 30)
+
+        self.assertTrue(self.lock_manager.acquire(['item:1'], 'a', 30))
+
+    def test_acquire_expired_lock(self) -> None:
+        self.other_process.acquire(['item:1'], 'a', -1)
+        self.lock_manager.acquire(['item:2'], 'a', -1)
+
+        self.assertTrue(self.lock_manager.acquire(['item:1', 'item:2'], 'b', 30))
+        self.assertEqual([('item:1', 'b'), ('item:2', 'b')], self.rows())
+
+    def test_release(self) -> None:
+        self.lock_manager.acquire(['item:1', 'product:2'], 'a', 30)
+
+        self.lock_manager.release(['item:1', 'product:2'], 'a')
+
+        self.assertEqual([], self.rows())
+        self.assertTrue(self.other_process.acquire(['item:1'], 'b', 30))
+        self.assertTrue(self.lock_manager.acquire(['product:2'], 'b', 30))
+
+    def test_release_by_another_owner(self) -> None:
+        self.lock_manager.acquire(['item:1'], 'a', 30)
+
+        self.lock_manager.release(['item:1'], 'b')
+
+        self.assertEqual([('item:1', 'a')], self.rows())
+        self.assertFalse(self.lock_manager.acquire(['item:1'], 'b', 30))
+
+    def test_lease_expiry(self) -> None:
+        self.lock_manager.acquire(['item:1'], 'a', 0.01)
+        time.sleep(0.02)
+
+        self.assertTrue(self.other_process.acquire(['item:1'], 'b', 30))
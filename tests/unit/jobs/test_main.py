@@ -0,0 +1,71 @@
+import signal
+from unittest import TestCase
+from unittest.mock import patch, MagicMock
+
+from api.jobs.__main__ import main, run_worker
+from api.jobs.configuration import JOB_QUEUES
+
+
+class RunWorkerUnitTest(TestCase):
+    @patch('api.jobs.__main__.signal.signal')
+    @patch('api.jobs.__main__.engine')
+    @patch('api.jobs.__main__.OutboxDispatcher')
+    @patch('api.jobs.__main__.Worker')
+    def test_run_worker_stops_on_sigterm(
+        self,
+        mock_worker_class,
+        mock_dispatcher_class,
+        mock_engine,
+        mock_signal
+    ) -> None:
+        run_worker(['reservations'], 4, 2)
+
+        mock_dispatcher_class.return_value.run.assert_called_once()
+        mock_dispatcher_class.return_value.stop.assert_called()
+
+        mock_engine.dispose.assert_called_once_with(close=False)
+        mock_worker_class.assert_called_once_with(['reservations'], concurrency=4, prefetch=2)
+        mock_worker_class.return_value.run.assert_called_once()
+
+        handlers = {call.args[0]: call.args[1] for call in mock_signal.call_args_list}
+        handlers[signal.SIGTERM](signal.SIGTERM, None)
+
+        mock_worker_class.return_value.stop.assert_called_once()
+        self.assertEqual(2, mock_dispatcher_class.return_value.stop.call_count)
+        self.assertIn(signal.SIGINT, handlers)
+
+
+class MainUnitTest(TestCase):
+    @patch('api.jobs.__main__.run_worker')
+    def test_main_runs_a_single_worker_in_process(self, mock_run_worker) -> None:
+        main(['--processes', '1', '--threads', '3', '--prefetch', '5'])
+
+        mock_run_worker.assert_called_once_with(JOB_QUEUES, 3, 5)
+
+    @patch('api.jobs.__main__.run_worker')
+    def test_main_selects_queues(self, mock_run_worker) -> None:
+        main(['--processes', '1', '--queue', 'reservations'])
+
+        self.assertEqual(['reservations'], mock_run_worker.call_args.args[0])
+
+    @patch('api.jobs.__main__.signal.signal')
+    @patch('api.jobs.__main__.multiprocessing.Process')
+    def test_main_starts_worker_processes_and_forwards_sigterm(self, mock_process_class, mock_signal) -> None:
+        processes = [MagicMock(), MagicMock()]
+        processes[1].is_alive.return_value = False
+        mock_process_class.side_effect = processes
+
+        main(['--processes', '2', '--threads', '3', '--prefetch', '5', '--queue', 'default'])
+
+        self.assertEqual(2, mock_process_class.call_count)
+        self.assertEqual((['default'], 3, 5), mock_process_class.call_args.kwargs['args'])
+
+        for process in processes:
+            process.start.assert_called_once()
+            process.join.assert_called_once()
+
+        handlers = {call.args[0]: call.args[1] for call in mock_signal.call_args_list}
+        handlers[signal.SIGTERM](signal.SIGTERM, None)
+
+        processes[0].terminate.assert_called_once()
+        processes[1].terminate.assert_not_called()
@@ -0,0 +1,107 @@
+from unittest import TestCase
+
+from sqlalchemy import create_engine, StaticPool, text
+
+from api.database.migrations import MIGRATIONS, Migrator
+from api.jobs.base_jobs import Job
+from api.jobs.metrics import JobMetrics
+from api.jobs.queue import JobQueue
+
+
+class EchoJob(Job):
+    queue_name = 'echo'
+
+
+class JobMetricsUnitTest(TestCase):
+    def setUp(self) -> None:
+        self.engine = create_engine('sqlite://', poolclass=StaticPool, connect_args={'check_same_thread': False})
+
+        with self.engine.begin() as connection:
+            Migrator(connection, MIGRATIONS).migrate()
+
+        self.now = 0
+        self.job_metrics = JobMetrics(self.engine, ['echo', 'idle'], flush_interval=5, clock=lambda: self.now)
+
+    def tearDown(self) -> None:
+        self.engine.dispose()
+
+    def rows(self) -> dict:
+        with self.engine.connect() as connection:
+            return {
+                (row.name, row.job_class, row.le): row.value
+                for row in connection.execute(text('SELECT * FROM job_metrics'))
+            }
+
+    def test_flush_adds_to_the_totals(self) -> None:
+        self.job_metrics.inc('jobs_succeeded_total', 'EchoJob')
+        self.job_metrics.inc('jobs_succeeded_total', 'EchoJob')
+        self.job_metrics.flush()
+        self.job_metrics.inc('jobs_succeeded_total', 'EchoJob', 3)
+        self.job_metrics.flush()
+        self.job_metrics.flush()
+
+        self.assertEqual({('jobs_succeeded_total', 'EchoJob', ''): 5}, self.rows())
+
+    def test_observe_fills_the_buckets(self) -> None:
+        self.job_metrics.observe('job_run_seconds', 'EchoJob', 0.2)
+        self.job_metrics.observe('job_run_seconds', 'EchoJob', 7)
+        self.job_metrics.flush()
+
+        rows = self.rows()
+
+        self.assertNotIn(('job_run_seconds_bucket', 'EchoJob', '0.1'), rows)
+        self.assertEqual(1, rows[('job_run_seconds_bucket', 'EchoJob', '0.25')])
+        self.assertEqual(1, rows[('job_run_seconds_bucket', 'EchoJob', '5')])
+        self.assertEqual(2, rows[('job_run_seconds_bucket', 'EchoJob', '10')])
+        self.assertEqual(2, rows[('job_run_seconds_bucket', 'EchoJob', '+Inf')])
+        self.assertEqual(7.2, rows[('job_run_seconds_sum', 'EchoJob', '')])
+        self.assertEqual(2, rows[('job_run_seconds_count', 'EchoJob', '')])
+
+    def test_flush_if_due(self) -> None:
+        self.job_metrics.inc('jobs_failed_total', 'EchoJob')
+        self.now = 4
+        self.job_metrics.flush_if_due()
+
+        self.assertEqual({}, self.rows())
+
+        self.now = 5
+        self.job_metrics.flush_if_due()
+
+        self.assertEqual({('jobs_failed_total', 'EchoJob', ''): 1}, self.rows())
+
+    def test_render(self) -> None:
+        self.job_metrics.inc('jobs_succeeded_total', 'EchoJob')
+        self.job_metrics.observe('job_wait_seconds', 'EchoJob', 0.3)
+        self.job_metrics.flush()
+
+        rendered = self.job_metrics.render()
+
+        self.assertIn('# TYPE jobs_succeeded_total counter\njobs_succeeded_total{job_class="EchoJob"} 1.0\n', rendered)
+        self.assertIn('# TYPE jobs_failed_total counter\n# HELP', rendered)
+        self.assertIn('# TYPE job_wait_seconds histogram\n', rendered)
+        self.assertIn(
+            'job_wait_seconds_bucket{job_class="EchoJob",le="0.5"} 1.0\n'
+            'job_wait_seconds_bucket{job_class="EchoJob",le="1"} 1.0\n',
+            rendered
+        )
+        self.assertIn(
+            'job_wait_seconds_bucket{job_class="EchoJob",le="300"} 1.0\n'
+            'job_wait_seconds_bucket{job_class="EchoJob",le="+Inf"} 1.0\n'
+            'job_wait_seconds_count{job_class="EchoJob"} 1.0\n'
+            'job_wait_seconds_sum{job_class="EchoJob"} 0.3\n',
+            rendered
+        )
+
+    def test_render_queues(self) -> None:
+        job_queue = JobQueue(self.engine)
+        job_queue.push([EchoJob(), EchoJob(), EchoJob()])
+        job_queue.push([EchoJob()], delay=60)
+        leased_jobs = job_queue.lease('echo', 2, 'worker')
+        job_queue.bury(leased_jobs[0].id, 'worker', 'error')
+
+        rendered = self.job_metrics.render()
+
+        self.assertIn('job_queue_depth{queue="echo"} 3\njob_queue_depth{queue="idle"} 0\n', rendered)
+        self.assertIn('job_queue_ready{queue="echo"} 1\n', rendered)
+        self.assertIn('job_queue_leased{queue="echo"} 1\n', rendered)
+        self.assertIn('job_queue_dead{queue="echo"} 1\n', rendered)
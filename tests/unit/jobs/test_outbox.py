@@ -0,0 +1,103 @@
+import threading
+from unittest import TestCase, IsolatedAsyncioTestCase
+from unittest.mock import MagicMock, AsyncMock
+
+from sqlalchemy import text, insert
+
+from api.database.models import OutboxJob
+from api.jobs.outbox import Outbox, OutboxDispatcher
+from api.jobs.queue import JobQueue
+from tests.unit.jobs.test_queue import EchoJob, CoalescedEchoJob, make_job_queue
+
+
+class OutboxAddUnitTest(IsolatedAsyncioTestCase):
+    async def test_add_writes_every_job_in_one_statement(self) -> None:
+        db_session = MagicMock()
+        db_session.execute = AsyncMock()
+
+        await Outbox(MagicMock()).add(db_session, [EchoJob('a'), CoalescedEchoJob('b')])
+
+        db_session.execute.assert_awaited_once()
+        rows = db_session.execute.call_args.args[1]
+        self.assertEqual(['echo', 'echo'], [row['queue'] for row in rows])
+        self.assertEqual([None, 'b'], [row['dedup_key'] for row in rows])
+
+
+class OutboxDispatchUnitTest(TestCase):
+    def setUp(self) -> None:
+        self.job_queue = make_job_queue()
+        self.outbox = Outbox(self.job_queue.engine, self.job_queue, batch_size=2)
+
+    def tearDown(self) -> None:
+        self.job_queue.engine.dispose()
+
+    def add(self, jobs: list) -> None:
+        with self.job_queue.engine.begin() as connection:
+            connection.execute(insert(OutboxJob), JobQueue.rows(jobs))
+
+    def rows(self, table: str) -> list:
+        with self.job_queue.engine.connect() as connection:
+            return connection.execute(text(f'SELECT * FROM {table} ORDER BY id')).all()
+
+    def test_dispatch_moves_the_jobs_onto_the_queue_in_order(self) -> None:
+        self.add([EchoJob('a'), EchoJob('b'), EchoJob('c')])
+
+        self.assertEqual(3, self.outbox.dispatch())
+
+        self.assertEqual([], self.rows('job_outbox'))
+        self.assertEqual(['{"message": "a"}', '{"message": "b"}', '{"message": "c"}'], [
+            row.payload for row in self.rows('jobs')
+        ])
+        self.assertEqual(['echo'] * 3, [row.queue for row in self.rows('jobs')])
+
+    def test_dispatch_batch_moves_at_most_a_batch(self) -> None:
+        self.add([EchoJob('a'), EchoJob('b'), EchoJob('c')])
+
+        self.assertEqual(2, self.outbox.dispatch_batch())
+
+        self.assertEqual(1, len(self.rows('job_outbox')))
+        self.assertEqual(2, len(self.rows('jobs')))
+
+    def test_dispatch_coalesces_jobs_of_the_same_dedup_key(self) -> None:
+        self.add([CoalescedEchoJob('a')])
+        self.outbox.dispatch()
+        self.add([CoalescedEchoJob('a'), CoalescedEchoJob('b')])
+        self.outbox.dispatch()
+
+        self.assertEqual(['a', 'b'], [row.dedup_key for row in self.rows('jobs')])
+
+    def test_dispatch_of_an_empty_outbox(self) -> None:
+        self.assertEqual(0, self.outbox.dispatch())
+
+
+class OutboxDispatcherUnitTest(TestCase):
+    def test_run_dispatches_until_stopped_and_once_more(self) -> None:
+        outbox = MagicMock()
+        dispatcher = OutboxDispatcher(outbox, poll_interval=0.01)
+        outbox.dispatch = MagicMock(side_effect=lambda: outbox.dispatch.call_count == 2 and dispatcher.stop())
+
+        thread = threading.Thread(target=dispatcher.run)
+        thread.start()
+        thread.join(1)
+
+        self.assertFalse(thread.is_alive())
+        self.assertEqual(3, outbox.dispatch.call_count)
+
+    def test_run_keeps_going_when_a_dispatch_fails(self) -> None:
+        outbox = MagicMock()
+        dispatcher = OutboxDispatcher(outbox, poll_interval=0.01)
+
+        def dispatch() -> int:
+            if outbox.dispatch.call_count == 1:
+                raise RuntimeError('database is locked')
+
+            dispatcher.stop()
+
+            return 0
+
+        outbox.dispatch = MagicMock(side_effect=dispatch)
+
+        with self.assertLogs('api.jobs.outbox', 'ERROR'):
+            dispatcher.run()
+
+        self.assertEqual(3, outbox.dispatch.call_count)
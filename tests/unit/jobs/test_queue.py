@@ -0,0 +1,239 @@
+import json
+import time
+from unittest import TestCase
+
+from sqlalchemy import create_engine, StaticPool, text
+
+from api.database.migrations import MIGRATIONS, Migrator
+from api.jobs.base_jobs import Job
+from api.jobs.queue import JobQueue
+
+
+class EchoJob(Job):
+    queue_name = 'echo'
+
+    def __init__(self, message: str):
+        self.message = message
+
+    def payload(self) -> dict:
+        return {'message': self.message}
+
+
+class CoalescedEchoJob(EchoJob):
+    dedup_window = 60
+
+    def dedup_key(self) -> str | None:
+        return self.message
+
+
+def make_job_queue() -> JobQueue:
+    engine = create_engine('sqlite://', poolclass=StaticPool, connect_args={'check_same_thread': False})
+
+    with engine.begin() as connection:
+        Migrator(connection, MIGRATIONS).migrate()
+
+    return JobQueue(engine)
+
+
+class JobQueueUnitTest(TestCase):
+    def setUp(self) -> None:
+        self.job_queue = make_job_queue()
+
+    def tearDown(self) -> None:
+        self.job_queue.engine.dispose()
+
+    def rows(self) -> list:
+        with self.job_queue.engine.connect() as connection:
+            return connection.execute(text('SELECT * FROM jobs ORDER BY id')).all()
+
+    def test_push(self) -> None:
+        self.job_queue.push([EchoJob('a'), EchoJob('b')])
+
+        rows = self.rows()
+
+        self.assertEqual(2, len(rows))
+        self.assertEqual('echo', rows[0].queue)
+        self.assertEqual(EchoJob.class_path(), rows[0].job_class)
+        self.assertEqual({'message': 'a'}, json.loads(rows[0].payload))
+        self.assertEqual(0, rows[0].attempts)
+        self.assertIsNone(rows[0].leased_until)
+        self.assertIsNone(rows[0].dedup_key)
+
+    def test_push_coalesces_pending_jobs_of_the_same_dedup_key(self) -> None:
+        self.job_queue.push([CoalescedEchoJob('a'), CoalescedEchoJob('b')])
+        self.job_queue.push([CoalescedEchoJob('a'), CoalescedEchoJob('a'), EchoJob('a'), EchoJob('a')])
+
+        rows = self.rows()
+
+        self.assertEqual(['a', 'b', None, None], [row.dedup_key for row in rows])
+        self.assertGreater(rows[0].available_at, time.time() + 50)
+        self.assertLess(rows[2].available_at, time.time() + 1)
+
+    def test_push_queues_again_once_the_pending_job_is_leased(self) -> None:
+        self.job_queue.push([CoalescedEchoJob('a')], delay=-60)
+        self.job_queue.lease('echo', 1, 'worker')
+
+        self.job_queue.push([CoalescedEchoJob('a')])
+        self.job_queue.push([CoalescedEchoJob('a')])
+
+        self.assertEqual(['worker', None], [row.lease_owner for row in self.rows()])
+
+    def test_push_nothing(self) -> None:
+        self.job_queue.push([])
+
+        self.assertEqual([], self.rows())
+
+    def test_lease(self) -> None:
+        self.job_queue.push([EchoJob('a'), EchoJob('b'), EchoJob('c')])
+
+        leased_jobs = self.job_queue.lease('echo', 2, 'worker')
+
+        self.assertEqual([{'message': 'a'}, {'message': 'b'}], [leased_job.payload for leased_job in leased_jobs])
+        self.assertEqual([1, 1], [leased_job.attempts for leased_job in leased_jobs])
+        self.assertEqual(['worker', 'worker', None], [row.lease_owner for row in self.rows()])
+
+    def test_lease_skips_leased_delayed_and_other_queues(self) -> None:
+        self.job_queue.push([EchoJob('a')])
+        self.job_queue.push([EchoJob('b')], delay=60)
+        self.job_queue.lease('echo', 1, 'worker')
+
+        self.assertEqual([], self.job_queue.lease('echo', 10, 'other'))
+        self.assertEqual([], self.job_queue.lease('default', 10, 'other'))
+
+    def test_lease_expires(self) -> None:
+        self.job_queue.push([EchoJob('a')])
+        self.job_queue.lease('echo', 1, 'worker', lease_seconds=-1)
+
+        leased_jobs = self.job_queue.lease('echo', 1, 'other')
+
+        self.assertEqual(1, len(leased_jobs))
+        self.assertEqual(2, leased_jobs[0].attempts)
+        self.assertEqual('other', self.rows()[0].lease_owner)
+
+    def test_complete(self) -> None:
+        self.job_queue.push([EchoJob('a'), EchoJob('b')])
+        leased_jobs = self.job_queue.lease('echo', 2, 'worker')
+
+        self.job_queue.complete([leased_jobs[0].id], 'worker')
+
+        self.assertEqual([leased_jobs[1].id], [row.id for row in self.rows()])
+
+    def test_complete_keeps_jobs_leased_by_others(self) -> None:
+        self.job_queue.push([EchoJob('a')])
+        leased_jobs = self.job_queue.lease('echo', 1, 'worker')
+
+        self.job_queue.complete([leased_jobs[0].id], 'other')
+
+        self.assertEqual(1, len(self.rows()))
+
+    def test_renew(self) -> None:
+        self.job_queue.push([EchoJob('a'), EchoJob('b')])
+        leased_jobs = self.job_queue.lease('echo', 2, 'worker', lease_seconds=-1)
+
+        self.job_queue.renew([leased_jobs[0].id], 'worker', lease_seconds=60)
+        self.job_queue.renew([leased_jobs[1].id], 'other', lease_seconds=60)
+
+        leased_by_other = self.job_queue.lease('echo', 2, 'other')
+
+        self.assertEqual([leased_jobs[1].id], [leased_job.id for leased_job in leased_by_other])
+        self.assertGreater(self.rows()[0].leased_until, time.time() + 50)
+
+    def test_release(self) -> None:
+        self.job_queue.push([EchoJob('a')])
+        leased_jobs = self.job_queue.lease('echo', 1, 'worker')
+
+        self.job_queue.release(leased_jobs[0].id, 'worker', delay=60)
+
+        row = self.rows()[0]
+        self.assertIsNone(row.leased_until)
+        self.assertIsNone(row.lease_owner)
+        self.assertGreater(row.available_at, time.time() + 50)
+        self.assertEqual([], self.job_queue.lease('echo', 1, 'worker'))
+
+    def test_release_without_counting_the_attempt(self) -> None:
+        self.job_queue.push([EchoJob('a')])
+        leased_jobs = self.job_queue.lease('echo', 1, 'worker')
+
+        self.job_queue.release(leased_jobs[0].id, 'worker', count_attempt=False)
+
+        self.assertEqual(0, self.rows()[0].attempts)
+        self.assertEqual(1, self.job_queue.lease('echo', 1, 'worker')[0].attempts)
+
+    def test_release_replaces_the_pending_job_of_the_same_dedup_key(self) -> None:
+        self.job_queue.push([CoalescedEchoJob('a')], delay=-60)
+        leased_jobs = self.job_queue.lease('echo', 1, 'worker')
+        self.job_queue.push([CoalescedEchoJob('a')])
+
+        self.job_queue.release(leased_jobs[0].id, 'worker')
+
+        self.assertEqual([leased_jobs[0].id], [row.id for row in self.rows()])
+
+    def dead_rows(self) -> list:
+        with self.job_queue.engine.connect() as connection:
+            return connection.execute(text('SELECT * FROM dead_jobs ORDER BY id')).all()
+
+    def test_bury(self) -> None:
+        self.job_queue.push([EchoJob('a'), EchoJob('b')])
+        leased_jobs = self.job_queue.lease('echo', 2, 'worker')
+
+        self.job_queue.bury(leased_jobs[0].id, 'worker', 'ValueError: a')
+
+        dead_rows = self.dead_rows()
+
+        self.assertEqual([leased_jobs[1].id], [row.id for row in self.rows()])
+        self.assertEqual(1, len(dead_rows))
+        self.assertEqual('echo', dead_rows[0].queue)
+        self.assertEqual(EchoJob.class_path(), dead_rows[0].job_class)
+        self.assertEqual(1, dead_rows[0].attempts)
+        self.assertEqual({'message': 'a'}, json.loads(dead_rows[0].payload))
+        self.assertEqual('ValueError: a', dead_rows[0].error)
+
+    def test_bury_keeps_jobs_leased_by_others(self) -> None:
+        self.job_queue.push([EchoJob('a')])
+        leased_jobs = self.job_queue.lease('echo', 1, 'worker')
+
+        self.job_queue.bury(leased_jobs[0].id, 'other', 'error')
+
+        self.assertEqual(1, len(self.rows()))
+        self.assertEqual([], self.dead_rows())
+
+    def test_dead(self) -> None:
+        self.job_queue.push([EchoJob('a'), CoalescedEchoJob('b')], delay=-60)
+
+        for leased_job in self.job_queue.lease('echo', 2, 'worker'):
+            self.job_queue.bury(leased_job.id, 'worker', 'error')
+
+        self.assertEqual(2, len(self.job_queue.dead()))
+        self.assertEqual(1, len(self.job_queue.dead(job_class=EchoJob.class_path())))
+        self.assertEqual([], self.job_queue.dead(queue='default'))
+
+    def test_replay(self) -> None:
+        self.job_queue.push([EchoJob('a'), EchoJob('b')])
+
+        for leased_job in self.job_queue.lease('echo', 2, 'worker'):
+            self.job_queue.bury(leased_job.id, 'worker', 'error')
+
+        dead_jobs = self.job_queue.dead()
+
+        self.assertEqual(1, self.job_queue.replay(ids=[dead_jobs[0].id]))
+        self.assertEqual([dead_jobs[1].id], [dead_job.id for dead_job in self.job_queue.dead()])
+
+        leased_jobs = self.job_queue.lease('echo', 2, 'worker')
+
+        self.assertEqual([{'message': 'a'}], [leased_job.payload for leased_job in leased_jobs])
+        self.assertEqual(1, leased_jobs[0].attempts)
+
+    def test_replay_coalesces_into_pending_jobs(self) -> None:
+        self.job_queue.push([CoalescedEchoJob('a')], delay=-60)
+        self.job_queue.bury(self.job_queue.lease('echo', 1, 'worker')[0].id, 'worker', 'error')
+        self.job_queue.push([CoalescedEchoJob('a')])
+
+        self.assertEqual(1, self.job_queue.replay(queue='echo'))
+        self.assertEqual(1, len(self.rows()))
+        self.assertEqual([], self.job_queue.dead())
+
+    def test_depth(self) -> None:
+        self.job_queue.push([EchoJob('a'), EchoJob('b')])
+
+        self.assertEqual(2, self.job_queue.depth('echo'))
+        self.assertEqual(0, self.job_queue.depth('default'))
@@ -0,0 +1,43 @@
+from io import StringIO
+from types import SimpleNamespace
+from unittest import TestCase
+from unittest.mock import MagicMock, patch
+
+from api.jobs.replay import main
+
+
+class ReplayUnitTest(TestCase):
+    def setUp(self) -> None:
+        self.job_queue = MagicMock()
+        self.job_queue.replay = MagicMock(return_value=2)
+
+    @patch('sys.stdout', new_callable=StringIO)
+    def test_replays_the_matching_dead_jobs(self, mock_stdout) -> None:
+        main(['--queue', 'reservations', '--id', '1', '--id', '2'], self.job_queue)
+
+        self.job_queue.replay.assert_called_once_with(ids=[1, 2], queue='reservations', job_class=None)
+        self.assertEqual('Replayed 2 dead jobs\n', mock_stdout.getvalue())
+
+    @patch('sys.stdout', new_callable=StringIO)
+    def test_replays_every_dead_job(self, mock_stdout) -> None:
+        main(['--all'], self.job_queue)
+
+        self.job_queue.replay.assert_called_once_with(ids=None, queue=None, job_class=None)
+
+    @patch('sys.stderr', new_callable=StringIO)
+    def test_refuses_to_replay_every_dead_job_by_accident(self, mock_stderr) -> None:
+        with self.assertRaises(SystemExit):
+            main([], self.job_queue)
+
+        self.job_queue.replay.assert_not_called()
+
+    @patch('sys.stdout', new_callable=StringIO)
+    def test_lists_the_matching_dead_jobs(self, mock_stdout) -> None:
+        dead_job = SimpleNamespace(id=1, queue='reservations', job_class='Job', payload='{}', error='Traceback\nValueError: 1')
+        self.job_queue.dead = MagicMock(return_value=[dead_job])
+
+        main(['--list', '--job-class', 'Job'], self.job_queue)
+
+        self.job_queue.dead.assert_called_once_with(ids=None, queue=None, job_class='Job')
+        self.job_queue.replay.assert_not_called()
+        self.assertEqual('1\treservations\tJob\t{}\tValueError: 1\n', mock_stdout.getvalue())
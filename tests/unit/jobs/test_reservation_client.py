@@ -0,0 +1,193 @@
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from unittest import TestCase
+from unittest.mock import MagicMock
+
+from api.exceptions import CircuitOpenError
+from api.jobs.reservation_client import ReservationClient, ReservationRequest, StubReservationClient, \
+    BatchingReservationClient, CircuitBreakingReservationClient
+
+
+class ReservationClientUnitTest(TestCase):
+    def test_single_calls_are_requests_of_one(self) -> None:
+        client = ReservationClient()
+        client.reserve_many = MagicMock(return_value=['reservation-1'])
+        client.release_many = MagicMock()
+
+        self.assertEqual('reservation-1', client.reserve(ReservationRequest(1, 2)))
+        client.release('reservation-1')
+
+        client.reserve_many.assert_called_once_with([ReservationRequest(1, 2)])
+        client.release_many.assert_called_once_with(['reservation-1'])
+
+    def test_batch_calls_raise_not_implemented_error(self) -> None:
+        with self.assertRaises(NotImplementedError):
+            ReservationClient().reserve_many([])
+
+        with self.assertRaises(NotImplementedError):
+            ReservationClient().release_many([])
+
+
+class StubReservationClientUnitTest(TestCase):
+    def test_reserve_many(self) -> None:
+        client = StubReservationClient()
+
+        self.assertEqual(
+            ['reservation-1', 'existing'],
+            client.reserve_many([ReservationRequest(1, 2), ReservationRequest(3, 4, 'existing')])
+        )
+        self.assertEqual({'reservation-1': (1, 2), 'existing': (3, 4)}, client.reservations)
+        self.assertEqual(1, client.requests)
+
+    def test_release_many(self) -> None:
+        client = StubReservationClient()
+        client.reserve_many([ReservationRequest(1, 2), ReservationRequest(3, 4)])
+
+        client.release_many(['reservation-1', 'unknown'])
+
+        self.assertEqual({'reservation-2': (3, 4)}, client.reservations)
+        self.assertEqual(2, client.requests)
+
+
+class BatchingReservationClientUnitTest(TestCase):
+    def test_sends_a_full_batch_at_once(self) -> None:
+        stub = StubReservationClient()
+        client = BatchingReservationClient(stub, max_batch_size=4, max_wait=10)
+
+        with ThreadPoolExecutor(4) as executor:
+            identifiers = list(
+                executor.map(client.reserve, [ReservationRequest(product_id, 1) for product_id in range(4)])
+            )
+
+        self.assertEqual(1, stub.requests)
+        self.assertEqual(4, len(set(identifiers)))
+        self.assertEqual([(product_id, 1) for product_id in range(4)], [stub.reservations[i] for i in identifiers])
+
+    def test_sends_a_partial_batch_after_waiting(self) -> None:
+        stub = StubReservationClient()
+        client = BatchingReservationClient(stub, max_batch_size=4, max_wait=0.01)
+
+        self.assertEqual('reservation-1', client.reserve(ReservationRequest(1, 2)))
+        client.release('reservation-1')
+
+        self.assertEqual(2, stub.requests)
+        self.assertEqual({}, stub.reservations)
+
+    def test_batches_operations_apart(self) -> None:
+        stub = MagicMock()
+        stub.reserve_many = MagicMock(return_value=['reservation-1'])
+        stub.release_many = MagicMock(return_value=None)
+        client = BatchingReservationClient(stub, max_batch_size=2, max_wait=0.05)
+
+        threads = [
+            threading.Thread(target=client.reserve, args=(ReservationRequest(1, 2),)),
+            threading.Thread(target=client.release, args=('reservation-0',)),
+        ]
+
+        for thread in threads:
+            thread.start()
+
+        for thread in threads:
+            thread.join(1)
+
+        stub.reserve_many.assert_called_once_with([ReservationRequest(1, 2)])
+        stub.release_many.assert_called_once_with(['reservation-0'])
+
+    def test_hands_the_error_to_every_call(self) -> None:
+        stub = MagicMock()
+        stub.reserve_many = MagicMock(side_effect=ConnectionError())
+        client = BatchingReservationClient(stub, max_batch_size=2, max_wait=10)
+
+        with ThreadPoolExecutor(2) as executor:
+            futures = [executor.submit(client.reserve, ReservationRequest(product_id, 1)) for product_id in range(2)]
+
+        for future in futures:
+            self.assertIsInstance(future.exception(), ConnectionError)
+
+        stub.reserve_many.assert_called_once()
+
+
+class CircuitBreakingReservationClientUnitTest(TestCase):
+    def setUp(self) -> None:
+        self.now = 0
+        self.stub = MagicMock()
+        self.client = CircuitBreakingReservationClient(self.stub, 2, 30, clock=lambda: self.now)
+
+    def fail(self) -> None:
+        self.stub.reserve_many = MagicMock(side_effect=ConnectionError())
+
+        with self.assertRaises(ConnectionError):
+            self.client.reserve_many([ReservationRequest(1, 2)])
+
+    def test_passes_calls_through(self) -> None:
+        self.stub.reserve_many = MagicMock(return_value=['reservation-1'])
+
+        self.assertEqual(['reservation-1'], self.client.reserve_many([ReservationRequest(1, 2)]))
+        self.client.release_many(['reservation-1'])
+
+        self.stub.release_many.assert_called_once_with(['reservation-1'])
+        self.assertFalse(self.client.open)
+
+    def test_opens_after_failures_in_a_row(self) -> None:
+        self.fail()
+        self.assertFalse(self.client.open)
+        self.fail()
+        self.assertTrue(self.client.open)
+
+        self.stub.release_many.reset_mock()
+
+        with self.assertRaises(CircuitOpenError):
+            self.client.release_many(['reservation-1'])
+
+        self.stub.release_many.assert_not_called()
+
+    def test_success_resets_the_failures(self) -> None:
+        self.fail()
+        self.stub.reserve_many = MagicMock(return_value=['reservation-1'])
+        self.client.reserve_many([ReservationRequest(1, 2)])
+        self.fail()
+
+        self.assertFalse(self.client.open)
+
+    def test_closes_after_a_successful_probe(self) -> None:
+        self.fail()
+        self.fail()
+        self.now = 31
+
+        self.client.release_many(['reservation-1'])
+
+        self.assertFalse(self.client.open)
+        self.assertEqual(0, self.client.failures)
+
+    def test_opens_again_after_a_failed_probe(self) -> None:
+        self.fail()
+        self.fail()
+        self.now = 31
+
+        self.fail()
+
+        self.assertTrue(self.client.open)
+
+        with self.assertRaises(CircuitOpenError):
+            self.client.release_many(['reservation-1'])
+
+    def test_lets_a_single_probe_through(self) -> None:
+        self.fail()
+        self.fail()
+        self.now = 31
+
+        probing = threading.Event()
+        finish = threading.Event()
+        self.stub.release_many = MagicMock(side_effect=lambda arguments: probing.set() or finish.wait(1))
+
+        thread = threading.Thread(target=self.client.release_many, args=(['reservation-1'],))
+        thread.start()
+        probing.wait(1)
+
+        with self.assertRaises(CircuitOpenError):
+            self.client.release_many(['reservation-2'])
+
+        finish.set()
+        thread.join(1)
+
+        self.assertFalse(self.client.open)
@@ -1,11 +1,10 @@
 from unittest import TestCase
-from unittest.mock import MagicMock
-
-from sqlalchemy.orm import Session
+from unittest.mock import MagicMock, patch
 
 from api.database.models import Item
 from api.jobs.base_jobs import Job
-from api.jobs.reservation_jobs import BaseItemJob, ReserveItemJob, ReleaseReservedItemJob
+from api.jobs.reservation_client import StubReservationClient
+from api.jobs.reservation_jobs import BaseItemJob, ReserveItemJob, ReleaseReservedItemJob, ReleaseReservationsJob
 
 
 class BaseItemJobUnitTest(TestCase):
@@ -15,12 +14,35 @@ class BaseItemJobUnitTest(TestCase):
 
         self.assertIsInstance(job, Job)
         self.assertEqual(item_id, job.item_id)
-        self.assertIsInstance(job.db_session, Session)
+        self.assertIsNone(job.product_id)
+        self.assertIsNone(job._db_session)
         self.assertIsNone(job._item)
 
         self.assertTrue(hasattr(job, 'queue'))
         self.assertTrue(hasattr(job, 'before_start'))
 
+    def test_payload_rebuilds_the_job(self) -> None:
+        job = ReserveItemJob(1, 2)
+
+        self.assertEqual('reservations', job.queue_name)
+        self.assertEqual({'item_id': 1, 'product_id': 2}, job.payload())
+        self.assertEqual(1, ReserveItemJob.from_payload(job.payload()).item_id)
+        self.assertEqual(2, ReserveItemJob.from_payload(job.payload()).product_id)
+
+    def test_dedup_key(self) -> None:
+        self.assertEqual(f'{ReserveItemJob.class_path()}:1', ReserveItemJob(1, 2).dedup_key())
+        self.assertEqual(ReserveItemJob(1).dedup_key(), ReserveItemJob(1, 2).dedup_key())
+        self.assertIsNone(ReleaseReservedItemJob(1).dedup_key())
+
+    def test_retry_policy(self) -> None:
+        self.assertEqual(10, ReserveItemJob.retry_policy.max_attempts)
+        self.assertIs(BaseItemJob.retry_policy, ReleaseReservedItemJob.retry_policy)
+        self.assertIsNot(Job.retry_policy, BaseItemJob.retry_policy)
+
+    def test_lock_keys(self) -> None:
+        self.assertEqual(['item:1', 'product:2'], BaseItemJob(1, 2).lock_keys())
+        self.assertEqual(['item:1'], BaseItemJob(1).lock_keys())
+
     def test_item_returns_preset(self) -> None:
         item_id = 1
         job = BaseItemJob(item_id)
@@ -53,21 +75,25 @@ class ReserveItemJobUnitTest(TestCase):
 
         self.assertIsInstance(job, BaseItemJob)
 
-    def test_reserve_item_updates_existing_reservation(self) -> None:
+    @patch('api.jobs.reservation_jobs.reservation_client', new_callable=StubReservationClient)
+    def test_reserve_item_updates_existing_reservation(self, mock_reservation_client) -> None:
         item_id = 1
         reservation_identifier = 'existing_reservation_identifier'
         job = ReserveItemJob(item_id)
-        job._item = Item(id=item_id, reservation_identifier=reservation_identifier)
+        job._item = Item(id=item_id, product_id=2, quantity=3, reservation_identifier=reservation_identifier)
 
         self.assertEqual(reservation_identifier, job.reserve_item())
+        self.assertEqual({reservation_identifier: (2, 3)}, mock_reservation_client.reservations)
 
-    def test_reserve_item_creates_new_reservation(self) -> None:
+    @patch('api.jobs.reservation_jobs.reservation_client', new_callable=StubReservationClient)
+    def test_reserve_item_creates_new_reservation(self, mock_reservation_client) -> None:
         item_id = 1
-        reservation_identifier = 'new_reservation_identifier'
+        reservation_identifier = 'reservation-1'
         job = ReserveItemJob(item_id)
-        job._item = Item(id=item_id)
+        job._item = Item(id=item_id, product_id=2, quantity=3)
 
         self.assertEqual(reservation_identifier, job.reserve_item())
+        self.assertEqual({reservation_identifier: (2, 3)}, mock_reservation_client.reservations)
 
     def test_update_item(self) -> None:
         item_id = 1
@@ -78,7 +104,7 @@ class ReserveItemJobUnitTest(TestCase):
         mock_db_session = MagicMock()
         mock_db_session.query = MagicMock(return_value=mock_db_session)
         mock_db_session.filter = MagicMock(return_value=mock_db_session)
-        mock_db_session.update = MagicMock(return_value=None)
+        mock_db_session.update = MagicMock(return_value=1)
         mock_db_session.commit = MagicMock(return_value=None)
 
         job.db_session = mock_db_session
@@ -92,6 +118,29 @@ class ReserveItemJobUnitTest(TestCase):
         )
         mock_db_session.commit.assert_called_once()
 
+    @patch('api.jobs.reservation_jobs.reservation_client')
+    def test_update_item_releases_the_reservation_of_a_swept_item(self, mock_reservation_client) -> None:
+        job = ReserveItemJob(1)
+        job._item = Item(id=1)
+        job.db_session = MagicMock()
+        job.db_session.query.return_value.filter.return_value.update.return_value = 0
+
+        job.update_item('reservation-1')
+
+        mock_reservation_client.release.assert_called_once_with('reservation-1')
+
+    @patch('api.jobs.reservation_jobs.reservation_client')
+    def test_handle_skips_missing_items(self, mock_reservation_client) -> None:
+        for job_class in (ReserveItemJob, ReleaseReservedItemJob):
+            job = job_class(1)
+            job.db_session = MagicMock()
+            job.db_session.query.return_value.filter.return_value.first.return_value = None
+
+            job.handle()
+
+        mock_reservation_client.reserve.assert_not_called()
+        mock_reservation_client.release.assert_not_called()
+
 
 class ReleaseReservedItemJobUnitTest(TestCase):
     def test_init(self) -> None:
@@ -100,6 +149,24 @@ class ReleaseReservedItemJobUnitTest(TestCase):
 
         self.assertIsInstance(job, BaseItemJob)
 
+    @patch('api.jobs.reservation_jobs.reservation_client', new_callable=StubReservationClient)
+    def test_release_reserved_item(self, mock_reservation_client) -> None:
+        mock_reservation_client.reservations['reservation-1'] = (2, 3)
+
+        job = ReleaseReservedItemJob(1)
+        job._item = Item(id=1, reservation_identifier='reservation-1')
+        job.release_reserved_item()
+
+        self.assertEqual({}, mock_reservation_client.reservations)
+
+    @patch('api.jobs.reservation_jobs.reservation_client')
+    def test_release_reserved_item_without_reservation(self, mock_reservation_client) -> None:
+        job = ReleaseReservedItemJob(1)
+        job._item = Item(id=1)
+        job.release_reserved_item()
+
+        mock_reservation_client.release.assert_not_called()
+
     def test_delete_item(self) -> None:
         item_id = 1
         item = Item(id=item_id)
@@ -116,3 +183,23 @@ class ReleaseReservedItemJobUnitTest(TestCase):
 
         mock_db_session.delete.assert_called_once_with(item)
         mock_db_session.commit.assert_called_once()
+
+
+class ReleaseReservationsJobUnitTest(TestCase):
+    def test_payload_rebuilds_the_job(self) -> None:
+        job = ReleaseReservationsJob(['reservation-1', 'reservation-2'])
+
+        self.assertEqual('reservations', job.queue_name)
+        self.assertEqual(
+            ['reservation-1', 'reservation-2'],
+            ReleaseReservationsJob.from_payload(job.payload()).reservation_identifiers
+        )
+
+    @patch('api.jobs.reservation_jobs.reservation_client', new_callable=StubReservationClient)
+    def test_handle_releases_the_reservations_in_one_request(self, mock_reservation_client) -> None:
+        mock_reservation_client.reservations.update({'reservation-1': (1, 1), 'reservation-2': (2, 1)})
+
+        ReleaseReservationsJob(['reservation-1', 'reservation-2']).handle()
+
+        self.assertEqual({}, mock_reservation_client.reservations)
+        self.assertEqual(1, mock_reservation_client.requests)
@@ -0,0 +1,21 @@
+from unittest import TestCase
+
+from api.jobs.retries import RetryPolicy
+
+
+class RetryPolicyUnitTest(TestCase):
+    def test_exhausted(self) -> None:
+        retry_policy = RetryPolicy(max_attempts=3)
+
+        self.assertFalse(retry_policy.exhausted(2))
+        self.assertTrue(retry_policy.exhausted(3))
+
+    def test_delay_doubles_up_to_the_maximum(self) -> None:
+        retry_policy = RetryPolicy(base_delay=1, max_delay=10, jitter=0)
+
+        self.assertEqual([1, 2, 4, 8, 10, 10], [retry_policy.delay(attempts) for attempts in range(1, 7)])
+
+    def test_delay_is_shaved_by_the_jitter(self) -> None:
+        self.assertEqual(4, RetryPolicy(base_delay=4, jitter=0.5, random=lambda: 0).delay(1))
+        self.assertEqual(2, RetryPolicy(base_delay=4, jitter=0.5, random=lambda: 1).delay(1))
+        self.assertEqual(3, RetryPolicy(base_delay=4, jitter=0.5, random=lambda: 0.5).delay(1))
@@ -0,0 +1,124 @@
+import json
+import signal
+from io import StringIO
+from unittest import TestCase
+from unittest.mock import MagicMock, patch
+
+import arrow
+from sqlalchemy import create_engine, StaticPool, insert, select, func
+
+from api.database.migrations import MIGRATIONS, Migrator
+from api.database.models import ShoppingCart, Item, QueuedJob
+from api.jobs.queue import JobQueue
+from api.jobs.reservation_jobs import ReleaseReservationsJob
+from api.jobs.sweeper import CartSweeper, main
+
+
+class CartSweeperUnitTest(TestCase):
+    def setUp(self) -> None:
+        self.engine = create_engine('sqlite://', poolclass=StaticPool, connect_args={'check_same_thread': False})
+        self.now = arrow.now()
+
+        with self.engine.begin() as connection:
+            Migrator(connection, MIGRATIONS).migrate()
+
+            # Carts 1 to 5 expired a minute apart, cart 6 is still live
+            connection.execute(insert(ShoppingCart), [
+                {'id': index, 'user_id': 1, 'expires_at': self.now.shift(minutes=index - 6).datetime}
+                for index in range(1, 7)
+            ])
+            connection.execute(insert(Item), [
+                {'shopping_cart_id': 1, 'product_id': 1, 'quantity': 1, 'reservation_identifier': 'reservation-1'},
+                {'shopping_cart_id': 1, 'product_id': 2, 'quantity': 1, 'reservation_identifier': None},
+                {'shopping_cart_id': 4, 'product_id': 1, 'quantity': 2, 'reservation_identifier': 'reservation-4'},
+                {'shopping_cart_id': 6, 'product_id': 1, 'quantity': 3, 'reservation_identifier': 'reservation-6'},
+            ])
+
+        self.sweeper = CartSweeper(self.engine, batch_size=2, job_queue=JobQueue(self.engine))
+
+    def remaining(self, model: type) -> list[int]:
+        column = model.id if model is ShoppingCart else model.shopping_cart_id
+
+        with self.engine.connect() as connection:
+            return connection.scalars(select(column).order_by(column)).all()
+
+    def test_sweep_deletes_the_expired_shopping_carts_and_their_items_in_batches(self) -> None:
+        self.assertEqual(5, self.sweeper.sweep(self.now.datetime))
+
+        self.assertEqual([6], self.remaining(ShoppingCart))
+        self.assertEqual([6], self.remaining(Item))
+
+    def queued_jobs(self) -> list[tuple[str, dict]]:
+        with self.engine.connect() as connection:
+            return [
+                (job_class, json.loads(payload))
+                for job_class, payload in connection.execute(
+                    select(QueuedJob.job_class, QueuedJob.payload).order_by(QueuedJob.id)
+                )
+            ]
+
+    def test_sweep_releases_the_reservations_of_each_batch_in_one_job(self) -> None:
+        self.sweeper.sweep(self.now.datetime)
+
+        self.assertEqual(
+            [
+                (ReleaseReservationsJob.class_path(), {'reservation_identifiers': ['reservation-1']}),
+                (ReleaseReservationsJob.class_path(), {'reservation_identifiers': ['reservation-4']}),
+            ],
+            self.queued_jobs()
+        )
+
+    def test_sweep_batch_takes_the_shopping_carts_that_expired_first(self) -> None:
+        self.assertEqual((2, 2), self.sweeper.sweep_batch(self.now.datetime))
+
+        self.assertEqual([3, 4, 5, 6], self.remaining(ShoppingCart))
+
+    def test_sweep_batch_keeps_shopping_carts_whose_expiry_was_bumped(self) -> None:
+        with self.engine.begin() as connection:
+            connection.execute(
+                ShoppingCart.__table__.update()
+                    .where(ShoppingCart.id == 1)
+                    .values(expires_at=self.now.shift(minutes=30).datetime)
+            )
+
+        self.assertEqual(4, self.sweeper.sweep(self.now.datetime))
+        self.assertEqual([1, 6], self.remaining(ShoppingCart))
+
+    def test_sweep_without_expired_shopping_carts(self) -> None:
+        self.assertEqual(0, self.sweeper.sweep(self.now.shift(hours=-1).datetime))
+
+        self.assertEqual([], self.queued_jobs())
+
+        with self.engine.connect() as connection:
+            self.assertEqual(6, connection.scalar(select(func.count()).select_from(ShoppingCart)))
+
+
+class SweeperMainUnitTest(TestCase):
+    @patch('api.jobs.sweeper.signal.signal')
+    @patch('sys.stdout', new_callable=StringIO)
+    def test_main_sweeps_once(self, mock_stdout, mock_signal) -> None:
+        sweeper = MagicMock()
+        sweeper.sweep = MagicMock(return_value=3)
+
+        main(['--once'], sweeper)
+
+        sweeper.sweep.assert_called_once()
+        self.assertEqual('Swept 3 expired shopping carts\n', mock_stdout.getvalue())
+
+    @patch('api.jobs.sweeper.signal.signal')
+    @patch('sys.stdout', new_callable=StringIO)
+    def test_main_sweeps_until_stopped(self, mock_stdout, mock_signal) -> None:
+        sweeper = MagicMock()
+
+        def sweep() -> int:
+            if sweeper.sweep.call_count == 2:
+                handlers = {call.args[0]: call.args[1] for call in mock_signal.call_args_list}
+                handlers[signal.SIGTERM](signal.SIGTERM, None)
+
+            return 0
+
+        sweeper.sweep = MagicMock(side_effect=sweep)
+
+        main(['--interval', '0.01'], sweeper)
+
+        self.assertEqual(2, sweeper.sweep.call_count)
@@ -0,0 +1,296 @@
+import threading
+import time
+from unittest import TestCase
+from unittest.mock import MagicMock, patch
+
+from sqlalchemy.exc import OperationalError
+
+from api.exceptions import JobLockedError
+from api.jobs.base_jobs import Job
+from api.jobs.queue import LeasedJob
+from api.jobs.retries import RetryPolicy
+from api.jobs.worker import Worker, execute_job
+
+
+class RecordingJob(Job):
+    retry_policy = RetryPolicy(max_attempts=3, base_delay=7, jitter=0)
+    handled: list = []
+
+    def __init__(self, value: int):
+        self.value = value
+
+    def payload(self) -> dict:
+        return {'value': self.value}
+
+    def handle(self) -> None:
+        if self.value == 0:
+            raise JobLockedError()
+
+        if self.value < 0:
+            raise ValueError(self.value)
+
+        self.handled.append(self.value)
+
+
+class GatedJob(RecordingJob):
+    started = threading.Event()
+    gate = threading.Event()
+
+    def handle(self) -> None:
+        self.started.set()
+        self.gate.wait(1)
+
+        super().handle()
+
+
+def leased(identifier: int, value: int, job_class: type = RecordingJob, attempts: int = 1) -> LeasedJob:
+    return LeasedJob(identifier, 'default', job_class.class_path(), {'value': value}, attempts, 0)
+
+
+class ExecuteJobUnitTest(TestCase):
+    def setUp(self) -> None:
+        RecordingJob.handled = []
+
+    def test_execute_job(self) -> None:
+        with patch.object(RecordingJob, 'before_start') as mock_before_start, \
+                patch.object(RecordingJob, 'after_finish') as mock_after_finish:
+            outcome = execute_job(RecordingJob.class_path(), {'value': 3}, 'owner')
+
+        mock_before_start.assert_called_once()
+        mock_after_finish.assert_called_once()
+        self.assertEqual([3], RecordingJob.handled)
+        self.assertIsNone(outcome.error)
+        self.assertLessEqual(outcome.started_at, outcome.finished_at)
+
+    def test_execute_job_finishes_failed_jobs(self) -> None:
+        with patch.object(RecordingJob, 'before_start'), \
+                patch.object(RecordingJob, 'after_finish') as mock_after_finish:
+            outcome = execute_job(RecordingJob.class_path(), {'value': -1})
+
+        mock_after_finish.assert_called_once()
+        self.assertIsInstance(outcome.error, ValueError)
+        self.assertIn('ValueError: -1', outcome.formatted_error)
+
+    def test_execute_job_does_not_finish_jobs_that_did_not_start(self) -> None:
+        with patch.object(RecordingJob, 'before_start', side_effect=JobLockedError()), \
+                patch.object(RecordingJob, 'after_finish') as mock_after_finish:
+            outcome = execute_job(RecordingJob.class_path(), {'value': 3})
+
+        mock_after_finish.assert_not_called()
+        self.assertEqual([], RecordingJob.handled)
+        self.assertIsInstance(outcome.error, JobLockedError)
+
+    def test_execute_job_of_unknown_class(self) -> None:
+        self.assertIsInstance(execute_job('api.jobs.missing.MissingJob', {}).error, ImportError)
+
+
+class WorkerUnitTest(TestCase):
+    def setUp(self) -> None:
+        RecordingJob.handled = []
+
+        self.job_queue = MagicMock()
+        self.job_metrics = MagicMock()
+        self.worker = Worker(
+            ['default', 'other'],
+            self.job_queue,
+            self.job_metrics,
+            concurrency=2,
+            prefetch=1,
+            locked_retry_delay=0.5
+        )
+
+        lock_manager_patcher = patch('api.jobs.base_jobs.lock_manager')
+        lock_manager_patcher.start().acquire.return_value = True
+        self.addCleanup(lock_manager_patcher.stop)
+
+    def tearDown(self) -> None:
+        self.worker.shutdown()
+
+    def test_lease_fills_the_batch_across_queues(self) -> None:
+        self.job_queue.lease = MagicMock(side_effect=[[leased(1, 1)], [leased(2, 2), leased(3, 3)]])
+
+        self.assertEqual(3, len(self.worker.lease(3)))
+        self.assertEqual(3, self.job_queue.lease.call_args_list[0].args[1])
+        self.assertEqual(2, self.job_queue.lease.call_args_list[1].args[1])
+
+    def test_run_once_completes_ran_jobs_and_releases_failed_ones(self) -> None:
+        self.job_queue.lease = MagicMock(side_effect=[[leased(1, 1), leased(2, -1), leased(3, 3)], []])
+
+        self.assertEqual(3, self.worker.run_once())
+
+        self.assertEqual([1, 3], sorted(RecordingJob.handled))
+        self.job_queue.complete.assert_called_once_with([1, 3], self.worker.owner)
+        self.job_queue.release.assert_called_once_with(2, self.worker.owner, 7)
+
+    def test_run_once_backs_off_exponentially(self) -> None:
+        self.job_queue.lease = MagicMock(side_effect=[[leased(1, -1, attempts=2)], []])
+
+        self.worker.run_once()
+
+        self.job_queue.release.assert_called_once_with(1, self.worker.owner, 14)
+
+    def test_run_once_buries_jobs_out_of_attempts(self) -> None:
+        self.job_queue.lease = MagicMock(side_effect=[[leased(1, -1, attempts=3)], []])
+
+        self.worker.run_once()
+
+        self.job_queue.release.assert_not_called()
+        self.job_queue.bury.assert_called_once()
+        self.assertEqual((1, self.worker.owner), self.job_queue.bury.call_args.args[:2])
+        self.assertIn('ValueError: -1', self.job_queue.bury.call_args.args[2])
+        self.job_metrics.inc.assert_any_call('jobs_dead_total', 'RecordingJob')
+
+    def test_retry_policy_of_unknown_job_classes_allows_no_retries(self) -> None:
+        leased_job = LeasedJob(1, 'default', 'api.jobs.missing.MissingJob', {}, 1, 0)
+
+        self.assertTrue(self.worker.retry_policy(leased_job).exhausted(1))
+        self.assertIs(RecordingJob.retry_policy, self.worker.retry_policy(leased(1, 1)))
+
+    def test_run_once_postpones_locked_jobs_without_counting_the_attempt(self) -> None:
+        self.job_queue.lease = MagicMock(side_effect=[[leased(1, 1), leased(2, 0)], []])
+
+        self.assertEqual(2, self.worker.run_once())
+
+        self.job_queue.complete.assert_called_once_with([1], self.worker.owner)
+        self.job_queue.release.assert_called_once_with(2, self.worker.owner, 0.5, count_attempt=False)
+
+    def test_run_once_completes_ran_jobs_before_releasing_the_others(self) -> None:
+        self.job_queue.lease = MagicMock(side_effect=[[leased(1, -1), leased(2, 0), leased(3, 3)], []])
+        self.job_queue.release = MagicMock(side_effect=OperationalError('UPDATE jobs', {}, Exception('locked')))
+
+        with self.assertLogs('api.jobs.worker', 'ERROR') as logs:
+            self.assertEqual(3, self.worker.run_once())
+
+        self.job_queue.complete.assert_called_once_with([3], self.worker.owner)
+        self.assertEqual([1, 2], sorted(call.args[0] for call in self.job_queue.release.call_args_list))
+        self.assertEqual(2, len([record for record in logs.records if record.msg.startswith('Failed to release')]))
+
+    def test_run_once_renews_the_leases_of_jobs_running_longer_than_them(self) -> None:
+        GatedJob.gate.clear()
+
+        self.worker.lease_seconds = 0.03
+        self.worker.poll_interval = 0.01
+        self.job_queue.lease = MagicMock(side_effect=[[leased(1, 1, GatedJob)], []])
+
+        timer = threading.Timer(0.1, GatedJob.gate.set)
+        timer.start()
+        self.worker.run_once()
+        timer.join()
+
+        self.assertGreaterEqual(self.job_queue.renew.call_count, 2)
+        self.job_queue.renew.assert_called_with([1], self.worker.owner, 0.03)
+
+    def test_renew_waits_for_a_third_of_the_lease(self) -> None:
+        self.worker._renewed_at = time.time()
+
+        self.worker.renew([leased(1, 1)])
+
+        self.job_queue.renew.assert_not_called()
+
+        self.worker._renewed_at -= self.worker.lease_seconds / 3
+
+        self.worker.renew([leased(1, 1)])
+
+        self.job_queue.renew.assert_called_once_with([1], self.worker.owner, self.worker.lease_seconds)
+
+    def test_run_once_records_metrics(self) -> None:
+        self.job_queue.lease = MagicMock(side_effect=[[leased(1, 1), leased(2, -1), leased(3, 0)], []])
+
+        self.worker.run_once()
+
+        self.assertEqual(
+            sorted([
+                ('jobs_succeeded_total', 'RecordingJob'),
+                ('jobs_failed_total', 'RecordingJob'),
+                ('jobs_retried_total', 'RecordingJob'),
+                ('jobs_postponed_total', 'RecordingJob'),
+            ]),
+            sorted(call.args for call in self.job_metrics.inc.call_args_list)
+        )
+        self.assertEqual(
+            ['job_run_seconds', 'job_run_seconds', 'job_wait_seconds', 'job_wait_seconds'],
+            sorted(call.args[0] for call in self.job_metrics.observe.call_args_list)
+        )
+        self.job_metrics.flush_if_due.assert_called_once()
+
+    def test_run_once_without_jobs(self) -> None:
+        self.job_queue.lease = MagicMock(return_value=[])
+
+        self.assertEqual(0, self.worker.run_once())
+        self.job_queue.complete.assert_not_called()
+
+    def test_run_until_stopped(self) -> None:
+        self.job_queue.lease = MagicMock(return_value=[])
+        self.worker.poll_interval = 0.01
+
+        thread = threading.Thread(target=self.worker.run)
+        thread.start()
+        self.worker.stop()
+        thread.join(1)
+
+        self.assertFalse(thread.is_alive())
+        self.assertIsNone(self.worker._executor)
+
+    def test_run_keeps_going_after_a_failed_pass(self) -> None:
+        def lease(queue: str, limit: int, owner: str, lease_seconds: float) -> list:
+            if self.job_queue.lease.call_count == 1:
+                raise OperationalError('UPDATE jobs', {}, Exception('database is locked'))
+
+            self.worker.stop()
+
+            return []
+
+        self.job_queue.lease = MagicMock(side_effect=lease)
+        self.worker.poll_interval = 0.01
+
+        with self.assertLogs('api.jobs.worker', 'ERROR'):
+            self.worker.run()
+
+        self.assertEqual(
+            ['default', 'default', 'other'],
+            [call.args[0] for call in self.job_queue.lease.call_args_list]
+        )
+        self.job_metrics.flush.assert_called_once()
+
+    def test_run_keeps_leasing_as_jobs_finish(self) -> None:
+        batches = [[leased(1, 1), leased(2, 2), leased(3, 3)], [leased(4, 4)]]
+
+        def lease(queue: str, limit: int, owner: str, lease_seconds: float) -> list:
+            return batches.pop(0) if batches and queue == 'default' else []
+
+        self.job_queue.lease = MagicMock(side_effect=lease)
+        self.job_queue.complete = MagicMock(side_effect=lambda job_ids, owner: 4 in job_ids and self.worker.stop())
+        self.worker.poll_interval = 0.01
+
+        self.worker.run()
+
+        self.job_metrics.flush.assert_called_once()
+        self.assertEqual([1, 2, 3, 4], sorted(RecordingJob.handled))
+        self.assertEqual(3, self.job_queue.lease.call_args_list[0].args[1])
+
+    def test_run_drains_running_jobs_and_releases_prefetched_ones_when_stopped(self) -> None:
+        GatedJob.started.clear()
+        GatedJob.gate.clear()
+
+        self.worker.concurrency = 1
+        self.worker.prefetch = 2
+        self.worker.poll_interval = 0.01
+        self.job_queue.lease = MagicMock(side_effect=[[leased(1, 1, GatedJob), leased(2, 2), leased(3, 3)]])
+        self.job_queue.release = MagicMock(side_effect=lambda *args, **kwargs: GatedJob.gate.set())
+
+        thread = threading.Thread(target=self.worker.run)
+        thread.start()
+        GatedJob.started.wait(1)
+        self.worker.stop()
+        thread.join(2)
+
+        self.assertFalse(thread.is_alive())
+        self.assertEqual([1], RecordingJob.handled)
+        self.assertEqual(
+            [[1]],
+            [call.args[0] for call in self.job_queue.complete.call_args_list if call.args[0]]
+        )
+        self.assertEqual(
+            [((2, self.worker.owner), {'count_attempt': False}), ((3, self.worker.owner), {'count_attempt': False})],
+            [(call.args, call.kwargs) for call in self.job_queue.release.call_args_list]
+        )
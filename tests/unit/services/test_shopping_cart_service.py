@@ -1,139 +1,190 @@
-from unittest import TestCase
-from unittest.mock import MagicMock, patch
+from unittest import IsolatedAsyncioTestCase
+from unittest.mock import MagicMock, AsyncMock, patch, ANY
 
 import arrow
 
-from api.database.models import User, ShoppingCart, Item
+from api.database.identity_map import IdentityMap
+from api.database.models import User, ShoppingCart, Item, Product
+from api.jobs.reservation_jobs import ReserveItemJob, ReleaseReservedItemJob
 from api.services.shopping_cart_service import ShoppingCartService
 
 
-class ShoppingCartServiceUnitTest(TestCase):
+def make_db_session() -> MagicMock:
+    db_session = MagicMock()
+    db_session.scalar = AsyncMock(return_value=None)
+    db_session.execute = AsyncMock(return_value=None)
+    db_session.delete = AsyncMock(return_value=None)
+    db_session.flush = AsyncMock(return_value=None)
+    db_session.commit = AsyncMock(return_value=None)
+    db_session.rollback = AsyncMock(return_value=None)
+    db_session.info = {}
+
+    return db_session
+
+
+class ShoppingCartServiceUnitTest(IsolatedAsyncioTestCase):
     def test_init(self) -> None:
-        db_session = MagicMock()
+        db_session = make_db_session()
         service = ShoppingCartService(db_session)
 
         self.assertEqual(db_session, service.db_session)
         self.assertIsNone(service._shopping_cart)
+        self.assertIsNone(service._deferred_jobs)
+
+    @patch('api.services.shopping_cart_service.outbox', new_callable=AsyncMock)
+    async def test_transaction_commits_once_along_with_the_jobs(self, mock_outbox) -> None:
+        db_session = make_db_session()
+        service = ShoppingCartService(db_session)
+        job = MagicMock()
+
+        db_session.commit = AsyncMock(side_effect=lambda: mock_outbox.add.assert_awaited_once_with(db_session, [job]))
+
+        async with service.transaction():
+            async with service.transaction():
+                service.defer(job)
+
+            db_session.commit.assert_not_awaited()
+            mock_outbox.add.assert_not_awaited()
+
+        db_session.commit.assert_awaited_once()
+        db_session.rollback.assert_not_awaited()
+        self.assertIsNone(service._deferred_jobs)
+
+    @patch('api.services.shopping_cart_service.outbox', new_callable=AsyncMock)
+    async def test_transaction_rolls_back_and_drops_jobs(self, mock_outbox) -> None:
+        db_session = make_db_session()
+        service = ShoppingCartService(db_session)
+
+        with self.assertRaises(ValueError):
+            async with service.transaction():
+                service.defer(MagicMock())
+
+                raise ValueError()
 
-    def test_shopping_cart_returns_preset(self) -> None:
-        db_session = MagicMock()
+        db_session.commit.assert_not_awaited()
+        db_session.rollback.assert_awaited_once()
+        mock_outbox.add.assert_not_awaited()
+        self.assertIsNone(service._deferred_jobs)
+
+    @patch('api.services.shopping_cart_service.outbox', new_callable=AsyncMock)
+    async def test_transaction_without_jobs_skips_the_outbox(self, mock_outbox) -> None:
+        db_session = make_db_session()
+
+        async with ShoppingCartService(db_session).transaction():
+            pass
+
+        db_session.commit.assert_awaited_once()
+        mock_outbox.add.assert_not_awaited()
+
+    async def test_get_shopping_cart_returns_preset(self) -> None:
+        db_session = make_db_session()
         shopping_cart = ShoppingCart(id=2)
 
         service = ShoppingCartService(db_session)
         service._shopping_cart = shopping_cart
 
-        self.assertEqual(shopping_cart, service.shopping_cart)
+        self.assertEqual(shopping_cart, await service.get_shopping_cart())
 
-    def test_shopping_cart_retrieves_existing(self) -> None:
+    async def test_get_shopping_cart_retrieves_existing(self) -> None:
         user = User(id=1)
         expires_at = arrow.now().shift(minutes=30)
 
-        db_session = MagicMock()
-
         shopping_cart = ShoppingCart(id=2, user=user, expires_at=expires_at)
 
-        service = ShoppingCartService(db_session)
+        service = ShoppingCartService(make_db_session())
         service.for_user(user)
 
+        mock_find_shopping_cart = AsyncMock(return_value=shopping_cart)
+        mock_create_shopping_cart = AsyncMock(return_value=None)
+
         with patch.multiple(
                 service,
-                new_expiry=MagicMock(return_value=expires_at),
-                find_shopping_cart=MagicMock(return_value=shopping_cart)
-        ) as mocks:
-            self.assertEqual(shopping_cart.user, service.shopping_cart.user)
-            self.assertEqual(shopping_cart.expires_at, service.shopping_cart.expires_at)
+                find_shopping_cart=mock_find_shopping_cart,
+                create_shopping_cart=mock_create_shopping_cart
+        ):
+            self.assertEqual(shopping_cart, await service.get_shopping_cart())
+            self.assertEqual(shopping_cart, await service.get_shopping_cart())
 
-        for mock in mocks:
-            mock.assert_called_once()
+        mock_find_shopping_cart.assert_awaited_once()
+        mock_create_shopping_cart.assert_not_awaited()
 
-    def test_shopping_cart_gets_created(self) -> None:
+    async def test_get_shopping_cart_gets_created(self) -> None:
         user = User(id=1)
         expires_at = arrow.now().shift(minutes=30)
 
-        db_session = MagicMock()
-
         shopping_cart = ShoppingCart(id=2, user=user, expires_at=expires_at)
 
-        service = ShoppingCartService(db_session)
+        service = ShoppingCartService(make_db_session())
         service.for_user(user)
 
+        mock_find_shopping_cart = AsyncMock(return_value=None)
+        mock_create_shopping_cart = AsyncMock(return_value=shopping_cart)
+
         with patch.multiple(
                 service,
-                new_expiry=MagicMock(return_value=expires_at),
-                find_shopping_cart=MagicMock(return_value=None),
-                create_shopping_cart=MagicMock(return_value=shopping_cart)
-        ) as mocks:
-            self.assertEqual(shopping_cart, service.shopping_cart)
+                find_shopping_cart=mock_find_shopping_cart,
+                create_shopping_cart=mock_create_shopping_cart
+        ):
+            self.assertEqual(shopping_cart, await service.get_shopping_cart())
 
-        for mock in mocks:
-            mock.assert_called_once()
+        mock_find_shopping_cart.assert_awaited_once()
+        mock_create_shopping_cart.assert_awaited_once()
 
-    def test_find_shopping_cart(self) -> None:
+    async def test_find_shopping_cart(self) -> None:
         user = User(id=1)
         expires_at = arrow.now().shift(minutes=30)
 
         shopping_cart = ShoppingCart(id=2, user=user, expires_at=expires_at)
 
-        db_session = MagicMock()
-        db_session.query = MagicMock(return_value=db_session)
-        db_session.filter = MagicMock(return_value=db_session)
-        db_session.first = MagicMock(return_value=shopping_cart)
+        db_session = make_db_session()
+        db_session.scalar = AsyncMock(return_value=shopping_cart)
 
         service = ShoppingCartService(db_session)
 
-        self.assertEqual(shopping_cart, service.for_user(user).find_shopping_cart())
+        self.assertEqual(shopping_cart, await service.for_user(user).find_shopping_cart())
+        db_session.scalar.assert_awaited_once()
 
-    def test_create_shopping_cart(self) -> None:
+    async def test_create_shopping_cart(self) -> None:
         user = User(id=1)
         expires_at = arrow.now().shift(minutes=30)
 
-        db_session = MagicMock()
-        db_session.add = MagicMock(return_value=db_session)
-        db_session.commit = MagicMock(return_value=None)
-        db_session.refresh = MagicMock(return_value=None)
+        db_session = make_db_session()
 
         shopping_cart = ShoppingCart(id=2, user=user, expires_at=expires_at)
 
         service = ShoppingCartService(db_session)
 
         with patch.object(service, 'new_expiry', return_value=expires_at) as mock_new_expiry:
-            actual_shopping_cart = service.for_user(user).create_shopping_cart()
+            actual_shopping_cart = await service.for_user(user).create_shopping_cart()
 
         mock_new_expiry.assert_called_once()
 
         self.assertEqual(shopping_cart.user, actual_shopping_cart.user)
         self.assertEqual(shopping_cart.expires_at, actual_shopping_cart.expires_at)
         db_session.add.assert_called_once()
-        db_session.commit.assert_called_once()
-        db_session.refresh.assert_called_once()
+        db_session.flush.assert_awaited_once()
+        db_session.commit.assert_awaited_once()
 
-    def test_delete_shopping_cart(self) -> None:
+    async def test_delete_shopping_cart(self) -> None:
         user = User(id=1)
-        db_session = MagicMock()
-        db_session.delete = MagicMock(return_value=db_session)
-        db_session.commit = MagicMock(return_value=None)
+        db_session = make_db_session()
 
         shopping_cart = ShoppingCart(id=2, user=user, expires_at=arrow.now().shift(minutes=30))
 
         service = ShoppingCartService(db_session)
         service._shopping_cart = shopping_cart
 
-        service.delete_shopping_cart()
+        await service.delete_shopping_cart()
 
         self.assertIsNone(service._shopping_cart)
-        db_session.delete.assert_called_once_with(shopping_cart)
-        db_session.commit.assert_called_once()
+        db_session.delete.assert_awaited_once_with(shopping_cart)
+        db_session.commit.assert_awaited_once()
 
-    def test_increase_expiry_shopping_cart(self) -> None:
+    async def test_increase_expiry_shopping_cart(self) -> None:
         user = User(id=1)
         expires_at = arrow.now().shift(minutes=30)
 
-        db_session = MagicMock()
-        db_session.query = MagicMock(return_value=db_session)
-        db_session.filter = MagicMock(return_value=db_session)
-        db_session.update = MagicMock(return_value=None)
-        db_session.commit = MagicMock(return_value=None)
-        db_session.refresh = MagicMock(return_value=None)
+        db_session = make_db_session()
 
         shopping_cart = ShoppingCart(id=2, user=user, expires_at=expires_at)
 
@@ -141,144 +192,193 @@ class ShoppingCartServiceUnitTest(TestCase):
         service._shopping_cart = shopping_cart
 
         with patch.object(service, 'new_expiry', return_value=expires_at) as mock_new_expiry:
-            service.increase_expiry_of_shopping_cart()
+            await service.increase_expiry_of_shopping_cart()
 
         mock_new_expiry.assert_called_once()
 
-        db_session.query.assert_called_once_with(ShoppingCart)
-        db_session.filter.assert_called_once()
-        db_session.update.assert_called_once_with({
-            ShoppingCart.expires_at: expires_at
-        })
-        db_session.commit.assert_called_once()
-        db_session.refresh.assert_called_once()
+        db_session.execute.assert_awaited_once()
+        self.assertIn('UPDATE shopping_carts', str(db_session.execute.call_args.args[0]))
+        db_session.commit.assert_awaited_once()
 
-    def test_add_item_updates_existing(self) -> None:
-        product_id = 2
-        quantity = 2
-        user = User(id=1)
+    async def test_get_product_reuses_the_identity_map(self) -> None:
+        product = Product(id=2, name='Monitor')
+        db_session = make_db_session()
+        IdentityMap.of(db_session).add(product)
 
-        expires_at = arrow.now().shift(minutes=30)
+        service = ShoppingCartService(db_session)
 
-        shopping_cart = ShoppingCart(id=2, user=user, expires_at=expires_at)
-        item = Item(id=1, shopping_cart=shopping_cart, product_id=product_id, quantity=1)
+        with patch('api.services.shopping_cart_service.product_cache.fetch', AsyncMock()) as mock_fetch:
+            self.assertEqual(product, await service.get_product(2))
 
-        db_session = MagicMock()
-        db_session.query = MagicMock(return_value=db_session)
-        db_session.filter = MagicMock(return_value=db_session)
-        db_session.first = MagicMock(return_value=item)
+        mock_fetch.assert_not_awaited()
+
+    async def test_get_product_reads_through_the_product_cache(self) -> None:
+        product = Product(id=2, name='Monitor')
+        db_session = make_db_session()
 
         service = ShoppingCartService(db_session)
-        service._shopping_cart = shopping_cart
 
-        with patch.object(service, 'update_quantity', return_value=item) as mock_uq:
-            self.assertEqual(item, service.for_user(user).add_item(product_id, quantity))
+        with patch(
+                'api.services.shopping_cart_service.product_cache.fetch',
+                AsyncMock(return_value=product)
+        ) as mock_fetch:
+            self.assertEqual(product, await service.get_product(2))
 
-        mock_uq.assert_called_once()
+        mock_fetch.assert_awaited_once_with(db_session, 'id', 2)
 
-        db_session.query.assert_called_once_with(Item)
-        self.assertEqual(2, db_session.filter.call_count)
-        db_session.first.assert_called_once()
+    async def test_upsert_items(self) -> None:
+        shopping_cart = ShoppingCart(id=2)
+        item = Item(id=1, shopping_cart_id=2, product_id=3, quantity=4)
 
-    @patch('api.services.shopping_cart_service.ReserveItemJob.queue')
-    def test_add_item(self, mock_queue) -> None:
+        db_session = make_db_session()
+        db_session.scalars = AsyncMock(return_value=[item])
+
+        service = ShoppingCartService(db_session)
+
+        self.assertEqual({3: item}, await service.upsert_items(shopping_cart, {3: 4}))
+
+        statement = str(db_session.scalars.call_args.args[0])
+        self.assertIn('INSERT INTO items', statement)
+        self.assertIn(
+            'ON CONFLICT (shopping_cart_id, product_id) DO UPDATE SET quantity = (items.quantity + excluded.quantity)',
+            statement
+        )
+        self.assertIn('RETURNING', statement)
+
+    @patch('api.services.shopping_cart_service.outbox', new_callable=AsyncMock)
+    async def test_add_item(self, mock_outbox) -> None:
         product_id = 2
         quantity = 2
         user = User(id=1)
 
         expires_at = arrow.now().shift(minutes=30)
 
-        db_session = MagicMock()
-        db_session.query = MagicMock(return_value=db_session)
-        db_session.filter = MagicMock(return_value=db_session)
-        db_session.first = MagicMock(return_value=None)
-        db_session.add = MagicMock(return_value=db_session)
-        db_session.commit = MagicMock(return_value=None)
-        db_session.refresh = MagicMock(return_value=None)
+        db_session = make_db_session()
 
         shopping_cart = ShoppingCart(id=2, user=user, expires_at=expires_at)
+        upserted_item = Item(id=1, shopping_cart_id=shopping_cart.id, product_id=product_id, quantity=3)
 
         service = ShoppingCartService(db_session)
         service._shopping_cart = shopping_cart
 
+        product = Product(id=product_id)
+
+        mock_increase_expiry = AsyncMock(return_value=None)
+        mock_get_product = AsyncMock(return_value=product)
+        mock_upsert_items = AsyncMock(return_value={product_id: upserted_item})
+
         with patch.multiple(
                 service,
-                increase_expiry_of_shopping_cart=MagicMock(return_value=None),
-                new_expiry=MagicMock(return_value=expires_at)
-        ) as mocks:
-            self.assertIsInstance(service.for_user(user).add_item(product_id, quantity), Item)
+                increase_expiry_of_shopping_cart=mock_increase_expiry,
+                get_product=mock_get_product,
+                upsert_items=mock_upsert_items
+        ):
+            item = await service.for_user(user).add_item(product_id, quantity)
 
-        for mock in mocks:
-            mock.assert_called_once()
+        self.assertEqual(upserted_item, item)
+        self.assertEqual(product, item.product)
 
-        db_session.query.assert_called_once_with(Item)
-        self.assertEqual(2, db_session.filter.call_count)
-        db_session.first.assert_called_once()
-        db_session.add.assert_called_once()
-        db_session.commit.assert_called_once()
-        db_session.refresh.assert_called_once()
+        mock_increase_expiry.assert_awaited_once()
+        mock_get_product.assert_awaited_once_with(product_id)
+        mock_upsert_items.assert_awaited_once_with(shopping_cart, {product_id: quantity})
+
+        db_session.commit.assert_awaited_once()
+
+        mock_outbox.add.assert_awaited_once_with(db_session, ANY)
+        self.assertEqual(1, len(mock_outbox.add.call_args.args[1]))
+        self.assertIsInstance(mock_outbox.add.call_args.args[1][0], ReserveItemJob)
+
+    @patch('api.services.shopping_cart_service.outbox', new_callable=AsyncMock)
+    async def test_add_items(self, mock_outbox) -> None:
+        user = User(id=1)
+        computer = Product(id=1, name='Computer')
+        monitor = Product(id=2, name='Monitor')
 
-        mock_queue.assert_called_once()
+        shopping_cart = ShoppingCart(id=2, user=user, expires_at=arrow.now().shift(minutes=30))
+        computer_item = Item(id=1, shopping_cart_id=shopping_cart.id, product_id=computer.id, quantity=3)
+        monitor_item = Item(id=2, shopping_cart_id=shopping_cart.id, product_id=monitor.id, quantity=4)
+
+        db_session = make_db_session()
+        IdentityMap.of(db_session).add(computer)
+
+        service = ShoppingCartService(db_session)
+        service._shopping_cart = shopping_cart
 
-    @patch('api.services.shopping_cart_service.ReserveItemJob.queue')
-    def test_update_quantity(self, mock_queue) -> None:
+        with (
+            patch(
+                'api.services.shopping_cart_service.product_cache.fetch_many',
+                AsyncMock(return_value=[monitor])
+            ) as mock_fetch_many,
+            patch.object(
+                service,
+                'upsert_items',
+                AsyncMock(return_value={monitor.id: monitor_item, computer.id: computer_item})
+            ) as mock_upsert_items
+        ):
+            items = await service.for_user(user).add_items([(1, 2), (2, 1), (2, 3), (1, 1)])
+
+        self.assertEqual([computer_item, monitor_item], items)
+        self.assertEqual(computer, items[0].product)
+        self.assertEqual(monitor, items[1].product)
+
+        mock_fetch_many.assert_awaited_once_with(db_session, {'id': {2}})
+        mock_upsert_items.assert_awaited_once_with(shopping_cart, {1: 3, 2: 4})
+        db_session.execute.assert_awaited_once()
+        self.assertIn('UPDATE shopping_carts', str(db_session.execute.call_args.args[0]))
+        db_session.commit.assert_awaited_once()
+
+        mock_outbox.add.assert_awaited_once_with(db_session, ANY)
+        self.assertEqual(2, len(mock_outbox.add.call_args.args[1]))
+
+    @patch('api.services.shopping_cart_service.outbox', new_callable=AsyncMock)
+    async def test_update_quantity(self, mock_outbox) -> None:
         product_id = 2
         quantity = 2
         user = User(id=1)
         item = Item(id=2, product_id=product_id, quantity=1)
 
-        db_session = MagicMock()
-        db_session.query = MagicMock(return_value=db_session)
-        db_session.filter = MagicMock(return_value=db_session)
-        db_session.update = MagicMock(return_value=db_session)
-        db_session.commit = MagicMock(return_value=None)
-        db_session.refresh = MagicMock(return_value=None)
+        db_session = make_db_session()
 
         shopping_cart = ShoppingCart(id=2, user=user, expires_at=arrow.now().shift(minutes=30))
 
         service = ShoppingCartService(db_session)
         service._shopping_cart = shopping_cart
 
-        with patch.object(service, 'increase_expiry_of_shopping_cart', return_value=None) as mock_ieosc:
-            self.assertIsInstance(service.update_quantity(item, quantity), Item)
+        with patch.object(service, 'increase_expiry_of_shopping_cart', AsyncMock(return_value=None)) as mock_ieosc:
+            self.assertIsInstance(await service.update_quantity(item, quantity), Item)
 
-        mock_ieosc.assert_called_once()
+        mock_ieosc.assert_awaited_once()
 
-        db_session.query.assert_called_once_with(Item)
-        db_session.filter.assert_called_once()
-        db_session.update.assert_called_once_with({Item.quantity: quantity})
-        db_session.commit.assert_called_once()
-        db_session.refresh.assert_called_once()
+        db_session.execute.assert_awaited_once()
+        self.assertIn('UPDATE items SET quantity', str(db_session.execute.call_args.args[0]))
+        db_session.commit.assert_awaited_once()
 
-        mock_queue.assert_called_once()
+        mock_outbox.add.assert_awaited_once_with(db_session, ANY)
+        self.assertEqual(1, len(mock_outbox.add.call_args.args[1]))
+        self.assertIsInstance(mock_outbox.add.call_args.args[1][0], ReserveItemJob)
 
-    @patch('api.services.shopping_cart_service.ReleaseReservedItemJob.queue')
-    def test_remove_item(self, mock_queue) -> None:
+    @patch('api.services.shopping_cart_service.outbox', new_callable=AsyncMock)
+    async def test_remove_item(self, mock_outbox) -> None:
         product_id = 2
         user = User(id=1)
         item = Item(id=2, product_id=product_id, quantity=1)
 
-        db_session = MagicMock()
-        db_session.query = MagicMock(return_value=db_session)
-        db_session.filter = MagicMock(return_value=db_session)
-        db_session.update = MagicMock(return_value=db_session)
-        db_session.commit = MagicMock(return_value=None)
-        db_session.refresh = MagicMock(return_value=None)
+        db_session = make_db_session()
 
         shopping_cart = ShoppingCart(id=2, user=user, expires_at=arrow.now().shift(minutes=30))
 
         service = ShoppingCartService(db_session)
         service._shopping_cart = shopping_cart
 
-        with patch.object(service, 'increase_expiry_of_shopping_cart', return_value=None) as mock_ieosc:
-            service.remove_item(item)
+        with patch.object(service, 'increase_expiry_of_shopping_cart', AsyncMock(return_value=None)) as mock_ieosc:
+            await service.remove_item(item)
 
-        mock_ieosc.assert_called_once()
+        mock_ieosc.assert_awaited_once()
 
-        db_session.query.assert_called_once_with(Item)
-        db_session.filter.assert_called_once()
-        db_session.update.assert_called_once_with({Item.quantity: 0})
-        db_session.commit.assert_called_once()
-        db_session.refresh.assert_called_once()
+        db_session.execute.assert_awaited_once()
+        self.assertIn('UPDATE items SET quantity', str(db_session.execute.call_args.args[0]))
+        db_session.commit.assert_awaited_once()
 
-        mock_queue.assert_called_once()
+        mock_outbox.add.assert_awaited_once_with(db_session, ANY)
+        self.assertEqual(1, len(mock_outbox.add.call_args.args[1]))
+        self.assertIsInstance(mock_outbox.add.call_args.args[1][0], ReleaseReservedItemJob)
@@ -1,6 +1,7 @@
 from unittest import TestCase
 
-from api.exceptions import ObjectNotFoundError, RequestValidationError, NullableValidationError, UnauthorizedError
+from api.exceptions import ObjectNotFoundError, RequestValidationError, UnauthorizedError, \
+    StatementBudgetExceededError
 
 
 class ObjectNotFoundErrorUnitTest(TestCase):
@@ -24,8 +25,9 @@ class RequestValidationErrorUnitTest(TestCase):
         self.assertIsInstance(exception, ValueError)
 
 
-class NullableValidationErrorUnitTest(TestCase):
+class StatementBudgetExceededErrorUnitTest(TestCase):
     def test_init(self) -> None:
-        exception = NullableValidationError()
+        exception = StatementBudgetExceededError('message')
 
-        self.assertIsInstance(exception, ValueError)
+        self.assertIsInstance(exception, AssertionError)
+        self.assertEqual('message', exception.message)
@@ -0,0 +1,51 @@
+from unittest import IsolatedAsyncioTestCase
+
+from api.metrics import MetricsRegistry, Counter
+
+
+class CounterUnitTest(IsolatedAsyncioTestCase):
+    def test_inc(self) -> None:
+        counter = Counter('hits_total', 'Hits.')
+        counter.inc()
+        counter.inc(2)
+
+        self.assertEqual(3, counter.value)
+
+    def test_render(self) -> None:
+        counter = Counter('hits_total', 'Hits.')
+        counter.inc()
+
+        self.assertEqual('# HELP hits_total Hits.\n# TYPE hits_total counter\nhits_total 1\n', counter.render())
+
+
+class MetricsRegistryUnitTest(IsolatedAsyncioTestCase):
+    def test_counter_is_registered_once(self) -> None:
+        registry = MetricsRegistry()
+
+        self.assertIs(registry.counter('hits_total', 'Hits.'), registry.counter('hits_total', 'Hits.'))
+
+    def test_endpoint_renders_every_metric(self) -> None:
+        registry = MetricsRegistry()
+        registry.counter('hits_total', 'Hits.').inc()
+        registry.counter('misses_total', 'Misses.')
+
+        rendered = registry.endpoint()
+
+        self.assertIn('hits_total 1\n', rendered)
+        self.assertIn('misses_total 0\n', rendered)
+
+    def test_render_runs_the_collectors(self) -> None:
+        registry = MetricsRegistry()
+        registry.counter('hits_total', 'Hits.').inc()
+
+        collector = lambda: 'depth 3\n'
+        registry.collector(collector)
+        registry.collector(collector)
+
+        self.assertTrue(registry.render().endswith('hits_total 1\ndepth 3\n'))
+        self.assertEqual(1, registry.render().count('depth 3'))
+
+    def test_router(self) -> None:
+        router = MetricsRegistry().router()
+
+        self.assertEqual(['/metrics'], [route.path for route in router.routes])
@@ -1,10 +1,10 @@
 from datetime import datetime
 from unittest import TestCase
 
-from pydantic import BaseModel
+from pydantic import BaseModel, ValidationError
 
 from api.schemas import ItemBaseSchema, UserSchema, ProductSchema, ShoppingCartSchema, ItemCreateSchema, \
-    ItemPartialUpdateSchema, ItemSchema
+    ItemPartialUpdateSchema, ItemSchema, ItemPageSchema, ItemBulkCreateSchema
 
 
 class UserUnitTest(TestCase):
@@ -75,6 +75,25 @@ class ItemCreateUnitTest(TestCase):
         self.assertEqual(quantity, schema.quantity)
 
 
+class ItemBulkCreateUnitTest(TestCase):
+    def test_init(self) -> None:
+        schema = ItemBulkCreateSchema(items=[{'product_id': 1}, {'product_name': 'Monitor', 'quantity': 2}])
+
+        self.assertIsInstance(schema, ItemBaseSchema)
+        self.assertEqual(1, schema.items[0].product_id)
+        self.assertEqual(1, schema.items[0].quantity)
+        self.assertEqual('Monitor', schema.items[1].product_name)
+        self.assertEqual(2, schema.items[1].quantity)
+
+    def test_init_requires_items(self) -> None:
+        with self.assertRaises(ValidationError):
+            ItemBulkCreateSchema(items=[])
+
+    def test_init_limits_items(self) -> None:
+        with self.assertRaises(ValidationError):
+            ItemBulkCreateSchema(items=[{'product_id': 1}] * 101)
+
+
 class ItemUpdateUnitTest(TestCase):
     def test_init(self) -> None:
         quantity = 13
@@ -105,3 +124,23 @@ class ItemUnitTest(TestCase):
         self.assertEqual(product, schema.product)
         self.assertEqual(quantity, schema.quantity)
         self.assertEqual(reservation_identifier, schema.reservation_identifier)
+
+
+class ItemPageUnitTest(TestCase):
+    def test_init(self) -> None:
+        item = ItemSchema(
+            id=1,
+            shopping_cart_id=2,
+            product=ProductSchema(id=3, name='Computer', price=123.45),
+            quantity=13
+        )
+
+        schema = ItemPageSchema(items=[item], next_after=item.id)
+        self.assertIsInstance(schema, BaseModel)
+        self.assertEqual([item], schema.items)
+        self.assertEqual(item.id, schema.next_after)
+
+    def test_init_last_page(self) -> None:
+        schema = ItemPageSchema(items=[])
+        self.assertEqual([], schema.items)
+        self.assertIsNone(schema.next_after)
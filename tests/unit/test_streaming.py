@@ -0,0 +1,59 @@
+import json
+from unittest import IsolatedAsyncioTestCase, TestCase
+
+from pydantic import BaseModel
+
+from api.streaming import StreamFormat, encode_stream
+
+
+class StreamTestSchema(BaseModel):
+    id: int
+
+    class Config:
+        from_attributes = True
+
+
+class StreamTestRow:
+    def __init__(self, identifier: int):
+        self.id = identifier
+
+
+async def partitions(*partition_sizes: int):
+    identifier = 0
+
+    for size in partition_sizes:
+        rows = []
+
+        for _ in range(size):
+            identifier += 1
+            rows.append(StreamTestRow(identifier))
+
+        yield rows
+
+
+class StreamFormatUnitTest(TestCase):
+    def test_media_type(self) -> None:
+        self.assertEqual('application/x-ndjson', StreamFormat.NDJSON.media_type)
+        self.assertEqual('application/json', StreamFormat.JSON.media_type)
+
+
+class EncodeStreamUnitTest(IsolatedAsyncioTestCase):
+    async def test_encodes_ndjson(self) -> None:
+        chunks = [chunk async for chunk in encode_stream(partitions(2, 0, 1), StreamTestSchema, StreamFormat.NDJSON)]
+
+        self.assertEqual(2, len(chunks))
+        self.assertEqual(
+            [{'id': 1}, {'id': 2}, {'id': 3}],
+            [json.loads(line) for line in b''.join(chunks).decode().splitlines()]
+        )
+
+    async def test_encodes_json_array(self) -> None:
+        chunks = [chunk async for chunk in encode_stream(partitions(2, 0, 1), StreamTestSchema, StreamFormat.JSON)]
+
+        self.assertEqual(4, len(chunks))
+        self.assertEqual([{'id': 1}, {'id': 2}, {'id': 3}], json.loads(b''.join(chunks)))
+
+    async def test_encodes_empty_json_array(self) -> None:
+        chunks = [chunk async for chunk in encode_stream(partitions(), StreamTestSchema, StreamFormat.JSON)]
+
+        self.assertEqual([], json.loads(b''.join(chunks)))
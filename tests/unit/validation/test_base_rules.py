@@ -1,14 +1,17 @@
 from __future__ import annotations
 
-from unittest import TestCase
-from unittest.mock import patch, MagicMock, call
+from typing import Annotated, Optional
+from unittest import TestCase, IsolatedAsyncioTestCase
+from unittest.mock import patch, MagicMock
 
+from annotated_types import Ge
 from pydantic import BaseModel
 
+from api.database.identity_map import IdentityMap
 from api.database.models import Product
-from api.exceptions import RequestValidationError, NullableValidationError
+from api.exceptions import RequestValidationError
 from api.validation.base_rules import Rule, RequiredRule, RequiredIfRule, NullableRule, IntegerRule, StringRule, \
-    ExistsInRule, GreaterThanRule
+    ExistsInRule, GreaterThanRule, ValidationContext, FieldConstraints, RuleCost, AsyncRule
 
 
 class RuleTestSchema(BaseModel):
@@ -16,27 +19,130 @@ class RuleTestSchema(BaseModel):
     integer: int = 1
 
 
+def make_context(identity_map: IdentityMap | None = None, **values) -> ValidationContext:
+    return ValidationContext(RuleTestSchema(**values), identity_map or IdentityMap())
+
+
+class ValidationContextUnitTest(TestCase):
+    def test_init(self) -> None:
+        schema = RuleTestSchema()
+        identity_map = IdentityMap()
+        context = ValidationContext(schema, identity_map)
+
+        self.assertEqual(schema, context.schema)
+        self.assertEqual(identity_map, context.identity_map)
+        self.assertIsNone(context.db_session)
+
+    def test_init_with_db_session(self) -> None:
+        db_session = MagicMock()
+
+        self.assertEqual(db_session, ValidationContext(RuleTestSchema(), IdentityMap(), db_session).db_session)
+
+
+class FieldConstraintsUnitTest(TestCase):
+    def test_annotation_keeps_the_type_of_the_field(self) -> None:
+        self.assertEqual(list[int], FieldConstraints().annotation(list[int]))
+
+    def test_annotation_drops_null_from_the_type_of_the_field(self) -> None:
+        self.assertEqual(int, FieldConstraints().annotation(int | None))
+        self.assertEqual(int | str, FieldConstraints().annotation(int | str | None))
+
+    def test_annotation_of_a_constrained_field(self) -> None:
+        field = FieldConstraints()
+        field.type = int
+        field.nullable = True
+        field.metadata.append(Ge(0))
+
+        self.assertEqual(Optional[Annotated[int, Ge(0)]], field.annotation(str))
+
+
 class RuleUnitTest(TestCase):
-    def test_value(self) -> None:
-        value = 'Mitko'
+    def test_validate_raises_not_implemented_error(self) -> None:
+        rule = Rule()
+
+        with self.assertRaises(NotImplementedError):
+            rule.validate('Mitko', make_context())
 
+    def test_constrain_does_not_constrain_the_field(self) -> None:
         rule = Rule()
-        rule.path = 'name'
-        rule.schema = RuleTestSchema(name=value)
 
-        self.assertEqual(value, rule.value)
+        self.assertEqual(RuleCost.MEMORY, rule.cost)
+        self.assertFalse(rule.constrain(FieldConstraints()))
 
-    def test_validate_raises_not_implemented_error(self) -> None:
+    def test_validate_column_validates_every_value(self) -> None:
         rule = Rule()
+        rule_contexts = [make_context(), make_context()]
+
+        with patch.object(Rule, 'validate', side_effect=[True, False]) as mock_validate:
+            self.assertEqual([True, False], rule.validate_column(['Mitko', None], rule_contexts))
+
+        self.assertEqual(
+            [('Mitko', rule_contexts[0]), (None, rule_contexts[1])],
+            [call.args for call in mock_validate.call_args_list]
+        )
 
+    def test_message_raises_not_implemented_error(self) -> None:
         with self.assertRaises(NotImplementedError):
-            rule.validate()
+            Rule().message('name')
 
     def test_fail_raises_not_implemented_error(self) -> None:
         rule = Rule()
 
         with self.assertRaises(NotImplementedError):
-            rule.fail()
+            rule.fail('name')
+
+    def test_validate_column_matches_validate(self) -> None:
+        identity_map = IdentityMap()
+        identity_map.add(Product(id=2))
+        identity_map.add_missing(Product, 'id', 3)
+
+        values = [None, 'Mitko', 2, 3, -1, True]
+        rule_contexts = [make_context(identity_map, name=name) for name in (None, 'Mitko', None, 'Mitko', None, None)]
+
+        for rule in (RequiredRule(), RequiredIfRule('name'), NullableRule(), IntegerRule(), StringRule(),
+                     ExistsInRule(Product), GreaterThanRule(0)):
+            checked = [(value, context) for value, context in zip(values, rule_contexts)]
+
+            if isinstance(rule, GreaterThanRule):
+                checked = [(value, context) for value, context in checked if type(value) is int]
+
+            self.assertEqual(
+                [rule.validate(value, context) for value, context in checked],
+                rule.validate_column([value for value, context in checked], [context for value, context in checked]),
+                type(rule).__name__
+            )
+
+    def test_rules_hold_no_state(self) -> None:
+        for rule in (RequiredRule(), RequiredIfRule('name'), NullableRule(), IntegerRule(), StringRule(),
+                     ExistsInRule(Product), GreaterThanRule(0), AsyncRule()):
+            self.assertFalse(hasattr(rule, '__dict__'), type(rule).__name__)
+
+            with self.assertRaises(AttributeError):
+                rule.path = 'name'
+
+
+class AsyncRuleUnitTest(IsolatedAsyncioTestCase):
+    def test_init(self) -> None:
+        rule = AsyncRule()
+
+        self.assertIsInstance(rule, Rule)
+        self.assertEqual(RuleCost.DATABASE, rule.cost)
+        self.assertFalse(rule.constrain(FieldConstraints()))
+
+    async def test_validate_raises_not_implemented_error(self) -> None:
+        with self.assertRaises(NotImplementedError):
+            await AsyncRule().validate('Mitko', make_context())
+
+    async def test_validate_column_awaits_every_value(self) -> None:
+        rule_contexts = [make_context(), make_context()]
+
+        with patch.object(AsyncRule, 'validate', side_effect=[True, False]) as mock_validate:
+            self.assertEqual([True, False], await AsyncRule().validate_column(['Mitko', None], rule_contexts))
+
+        self.assertEqual(
+            [('Mitko', rule_contexts[0]), (None, rule_contexts[1])],
+            [call.args for call in mock_validate.call_args_list]
+        )
 
 
 class RequiredRuleUnitTest(TestCase):
@@ -44,70 +150,61 @@ class RequiredRuleUnitTest(TestCase):
         rule = RequiredRule()
 
         self.assertIsInstance(rule, Rule)
+        self.assertFalse(rule.stops)
 
-    def test_validate_passes(self) -> None:
-        rule = RequiredRule()
-        rule.path = 'name'
-        rule.schema = RuleTestSchema()
+    def test_constrain(self) -> None:
+        field = FieldConstraints()
 
-        self.assertTrue(rule.validate())
+        self.assertEqual(RuleCost.SCHEMA, RequiredRule.cost)
+        self.assertTrue(RequiredRule().constrain(field))
+        self.assertTrue(field.required)
 
-    def test_validate_raises_request_validation_error(self) -> None:
-        rule = RequiredRule()
-        rule.path = 'name'
-        rule.schema = RuleTestSchema(name=None)
+    def test_validate_passes(self) -> None:
+        self.assertTrue(RequiredRule().validate('Mitko', make_context()))
 
-        with self.assertRaises(RequestValidationError):
-            rule.validate()
+    def test_validate_fails(self) -> None:
+        self.assertFalse(RequiredRule().validate(None, make_context()))
 
     def test_fail_raises_request_validation_error(self) -> None:
         path = 'name'
 
-        rule = RequiredRule()
-        rule.path = path
-
         with self.assertRaises(RequestValidationError) as mock_e:
-            rule.fail()
+            RequiredRule().fail(path)
 
         self.assertEqual(f'A value for "{path}" is required.', mock_e.exception.message)
 
 
 class RequiredIfRuleUnitTest(TestCase):
     def test_init(self) -> None:
-        rule = RequiredIfRule(True)
+        rule = RequiredIfRule('name')
 
         self.assertIsInstance(rule, RequiredRule)
+        self.assertEqual('name', rule.other_path)
+        self.assertIsNone(rule.other_value)
 
-    def test_validate_passes(self) -> None:
-        rule = RequiredIfRule(True)
-        rule.path = 'name'
-        rule.schema = RuleTestSchema()
+    def test_constrain_leaves_the_rule_to_the_model(self) -> None:
+        field = FieldConstraints()
 
-        self.assertTrue(rule.validate())
+        self.assertEqual(RuleCost.SCHEMA, RequiredIfRule.cost)
+        self.assertFalse(RequiredIfRule('name').constrain(field))
+        self.assertFalse(field.required)
 
-    def test_validate_passes_when_condition_is_false(self) -> None:
-        rule = RequiredIfRule(False)
-        rule.path = 'name'
-        rule.schema = RuleTestSchema(name=None)
-
-        self.assertTrue(rule.validate())
+    def test_validate_passes(self) -> None:
+        self.assertTrue(RequiredIfRule('name').validate(1, make_context(name=None)))
 
-    def test_validate_raises_request_validation_error(self) -> None:
-        rule = RequiredIfRule(True)
-        rule.path = 'name'
-        rule.schema = RuleTestSchema(name=None)
+    def test_validate_passes_when_condition_is_false(self) -> None:
+        self.assertTrue(RequiredIfRule('name').validate(None, make_context(name='Mitko')))
+        self.assertTrue(RequiredIfRule('integer', 2).validate(None, make_context(integer=1)))
 
-        with self.assertRaises(RequestValidationError):
-            rule.validate()
+    def test_validate_fails(self) -> None:
+        self.assertFalse(RequiredIfRule('name').validate(None, make_context(name=None)))
+        self.assertFalse(RequiredIfRule('integer', 2).validate(None, make_context(integer=2)))
 
     def test_fail_raises_request_validation_error(self) -> None:
         path = 'name'
 
-        rule = RequiredIfRule(True)
-        rule.path = path
-
         with self.assertRaises(RequestValidationError) as mock_e:
-            rule.fail()
+            RequiredIfRule('integer').fail(path)
 
         self.assertEqual(f'A value for "{path}" is required.', mock_e.exception.message)
 
@@ -117,21 +214,22 @@ class NullableRuleUnitTest(TestCase):
         rule = NullableRule()
 
         self.assertIsInstance(rule, Rule)
+        self.assertTrue(rule.stops)
 
-    def test_validate_passes(self) -> None:
-        rule = NullableRule()
-        rule.path = 'name'
-        rule.schema = RuleTestSchema()
+    def test_constrain(self) -> None:
+        field = FieldConstraints()
 
-        self.assertTrue(rule.validate())
+        self.assertTrue(NullableRule().constrain(field))
+        self.assertTrue(field.nullable)
 
-    def test_validate_raises_nullable_validation_error(self) -> None:
-        rule = NullableRule()
-        rule.path = 'name'
-        rule.schema = RuleTestSchema(name=None)
+    def test_validate_passes(self) -> None:
+        self.assertTrue(NullableRule().validate('Mitko', make_context()))
 
-        with self.assertRaises(NullableValidationError):
-            rule.validate()
+    def test_validate_stops_on_null(self) -> None:
+        self.assertFalse(NullableRule().validate(None, make_context()))
+
+    def test_fail_does_not_raise(self) -> None:
+        NullableRule().fail('name')
 
 
 class IntegerRuleUnitTest(TestCase):
@@ -140,29 +238,24 @@ class IntegerRuleUnitTest(TestCase):
 
         self.assertIsInstance(rule, Rule)
 
-    def test_validate_passes(self) -> None:
-        rule = IntegerRule()
-        rule.path = 'integer'
-        rule.schema = RuleTestSchema()
+    def test_constrain(self) -> None:
+        field = FieldConstraints()
 
-        self.assertTrue(rule.validate())
+        self.assertTrue(IntegerRule().constrain(field))
+        self.assertEqual(int, field.type)
 
-    def test_validate_raises_request_validation_error(self) -> None:
-        rule = IntegerRule()
-        rule.path = 'name'
-        rule.schema = RuleTestSchema()
+    def test_validate_passes(self) -> None:
+        self.assertTrue(IntegerRule().validate(1, make_context()))
 
-        with self.assertRaises(RequestValidationError):
-            rule.validate()
+    def test_validate_fails(self) -> None:
+        self.assertFalse(IntegerRule().validate('Mitko', make_context()))
+        self.assertFalse(IntegerRule().validate(True, make_context()))
 
     def test_fail_raises_request_validation_error(self) -> None:
         path = 'name'
 
-        rule = IntegerRule()
-        rule.path = path
-
         with self.assertRaises(RequestValidationError) as mock_e:
-            rule.fail()
+            IntegerRule().fail(path)
 
         self.assertEqual(f'The value for "{path}" must be an integer.', mock_e.exception.message)
 
@@ -173,29 +266,23 @@ class StringRuleUnitTest(TestCase):
 
         self.assertIsInstance(rule, Rule)
 
-    def test_validate_passes(self) -> None:
-        rule = StringRule()
-        rule.path = 'name'
-        rule.schema = RuleTestSchema()
+    def test_constrain(self) -> None:
+        field = FieldConstraints()
 
-        self.assertTrue(rule.validate())
+        self.assertTrue(StringRule().constrain(field))
+        self.assertEqual(str, field.type)
 
-    def test_validate_raises_request_validation_error(self) -> None:
-        rule = StringRule()
-        rule.path = 'integer'
-        rule.schema = RuleTestSchema()
+    def test_validate_passes(self) -> None:
+        self.assertTrue(StringRule().validate('Mitko', make_context()))
 
-        with self.assertRaises(RequestValidationError):
-            rule.validate()
+    def test_validate_fails(self) -> None:
+        self.assertFalse(StringRule().validate(1, make_context()))
 
     def test_fail_raises_request_validation_error(self) -> None:
         path = 'name'
 
-        rule = StringRule()
-        rule.path = path
-
         with self.assertRaises(RequestValidationError) as mock_e:
-            rule.fail()
+            StringRule().fail(path)
 
         self.assertEqual(f'The value for "{path}" must be a string.', mock_e.exception.message)
 
@@ -216,69 +303,39 @@ class ExistsInRuleUnitTest(TestCase):
         self.assertEqual(Product, rule.model)
         self.assertEqual(column, rule.column)
 
+    def test_constrain_leaves_the_rule_to_the_validator(self) -> None:
+        self.assertEqual(RuleCost.DATABASE, ExistsInRule.cost)
+        self.assertFalse(ExistsInRule(Product).constrain(FieldConstraints()))
+
     def test_validate_passes(self) -> None:
         value = 2
 
-        rule = ExistsInRule(Product)
-        rule.path = 'integer'
-        rule.schema = RuleTestSchema(integer=value)
-
-        mock_db_session = MagicMock()
-        mock_db_session.query = MagicMock(return_value=mock_db_session)
-        mock_db_session.filter = MagicMock(return_value=mock_db_session)
-        mock_db_session.exists = MagicMock(return_value=mock_db_session)
-        mock_db_session.scalar = MagicMock(return_value=True)
-
-        with patch.object(rule, 'db_session', return_value=mock_db_session) as mock_dbs:
-            self.assertTrue(rule.validate())
-
-            mock_dbs.assert_called_once()
-            mock_db_session.query.assert_has_calls(
-                [
-                    call(Product),
-                    call(mock_db_session),
-                ]
-            )
-            mock_db_session.filter.assert_called_once_with('id' == value)
-            mock_db_session.exists.assert_called_once()
-            mock_db_session.scalar.assert_called_once()
+        identity_map = IdentityMap()
+        identity_map.add(Product(id=value))
+
+        self.assertTrue(ExistsInRule(Product).validate(value, make_context(identity_map)))
+
+    def test_validate_passes_for_custom_column(self) -> None:
+        value = 'Computer'
+
+        identity_map = IdentityMap()
+        identity_map.add(Product(id=2, name=value), ['name'])
 
-    def test_validate_raises_request_validation_error(self) -> None:
+        self.assertTrue(ExistsInRule(Product, 'name').validate(value, make_context(identity_map)))
+
+    def test_validate_fails(self) -> None:
         value = 2
 
-        rule = ExistsInRule(Product)
-        rule.path = 'integer'
-        rule.schema = RuleTestSchema(integer=value)
-
-        mock_db_session = MagicMock()
-        mock_db_session.query = MagicMock(return_value=mock_db_session)
-        mock_db_session.filter = MagicMock(return_value=mock_db_session)
-        mock_db_session.exists = MagicMock(return_value=mock_db_session)
-        mock_db_session.scalar = MagicMock(return_value=False)
-
-        with patch.object(rule, 'db_session', return_value=mock_db_session) as mock_dbs:
-            with self.assertRaises(RequestValidationError):
-                rule.validate()
-
-            mock_dbs.assert_called_once()
-            mock_db_session.query.assert_has_calls(
-                [
-                    call(Product),
-                    call(mock_db_session),
-                ]
-            )
-            mock_db_session.filter.assert_called_once_with('id' == value)
-            mock_db_session.exists.assert_called_once()
-            mock_db_session.scalar.assert_called_once()
+        identity_map = IdentityMap()
+        identity_map.add_missing(Product, 'id', value)
+
+        self.assertFalse(ExistsInRule(Product).validate(value, make_context(identity_map)))
 
     def test_fail_raises_request_validation_error(self) -> None:
         path = 'name'
 
-        rule = ExistsInRule(Product)
-        rule.path = path
-
         with self.assertRaises(RequestValidationError) as mock_e:
-            rule.fail()
+            ExistsInRule(Product).fail(path)
 
         self.assertEqual(
             f'The value for "{path}" must exist in column "id" of model "{Product}".',
@@ -294,30 +351,24 @@ class GreaterThanRuleUnitTest(TestCase):
         self.assertIsInstance(rule, Rule)
         self.assertEqual(min_value, rule.min_value)
 
-    def test_validate_passes(self) -> None:
-        rule = GreaterThanRule(0)
-        rule.path = 'integer'
-        rule.schema = RuleTestSchema()
+    def test_constrain(self) -> None:
+        field = FieldConstraints()
 
-        self.assertTrue(rule.validate())
+        self.assertTrue(GreaterThanRule(0).constrain(field))
+        self.assertEqual([Ge(0)], field.metadata)
 
-    def test_validate_raises_request_validation_error(self) -> None:
-        rule = GreaterThanRule(0)
-        rule.path = 'integer'
-        rule.schema = RuleTestSchema(integer=-1)
+    def test_validate_passes(self) -> None:
+        self.assertTrue(GreaterThanRule(0).validate(1, make_context()))
 
-        with self.assertRaises(RequestValidationError):
-            rule.validate()
+    def test_validate_fails(self) -> None:
+        self.assertFalse(GreaterThanRule(0).validate(-1, make_context()))
 
     def test_fail_raises_request_validation_error(self) -> None:
         min_value = 0
         path = 'integer'
 
-        rule = GreaterThanRule(min_value)
-        rule.path = path
-
         with self.assertRaises(RequestValidationError) as mock_e:
-            rule.fail()
+            GreaterThanRule(min_value).fail(path)
 
         self.assertEqual(
             f'The value for "{path}" must be greater than "{min_value}".',
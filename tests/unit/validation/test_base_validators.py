@@ -1,70 +1,552 @@
 from __future__ import annotations
 
-from unittest import TestCase
-from unittest.mock import patch, MagicMock
+import asyncio
+from typing import Any
+from unittest import IsolatedAsyncioTestCase, TestCase
+from unittest.mock import patch, MagicMock, AsyncMock
 
-from pydantic import BaseModel
+from pydantic import BaseModel, ValidationError
+from sqlalchemy.ext.asyncio import create_async_engine, AsyncSession
 
-from api.exceptions import NullableValidationError
-from api.validation.base_validators import Validator
+from api.database.identity_map import IdentityMap
+from api.database.model_cache import product_cache
+from api.database.models import Product, User
+from api.exceptions import RequestValidationError, BatchValidationError
+from api.validation.base_rules import ExistsInRule, IntegerRule, NullableRule, RequiredRule, Rule, StringRule, \
+    RuleCost, RequiredIfRule, GreaterThanRule, AsyncRule, ValidationContext
+from api.validation.base_validators import Validator, ValidationPlan, ConstrainedSchema
 
 
 class TestSchema(BaseModel):
     name: str | None = 'Mitko'
+    product_id: int | None = None
+    product_name: str | int | None = None
+    user_id: int | None = None
 
 
-class ValidatorUnitTest(TestCase):
+class NameValidator(Validator):
+    @classmethod
+    def rules(cls) -> dict[str, list[Rule]]:
+        return {'name': [RequiredRule()]}
+
+
+class ProductValidator(Validator):
+    schema_class = TestSchema
+
+    @classmethod
+    def rules(cls) -> dict[str, list[Rule]]:
+        return {
+            'product_id': [NullableRule(), IntegerRule(), ExistsInRule(Product)],
+            'product_name': [NullableRule(), StringRule(), ExistsInRule(Product, 'name')],
+        }
+
+
+class Concurrency:
+    def __init__(self):
+        self.running: int = 0
+        self.most_running: int = 0
+        self.db_sessions: list[AsyncSession | None] = []
+
+
+class SleepingRule(AsyncRule):
+    __slots__ = ('concurrency', 'valid')
+
+    def __init__(self, concurrency: Concurrency, valid: bool = True):
+        self.concurrency: Concurrency = concurrency
+        self.valid: bool = valid
+
+    async def validate(self, value: Any, context: ValidationContext) -> bool:
+        self.concurrency.running += 1
+        self.concurrency.most_running = max(self.concurrency.most_running, self.concurrency.running)
+        self.concurrency.db_sessions.append(context.db_session)
+
+        await asyncio.sleep(0.01)
+
+        self.concurrency.running -= 1
+
+        return self.valid
+
+    def message(self, path: str) -> str:
+        return f'The value for "{path}" was rejected.'
+
+
+def make_lookup_session(concurrency: Concurrency, rows: list) -> MagicMock:
+    async def scalars(statement: Any) -> list:
+        concurrency.running += 1
+        concurrency.most_running = max(concurrency.most_running, concurrency.running)
+
+        await asyncio.sleep(0.01)
+
+        concurrency.running -= 1
+
+        return rows
+
+    db_session = MagicMock()
+    db_session.scalars = AsyncMock(side_effect=scalars)
+    db_session.__aenter__.return_value = db_session
+
+    return db_session
+
+
+def make_db_session(*rows) -> MagicMock:
+    db_session = MagicMock()
+    db_session.info = {}
+    db_session.scalars = AsyncMock(side_effect=[list(result) for result in rows])
+
+    return db_session
+
+
+class ConstrainedSchemaUnitTest(TestCase):
+    def test_model_constrains_the_fields_by_the_schema_rules(self) -> None:
+        model = ConstrainedSchema({
+            'name': [RequiredRule(), StringRule()],
+            'product_id': [NullableRule(), IntegerRule(), GreaterThanRule(1), ExistsInRule(Product)],
+            'user_id': [ExistsInRule(User)],
+        }).model(TestSchema, {})
+
+        self.assertTrue(issubclass(model, TestSchema))
+        self.assertEqual('TestSchema', model.__name__)
+        self.assertTrue(model.model_fields['name'].is_required())
+        self.assertEqual(TestSchema.model_fields['user_id'].annotation, model.model_fields['user_id'].annotation)
+
+        self.assertEqual(2, model(name='Mitko', product_id=2).product_id)
+        self.assertIsNone(model(name='Mitko').product_id)
+
+        for payload in ({}, {'name': None}, {'name': 'Mitko', 'product_id': 0}, {'name': 'Mitko', 'product_id': 'a'}):
+            with self.assertRaises(ValidationError):
+                model(**payload)
+
+    def test_model_checks_the_rules_comparing_fields(self) -> None:
+        model = ConstrainedSchema({
+            'product_id': [RequiredIfRule('product_name'), NullableRule(), IntegerRule()],
+        }).model(TestSchema, {})
+
+        self.assertEqual('Computer', model(product_name='Computer').product_name)
+
+        with self.assertRaises(ValidationError) as mock_e:
+            model()
+
+        self.assertIn('A value for "product_id" is required.', str(mock_e.exception))
+
+    def test_model_without_rules_comparing_fields(self) -> None:
+        constrained_schema = ConstrainedSchema({'product_id': [NullableRule(), IntegerRule()]})
+
+        self.assertEqual((), constrained_schema.checks)
+        self.assertEqual({}, constrained_schema.model(TestSchema, {}).__pydantic_decorators__.model_validators)
+
+    def test_model_with_annotations(self) -> None:
+        model = ConstrainedSchema({}).model(TestSchema, {'user_id': int | str | None})
+
+        self.assertEqual('a', model(user_id='a').user_id)
+
+
+class ValidatorUnitTest(IsolatedAsyncioTestCase):
+    def setUp(self) -> None:
+        product_cache.clear()
+
     def test_init(self) -> None:
         schema = TestSchema()
-        validator = Validator(schema)
+        db_session = MagicMock()
+        validator = Validator(schema, db_session)
 
         self.assertEqual(schema, validator.schema)
+        self.assertEqual(db_session, validator.db_session)
 
     def test_rules_raises_not_implemented_error(self) -> None:
-        schema = TestSchema()
-        validator = Validator(schema)
-
         with self.assertRaises(NotImplementedError):
-            validator.rules()
+            Validator.rules()
 
-    def test_validate_iterates_over_rules(self) -> None:
-        schema = TestSchema()
-        validator = Validator(schema)
+    def test_plan_is_compiled_once_per_validator(self) -> None:
+        with patch.object(NameValidator, 'rules', wraps=NameValidator.rules) as mock_rules:
+            Validator._plans.pop(NameValidator, None)
+
+            plan = NameValidator(TestSchema()).plan()
+
+            self.assertIs(plan, NameValidator(TestSchema(name=None)).plan())
+            self.assertIsNot(plan, ProductValidator(TestSchema()).plan())
+            mock_rules.assert_called_once()
+
+        self.assertEqual(['name'], [path for path, rules in plan.paths])
+        self.assertIsInstance(plan.paths[0][1], tuple)
+        self.assertEqual((), plan.lookups)
+        self.assertEqual(['product_id', 'product_name'], [path for path, rule in ProductValidator.plan().lookups])
+
+    def test_model_is_built_once_per_validator(self) -> None:
+        model = ProductValidator.model()
+
+        self.assertIs(model, ProductValidator.model())
+        self.assertTrue(issubclass(model, TestSchema))
+
+    def test_parsed(self) -> None:
+        self.assertTrue(ProductValidator(ProductValidator.model()(product_id=1)).parsed())
+        self.assertFalse(ProductValidator(TestSchema(product_id=1)).parsed())
+        self.assertFalse(NameValidator(TestSchema()).parsed())
+
+    async def test_validate_skips_the_schema_rules_of_parsed_payloads(self) -> None:
+        db_session = make_db_session([Product(id=1, name='Computer')])
+
+        for schema, costs in (
+            (ProductValidator.model()(product_id=1), [RuleCost.DATABASE]),
+            (TestSchema(product_id=1), [RuleCost.SCHEMA, RuleCost.DATABASE]),
+        ):
+            with patch.object(ValidationPlan, 'check') as mock_check:
+                await ProductValidator(schema, db_session).validate()
 
-        rule1 = MagicMock()
+            self.assertEqual(costs, [call.args[1] for call in mock_check.call_args_list])
+
+    def test_plan_stages_the_rules_by_cost(self) -> None:
+        plan = ProductValidator.plan()
+
+        self.assertEqual(
+            [('product_id', [NullableRule, IntegerRule]), ('product_name', [NullableRule, StringRule])],
+            [(path, [type(rule) for rule in rules]) for path, rules in plan.stages[RuleCost.SCHEMA]]
+        )
+        self.assertEqual(
+            [('product_id', [NullableRule, ExistsInRule]), ('product_name', [NullableRule, ExistsInRule])],
+            [(path, [type(rule) for rule in rules]) for path, rules in plan.stages[RuleCost.DATABASE]]
+        )
+
+    async def test_validate_checks_every_rule_with_the_value_of_its_path(self) -> None:
+        rule1 = MagicMock(stops=False, cost=RuleCost.SCHEMA)
         rule1.validate = MagicMock(return_value=True)
 
-        rule2 = MagicMock()
-        rule2.validate = MagicMock(return_value=True)
+        rule2 = MagicMock(stops=False, cost=RuleCost.SCHEMA)
+        rule2.validate = MagicMock(return_value=False)
 
-        rules = {
-            'name': [rule1, rule2]
-        }
+        schema = TestSchema()
+        plan = ValidationPlan({'name': [rule1, rule2]})
+
+        with patch.object(Validator, 'plan', return_value=plan):
+            await Validator(schema).validate()
+
+        self.assertEqual('Mitko', rule1.validate.call_args.args[0])
+        self.assertIs(schema, rule1.validate.call_args.args[1].schema)
+        rule2.validate.assert_called_once()
+        rule2.fail.assert_called_once_with('name')
+
+    async def test_validate_skips_the_following_rules_when_a_stopping_rule_fails(self) -> None:
+        rule2 = MagicMock(cost=RuleCost.MEMORY)
+
+        plan = ValidationPlan({'name': [NullableRule(), rule2]})
+
+        with patch.object(Validator, 'plan', return_value=plan):
+            await Validator(TestSchema(name=None)).validate()
+
+        rule2.validate.assert_not_called()
+
+    async def test_validate_raises_the_first_failed_rule(self) -> None:
+        with self.assertRaises(RequestValidationError) as mock_e:
+            await NameValidator(TestSchema(name=None)).validate()
+
+        self.assertEqual('A value for "name" is required.', mock_e.exception.message)
+
+    async def test_validate_runs_the_cheap_rules_of_every_path_before_the_database_rules(self) -> None:
+        db_session = make_db_session()
+
+        with self.assertRaises(RequestValidationError) as mock_e:
+            await ProductValidator(TestSchema(product_id=1, product_name=2), db_session).validate()
 
-        with patch.object(validator, 'rules', return_value=rules) as mock_r:
-            validator.validate()
+        self.assertEqual('The value for "product_name" must be a string.', mock_e.exception.message)
+        db_session.scalars.assert_not_awaited()
 
-            mock_r.assert_called_once()
-            rule1.validate.assert_called_once()
-            rule2.validate.assert_called_once()
+    async def test_validate_skips_the_database_rules_of_a_stopped_path(self) -> None:
+        db_session = make_db_session([Product(id=1, name='Computer')])
 
-    def test_validate_skips_rules_when_nullable_validation_error(self) -> None:
-        schema = TestSchema(name=None)
-        validator = Validator(schema)
+        await ProductValidator(TestSchema(product_id=1), db_session).validate()
 
-        rule1 = MagicMock()
-        rule1.validate = MagicMock(side_effect=NullableValidationError())
+        db_session.scalars.assert_awaited_once()
+        self.assertNotIn('products.name IN', str(db_session.scalars.call_args.args[0]))
 
-        rule2 = MagicMock()
-        rule2.validate = MagicMock(return_value=True)
+    async def test_validate_fails_the_database_rules_once_the_cheap_rules_passed(self) -> None:
+        db_session = make_db_session([])
+
+        with self.assertRaises(RequestValidationError) as mock_e:
+            await ProductValidator(TestSchema(product_id=3), db_session).validate()
+
+        self.assertEqual(
+            f'The value for "product_id" must exist in column "id" of model "{Product}".',
+            mock_e.exception.message
+        )
+
+    async def test_validate_all_resolves_the_lookups_of_every_payload_together(self) -> None:
+        computer = Product(id=1, name='Computer')
+        monitor = Product(id=2, name='Monitor')
+
+        db_session = make_db_session([computer, monitor])
+        validators = [
+            ProductValidator(TestSchema(product_id=1), db_session),
+            ProductValidator(TestSchema(product_name='Monitor'), db_session),
+        ]
+
+        await Validator.validate_all(validators)
+
+        db_session.scalars.assert_awaited_once()
+
+    async def test_validate_all_fails_a_cheap_rule_of_any_payload_before_the_database_rules(self) -> None:
+        db_session = make_db_session()
+        validators = [
+            ProductValidator(TestSchema(product_id=1), db_session),
+            ProductValidator(TestSchema(product_name=2), db_session),
+        ]
+
+        with self.assertRaises(RequestValidationError):
+            await Validator.validate_all(validators)
+
+        db_session.scalars.assert_not_awaited()
+
+    async def test_validate_all_without_validators(self) -> None:
+        await Validator.validate_all([])
+
+    async def test_validate_batch_reports_the_errors_by_index(self) -> None:
+        db_session = make_db_session()
+        schemas = [TestSchema(product_id=1), TestSchema(product_name=2), TestSchema.model_construct(product_id='1')]
+
+        with self.assertRaises(BatchValidationError) as mock_e:
+            await ProductValidator.validate_batch(schemas, db_session)
+
+        self.assertEqual({
+            1: 'The value for "product_name" must be a string.',
+            2: 'The value for "product_id" must be an integer.',
+        }, mock_e.exception.errors)
+        self.assertEqual(
+            '1: The value for "product_name" must be a string.\n2: The value for "product_id" must be an integer.',
+            mock_e.exception.message
+        )
+        db_session.scalars.assert_not_awaited()
+
+    async def test_validate_batch_runs_every_rule_once_over_the_column(self) -> None:
+        db_session = make_db_session([Product(id=1, name='Computer'), Product(id=2, name='Monitor')])
+        schemas = [TestSchema(product_id=1), TestSchema(product_id=2), TestSchema(product_name='Monitor')]
+
+        with patch.object(IntegerRule, 'validate_column', autospec=True, side_effect=IntegerRule.validate_column) \
+                as mock_validate_column:
+            await ProductValidator.validate_batch(schemas, db_session)
+
+        mock_validate_column.assert_called_once()
+        self.assertEqual([1, 2], mock_validate_column.call_args.args[1])
+        db_session.scalars.assert_awaited_once()
+
+    async def test_validate_batch_resolves_the_lookups_in_one_query_per_model(self) -> None:
+        db_session = make_db_session([Product(id=1, name='Computer')])
+        schemas = [TestSchema(product_id=1), TestSchema(product_id=3), TestSchema(product_name='Computer')]
+
+        with self.assertRaises(BatchValidationError) as mock_e:
+            await ProductValidator.validate_batch(schemas, db_session)
+
+        self.assertEqual({1: f'The value for "product_id" must exist in column "id" of model "{Product}".'}, (
+            mock_e.exception.errors
+        ))
+        db_session.scalars.assert_awaited_once()
+        self.assertIn('products.id IN', str(db_session.scalars.call_args.args[0]))
+        self.assertIn('products.name IN', str(db_session.scalars.call_args.args[0]))
+
+    async def test_validate_batch_skips_the_schema_rules_of_parsed_payloads(self) -> None:
+        db_session = make_db_session([Product(id=1, name='Computer')])
+        schemas = [ProductValidator.model()(product_id=1), TestSchema(product_id=1)]
+
+        with patch.object(ValidationPlan, 'check_column') as mock_check_column:
+            await ProductValidator.validate_batch(schemas, db_session)
+
+        self.assertEqual(
+            [(RuleCost.SCHEMA, [1]), (RuleCost.DATABASE, [0, 1])],
+            [call.args[1:3] for call in mock_check_column.call_args_list]
+        )
+
+    async def test_validate_batch_without_schemas(self) -> None:
+        await ProductValidator.validate_batch([])
+
+    async def test_validate_runs_the_async_rules_of_every_path_concurrently(self) -> None:
+        concurrency = Concurrency()
+        plan = ValidationPlan({
+            'name': [SleepingRule(concurrency)],
+            'product_id': [SleepingRule(concurrency)],
+            'user_id': [SleepingRule(concurrency)],
+        })
+
+        with patch.object(Validator, 'plan', return_value=plan):
+            await Validator(TestSchema(product_id=1, user_id=1)).validate()
+
+        self.assertEqual(3, concurrency.most_running)
+
+    async def test_validate_caps_the_async_rules_running_at_once(self) -> None:
+        concurrency = Concurrency()
+        plan = ValidationPlan({path: [SleepingRule(concurrency)] for path in ('name', 'product_id', 'user_id')})
+
+        with patch.object(Validator, 'plan', return_value=plan), \
+                patch('api.validation.base_validators.DB_VALIDATION_CONCURRENCY', 2):
+            await Validator(TestSchema()).validate()
+
+        self.assertEqual(2, concurrency.most_running)
+
+    async def test_validate_raises_the_error_of_the_first_path_failing_an_async_rule(self) -> None:
+        concurrency = Concurrency()
+        plan = ValidationPlan({
+            'name': [SleepingRule(concurrency)],
+            'product_id': [SleepingRule(concurrency, False)],
+            'user_id': [SleepingRule(concurrency, False)],
+        })
+
+        with patch.object(Validator, 'plan', return_value=plan), self.assertRaises(RequestValidationError) as mock_e:
+            await Validator(TestSchema()).validate()
+
+        self.assertEqual('The value for "product_id" was rejected.', mock_e.exception.message)
+        self.assertEqual(3, len(concurrency.db_sessions))
+
+    async def test_validate_runs_the_sync_rules_of_the_stage_before_the_async_rules(self) -> None:
+        concurrency = Concurrency()
+        db_session = make_db_session([])
+        plan = ValidationPlan({
+            'product_id': [NullableRule(), ExistsInRule(Product)],
+            'user_id': [NullableRule(), SleepingRule(concurrency)],
+            'name': [SleepingRule(concurrency)],
+        })
+
+        with patch.object(Validator, 'plan', return_value=plan), self.assertRaises(RequestValidationError):
+            await Validator(TestSchema(product_id=3), db_session).validate()
+
+        self.assertEqual([], concurrency.db_sessions)
+
+        with patch.object(Validator, 'plan', return_value=plan):
+            await Validator(TestSchema(), db_session).validate()
+
+        # The user_id is null, so its async rule is skipped by the nullable rule in front of it
+        self.assertEqual(1, len(concurrency.db_sessions))
+
+    async def test_validate_runs_the_async_rules_of_every_path_on_a_session_of_its_own(self) -> None:
+        engine = create_async_engine('sqlite+aiosqlite://')
+        concurrency = Concurrency()
+        plan = ValidationPlan({'name': [SleepingRule(concurrency)], 'user_id': [SleepingRule(concurrency)]})
+
+        try:
+            async with AsyncSession(engine) as db_session:
+                with patch.object(Validator, 'plan', return_value=plan):
+                    await Validator(TestSchema(), db_session).validate()
+        finally:
+            await engine.dispose()
+
+        self.assertEqual(2, len(set(map(id, concurrency.db_sessions))))
+        self.assertNotIn(db_session, concurrency.db_sessions)
+        self.assertTrue(all(path_session.bind is engine for path_session in concurrency.db_sessions))
+
+    def test_semaphore_is_shared_by_the_validators_of_the_request(self) -> None:
+        db_session = make_db_session()
+
+        semaphore = Validator(TestSchema(), db_session).semaphore()
+
+        self.assertIs(semaphore, Validator(TestSchema(), db_session).semaphore())
+        self.assertIsNot(semaphore, Validator(TestSchema(), make_db_session()).semaphore())
+
+    async def test_validate_batch_runs_the_async_rules_of_every_path_concurrently(self) -> None:
+        concurrency = Concurrency()
+        plan = ValidationPlan({
+            'name': [SleepingRule(concurrency)],
+            'product_id': [NullableRule(), SleepingRule(concurrency, False)],
+            'user_id': [SleepingRule(concurrency, False)],
+        })
+
+        with patch.object(Validator, 'plan', return_value=plan), self.assertRaises(BatchValidationError) as mock_e:
+            await Validator.validate_batch([TestSchema(product_id=1), TestSchema(), TestSchema(product_id=2)])
+
+        self.assertEqual({
+            0: 'The value for "product_id" was rejected.',
+            1: 'The value for "user_id" was rejected.',
+            2: 'The value for "product_id" was rejected.',
+        }, mock_e.exception.errors)
+        self.assertEqual(3, concurrency.most_running)
+
+    async def test_resolve_database_rules_batches_lookups_per_model(self) -> None:
+        computer = Product(id=1, name='Computer')
+        monitor = Product(id=2, name='Monitor')
+        user = User(id=1)
+
+        schema = TestSchema(product_id=1, product_name='Monitor', user_id=1)
+        db_session = make_db_session()
+        db_session.merge = AsyncMock(side_effect=lambda row, load: row)
+        validator = Validator(schema, db_session)
+
+        concurrency = Concurrency()
+        lookup_sessions = [
+            make_lookup_session(concurrency, [computer, monitor]),
+            make_lookup_session(concurrency, [user]),
+        ]
 
         rules = {
-            'name': [rule1, rule2]
+            'product_id': [IntegerRule(), ExistsInRule(Product)],
+            'product_name': [ExistsInRule(Product, 'name')],
+            'user_id': [ExistsInRule(User)],
         }
 
-        with patch.object(validator, 'rules', return_value=rules) as mock_r:
-            validator.validate()
+        with patch.object(validator, 'lookup_session', side_effect=lookup_sessions):
+            await validator.resolve_database_rules([(ValidationPlan(rules), validator.context())])
+
+        # Each model is looked up on a session of its own, concurrently, and its rows merged into the request's session
+        self.assertEqual(2, concurrency.most_running)
+        db_session.scalars.assert_not_awaited()
+        self.assertEqual(3, db_session.merge.await_count)
+
+        product_statement = str(lookup_sessions[0].scalars.await_args.args[0])
+        self.assertIn('FROM products', product_statement)
+        self.assertIn('products.id IN', product_statement)
+        self.assertIn('products.name IN', product_statement)
+        self.assertIn('FROM users', str(lookup_sessions[1].scalars.await_args.args[0]))
+
+        identity_map = IdentityMap.of(db_session)
+        self.assertEqual(computer, identity_map.get(Product, 'id', 1))
+        self.assertEqual(monitor, identity_map.get(Product, 'name', 'Monitor'))
+        self.assertEqual(monitor, identity_map.get(Product, 'id', 2))
+        self.assertEqual(user, identity_map.get(User, 'id', 1))
+
+    async def test_resolve_database_rules_looks_a_single_model_up_on_the_request_session(self) -> None:
+        schema = TestSchema(product_id=1, product_name='Monitor')
+        db_session = make_db_session([Product(id=1, name='Computer'), Product(id=2, name='Monitor')])
+        validator = Validator(schema, db_session)
+
+        with patch.object(validator, 'lookup_session') as mock_lookup_session:
+            await validator.resolve_database_rules([(ProductValidator.plan(), validator.context())])
+
+        mock_lookup_session.assert_not_called()
+        db_session.scalars.assert_awaited_once()
+        self.assertEqual(2, IdentityMap.of(db_session).get(Product, 'name', 'Monitor').id)
+
+    async def test_resolve_database_rules_records_missing_rows(self) -> None:
+        schema = TestSchema(product_id=3)
+        db_session = make_db_session([])
+        validator = Validator(schema, db_session)
+
+        plan = ValidationPlan({'product_id': [ExistsInRule(Product)]})
+
+        await validator.resolve_database_rules([(plan, validator.context())])
+
+        identity_map = IdentityMap.of(db_session)
+        self.assertTrue(identity_map.has(Product, 'id', 3))
+        self.assertIsNone(identity_map.get(Product, 'id', 3))
+
+    async def test_resolve_database_rules_skips_resolved_and_null_values(self) -> None:
+        schema = TestSchema(product_id=1, product_name=None)
+        db_session = make_db_session()
+        IdentityMap.of(db_session).add(Product(id=1))
+        validator = Validator(schema, db_session)
+
+        await validator.resolve_database_rules([(ProductValidator.plan(), validator.context())])
+
+        db_session.scalars.assert_not_awaited()
+
+    async def test_resolve_database_rules_reads_through_the_model_cache(self) -> None:
+        computer = Product(id=1, name='Computer')
+        product_cache.add(computer)
+
+        schema = TestSchema(product_id=1, product_name='Monitor')
+        db_session = make_db_session([Product(id=2, name='Monitor')])
+        db_session.merge = AsyncMock(return_value=computer)
+        validator = Validator(schema, db_session)
+
+        await validator.resolve_database_rules([(ProductValidator.plan(), validator.context())])
+
+        db_session.merge.assert_awaited_once()
+        db_session.scalars.assert_awaited_once()
+        self.assertNotIn('products.id IN', str(db_session.scalars.call_args.args[0]))
 
-            mock_r.assert_called_once()
-            rule1.validate.assert_called_once()
-            rule2.validate.assert_not_called()
+        identity_map = IdentityMap.of(db_session)
+        self.assertEqual(computer, identity_map.get(Product, 'id', 1))
+        self.assertEqual('Monitor', identity_map.get(Product, 'name', 'Monitor').name)
+        self.assertIsNotNone(product_cache.get('name', 'Monitor'))
@@ -1,13 +1,18 @@
 from __future__ import annotations
 
-from unittest import TestCase
+from unittest import TestCase, IsolatedAsyncioTestCase
+from unittest.mock import patch, AsyncMock, MagicMock
+
+from pydantic import ValidationError
 
 from api.database.models import Product
-from api.schemas import ItemCreateSchema, ItemPartialUpdateSchema
+from api.exceptions import RequestValidationError, BatchValidationError
+from api.schemas import ItemCreateSchema, ItemPartialUpdateSchema, ItemBulkCreateSchema
 from api.validation.base_rules import RequiredIfRule, NullableRule, IntegerRule, ExistsInRule, StringRule, \
     GreaterThanRule, RequiredRule
 from api.validation.base_validators import Validator
-from api.validation.items_validators import CreateItemValidator, PartialUpdateItemValidator
+from api.validation.items_validators import CreateItemValidator, PartialUpdateItemValidator, \
+    BulkCreateItemValidator
 
 
 class CreateItemValidatorUnitTest(TestCase):
@@ -22,20 +27,24 @@ class CreateItemValidatorUnitTest(TestCase):
         validator = CreateItemValidator(schema)
 
         self.assertIn('product_id', validator.rules())
-        self.assertEqual(3, len(validator.rules()['product_id']))
+        self.assertEqual(4, len(validator.rules()['product_id']))
         self.assertIsInstance(validator.rules()['product_id'][0], RequiredIfRule)
-        self.assertIsInstance(validator.rules()['product_id'][1], IntegerRule)
-        self.assertIsInstance(validator.rules()['product_id'][2], ExistsInRule)
-        self.assertEqual(Product, getattr(validator.rules()['product_id'][2], 'model'))
-        self.assertEqual('id', getattr(validator.rules()['product_id'][2], 'column'))
+        self.assertEqual('product_name', validator.rules()['product_id'][0].other_path)
+        self.assertIsInstance(validator.rules()['product_id'][1], NullableRule)
+        self.assertIsInstance(validator.rules()['product_id'][2], IntegerRule)
+        self.assertIsInstance(validator.rules()['product_id'][3], ExistsInRule)
+        self.assertEqual(Product, getattr(validator.rules()['product_id'][3], 'model'))
+        self.assertEqual('id', getattr(validator.rules()['product_id'][3], 'column'))
 
         self.assertIn('product_name', validator.rules())
-        self.assertEqual(3, len(validator.rules()['product_name']))
+        self.assertEqual(4, len(validator.rules()['product_name']))
         self.assertIsInstance(validator.rules()['product_name'][0], RequiredIfRule)
-        self.assertIsInstance(validator.rules()['product_name'][1], StringRule)
-        self.assertIsInstance(validator.rules()['product_name'][2], ExistsInRule)
-        self.assertEqual(Product, getattr(validator.rules()['product_name'][2], 'model'))
-        self.assertEqual('name', getattr(validator.rules()['product_name'][2], 'column'))
+        self.assertEqual('product_id', validator.rules()['product_name'][0].other_path)
+        self.assertIsInstance(validator.rules()['product_name'][1], NullableRule)
+        self.assertIsInstance(validator.rules()['product_name'][2], StringRule)
+        self.assertIsInstance(validator.rules()['product_name'][3], ExistsInRule)
+        self.assertEqual(Product, getattr(validator.rules()['product_name'][3], 'model'))
+        self.assertEqual('name', getattr(validator.rules()['product_name'][3], 'column'))
 
         self.assertIn('quantity', validator.rules())
         self.assertEqual(3, len(validator.rules()['quantity']))
@@ -45,6 +54,66 @@ class CreateItemValidatorUnitTest(TestCase):
         self.assertEqual(0, getattr(validator.rules()['quantity'][2], 'min_value'))
 
 
+    def test_model(self) -> None:
+        model = CreateItemValidator.model()
+
+        self.assertTrue(issubclass(model, ItemCreateSchema))
+        self.assertEqual(1, model(product_id=1).quantity)
+        self.assertIsNone(model(product_name='Computer', quantity=None).quantity)
+
+        for payload in ({}, {'product_id': 'Computer'}, {'product_name': 1}, {'product_id': 1, 'quantity': -1}):
+            with self.assertRaises(ValidationError):
+                model(**payload)
+
+
+class CreateItemValidatorWithoutSessionUnitTest(IsolatedAsyncioTestCase):
+    async def test_validate_fails_the_database_rules_without_a_session(self) -> None:
+        with self.assertRaises(RequestValidationError) as mock_e:
+            await CreateItemValidator(ItemCreateSchema(product_id=1)).validate()
+
+        self.assertEqual(
+            f'The value for "product_id" must exist in column "id" of model "{Product}".',
+            mock_e.exception.message
+        )
+
+    async def test_validate_batch_fails_the_database_rules_without_a_session(self) -> None:
+        with self.assertRaises(BatchValidationError) as mock_e:
+            await CreateItemValidator.validate_batch(
+                [ItemCreateSchema(product_id=1), ItemCreateSchema(product_name='Computer')]
+            )
+
+        self.assertEqual([0, 1], list(mock_e.exception.errors))
+
+
+class BulkCreateItemValidatorUnitTest(IsolatedAsyncioTestCase):
+    def test_rules(self) -> None:
+        schema = ItemBulkCreateSchema(items=[{'product_id': 1}])
+        validator = BulkCreateItemValidator(schema)
+
+        self.assertIsInstance(validator, Validator)
+        self.assertEqual(1, len(validator.rules()['items']))
+        self.assertIsInstance(validator.rules()['items'][0], RequiredRule)
+
+    def test_model_parses_the_lines_into_the_constrained_line_schema(self) -> None:
+        schema = BulkCreateItemValidator.model()(items=[{'product_id': 1}])
+
+        self.assertIsInstance(schema.items[0], CreateItemValidator.model())
+
+        for payload in ({'items': []}, {'items': [{'quantity': 1}]}):
+            with self.assertRaises(ValidationError):
+                BulkCreateItemValidator.model()(**payload)
+
+    async def test_validate_validates_every_line_together(self) -> None:
+        schema = ItemBulkCreateSchema(items=[{'product_id': 1}, {'product_name': 'Monitor'}])
+        db_session = MagicMock()
+        validator = BulkCreateItemValidator(schema, db_session)
+
+        with patch.object(CreateItemValidator, 'validate_batch', AsyncMock(return_value=None)) as mock_validate_batch:
+            await validator.validate()
+
+        mock_validate_batch.assert_awaited_once_with(schema.items, db_session)
+
+
 class PartialUpdateItemValidatorUnitTest(TestCase):
     def test_init(self) -> None:
         schema = ItemPartialUpdateSchema(quantity=2)
@@ -61,3 +130,12 @@ class PartialUpdateItemValidatorUnitTest(TestCase):
         self.assertIsInstance(validator.rules()['quantity'][0], RequiredRule)
         self.assertIsInstance(validator.rules()['quantity'][1], GreaterThanRule)
         self.assertEqual(0, getattr(validator.rules()['quantity'][1], 'min_value'))
+
+    def test_model(self) -> None:
+        model = PartialUpdateItemValidator.model()
+
+        self.assertEqual(2, model(quantity=2).quantity)
+
+        for payload in ({}, {'quantity': None}, {'quantity': -1}):
+            with self.assertRaises(ValidationError):
+                model(**payload)